@@ -1,7 +1,8 @@
 import tkinter as tk
 from contextlib import contextmanager
-from tkinter import ttk
+from tkinter import messagebox, ttk
 
+from db import Database
 from screens import (
     ScreenContract,
     ScreenHistory,
@@ -14,6 +15,13 @@ from screens import (
     ScreenWarehouseOrders,
     ScreenWarehouseSupply,
 )
+from tasks import TaskRunner
+
+
+def _in_db_session(fn, *args, **kwargs):
+    """Τρέχει μια ενέργεια χρήστη (στο thread της εργασίας) μέσα σε ένα Database.session()."""
+    with Database.session():
+        return fn(*args, **kwargs)
 
 
 class App(tk.Tk):
@@ -176,6 +184,9 @@ class App(tk.Tk):
         self.card = ttk.Frame(outer_container, style="Card.TFrame")
         self.card.pack(fill="both", expand=True, padx=40, pady=40)
         self._busy_count = 0
+        # Οι κλήσεις βάσης των οθονών τρέχουν εδώ ώστε το παράθυρο να μην παγώνει.
+        self.tasks = TaskRunner(self)
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
 
         self.frames = {}
         self.login_screen = ScreenLogin
@@ -216,15 +227,48 @@ class App(tk.Tk):
     def busy_cursor(self, message=None):
         """Εναλλάσσει τον δείκτη ποντικιού σε 'απασχολημένο' όσο διαρκεί μια διεργασία."""
         try:
-            self._busy_count += 1
-            if self._busy_count == 1:
-                self.config(cursor="watch")
-                self.update_idletasks()
+            self._begin_busy()
             yield
         finally:
-            self._busy_count = max(0, self._busy_count - 1)
-            if self._busy_count == 0:
-                self.config(cursor="")
+            self._end_busy()
+
+    def run_async(self, fn, *args, key=None, on_success=None, on_error=None, **kwargs):
+        """Εκτελεί `fn` (π.χ. μέθοδο repository) στο παρασκήνιο και παραδίδει το αποτέλεσμα στο on_success.
+
+        Ο busy cursor μένει ενεργός μέχρι να παραδοθεί το αποτέλεσμα. Υποβολή με το ίδιο `key`
+        αντικαθιστά την προηγούμενη (π.χ. νέο refresh πριν ολοκληρωθεί το παλιό). Κάθε ενέργεια
+        τρέχει σε ένα Database.session(), ώστε όλες οι κλήσεις της να μοιράζονται σύνδεση.
+        """
+        self._begin_busy()
+        return self.tasks.submit(
+            _in_db_session,
+            fn,
+            *args,
+            key=key,
+            on_success=on_success,
+            on_error=on_error or self._show_task_error,
+            on_done=self._end_busy,
+            **kwargs,
+        )
+
+    def _show_task_error(self, exc):
+        messagebox.showerror("Σφάλμα", f"Η ενέργεια απέτυχε: {exc}")
+
+    def _begin_busy(self):
+        self._busy_count += 1
+        if self._busy_count == 1:
+            self.config(cursor="watch")
+            self.update_idletasks()
+
+    def _end_busy(self):
+        self._busy_count = max(0, self._busy_count - 1)
+        if self._busy_count == 0:
+            self.config(cursor="")
+
+    def _on_close(self):
+        """Ακυρώνει τις εκκρεμείς εργασίες παρασκηνίου πριν κλείσει το παράθυρο."""
+        self.tasks.shutdown()
+        self.destroy()
 
     def _init_window_state(self):
         """Ρυθμίζει αρχικά μεγέθη παραθύρου και προσπαθεί να το μεγιστοποιήσει."""
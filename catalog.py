@@ -0,0 +1,106 @@
+"""Κοινή cache καταλόγου προϊόντων για όλες τις οθόνες και την τιμολόγηση παραγγελιών.
+
+Ο κατάλογος φορτώνεται μία φορά ανά διεργασία. Σε κάθε ανάγνωση ελέγχεται μόνο ένα φθηνό token
+(SQL.CATALOG_VERSION): αν άλλαξαν προϊόντα/τιμές ξαναφορτώνεται ολόκληρος, αν άλλαξε μόνο το απόθεμα
+φέρνουμε τα σύνολα που άλλαξαν. Οι εγγραφές που έχουν ήδη δοθεί σε καλούντες δεν αλλάζουν ποτέ: κάθε ανανέωση
+φτιάχνει νέα λίστα (με αντίγραφα μόνο για τα προϊόντα που άλλαξαν) και την αντικαθιστά μαζί με το ευρετήριο.
+"""
+
+import threading
+import time
+from datetime import timedelta
+
+from db import Database, SQL
+
+
+class ProductCatalog:
+    """Εκδοσιοποιημένη, thread-safe cache των προϊόντων με το συνολικό τους απόθεμα.
+
+    Τα προϊόντα κρατιούνται ως συμπαγείς εγγραφές (rows.CompactRow) με πρόσβαση σαν dict. Κάθε προϊόν
+    έχει το φυσικό απόθεμα (stock_qty) και το διαθέσιμο προς υπόσχεση (available_qty, χωρίς τις δεσμεύσεις).
+    """
+
+    # Ασφάλεια: πλήρης επαναφόρτωση το αργότερο τόσο συχνά, ανεξάρτητα από το token.
+    MAX_AGE_SECONDS = 600
+    # Συναλλαγές που κάνουν commit αργότερα από τη χρονοσφραγίδα τους πιάνονται με αυτό το περιθώριο.
+    STOCK_MARGIN = timedelta(seconds=30)
+    # Το token ξαναδιαβάζεται το πολύ τόσο συχνά (ResultCache)· τα τοπικά commits το ακυρώνουν αμέσως.
+    VERSION_TTL_SECONDS = 2
+
+    _lock = threading.RLock()
+    _products = None
+    _by_id = {}
+    _catalog_token = None
+    _stock_key = None
+    _loaded_at = 0.0
+
+    @classmethod
+    def products(cls):
+        """Επιστρέφει τη λίστα προϊόντων (ίδιο αντικείμενο όσο δεν αλλάζει ο κατάλογος)."""
+        with cls._lock:
+            cls._sync()
+            return cls._products
+
+    @classmethod
+    def prices(cls, product_ids):
+        """Επιστρέφει product_id -> τιμή μονάδας για όσα από τα ζητούμενα προϊόντα υπάρχουν."""
+        with cls._lock:
+            cls._sync()
+            return {
+                product_id: float(cls._by_id[product_id]["arx_kostos_temaxiou"])
+                for product_id in product_ids
+                if product_id in cls._by_id
+            }
+
+    @classmethod
+    def invalidate(cls):
+        """Αναγκάζει πλήρη επαναφόρτωση στην επόμενη ανάγνωση."""
+        with cls._lock:
+            cls._products = None
+
+    @classmethod
+    def _sync(cls):
+        """Συγκρίνει το token της βάσης με το τοπικό και φορτώνει μόνο ό,τι άλλαξε."""
+        version = Database.fetch_one(SQL.CATALOG_VERSION, cache=cls.VERSION_TTL_SECONDS) or {}
+        catalog_token = (version.get("max_product_id"), version.get("product_count"), version.get("catalog_key"))
+        stock_key = version.get("stock_key")
+        expired = time.monotonic() - cls._loaded_at > cls.MAX_AGE_SECONDS
+        if cls._products is None or expired or catalog_token != cls._catalog_token:
+            cls._load_all(catalog_token, stock_key)
+        elif stock_key != cls._stock_key:
+            cls._load_stock_changes(stock_key)
+
+    @classmethod
+    def _load_all(cls, catalog_token, stock_key):
+        products = Database.fetch_all(SQL.PHARMACY_PRODUCTS, compact=True)
+        cls._products = products
+        cls._by_id = {product["product_id"]: product for product in products}
+        cls._catalog_token = catalog_token
+        cls._stock_key = stock_key
+        cls._loaded_at = time.monotonic()
+
+    @classmethod
+    def _load_stock_changes(cls, stock_key):
+        if stock_key is None:
+            cls._load_all(cls._catalog_token, stock_key)
+            return
+        if cls._stock_key is None:
+            rows = Database.fetch_all(SQL.INVENTORY_ALL_STOCK, compact=True)
+        else:
+            rows = Database.fetch_all(
+                SQL.STOCK_TOTALS_CHANGED_SINCE, (cls._stock_key - cls.STOCK_MARGIN,), compact=True
+            )
+        changes = {row["product_id"]: (row["qty_in_stock"], row["available"]) for row in rows}
+        if any(product_id not in cls._by_id for product_id in changes):
+            cls._load_all(cls._catalog_token, stock_key)
+            return
+        products = []
+        for product in cls._products:
+            change = changes.get(product["product_id"])
+            if change is not None:
+                product = product.copy()
+                product["stock_qty"], product["available_qty"] = change
+            products.append(product)
+        cls._products = products
+        cls._by_id = {product["product_id"]: product for product in products}
+        cls._stock_key = stock_key
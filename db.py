@@ -1,16 +1,36 @@
 """Στρώμα πρόσβασης σε MySQL (connection pool, helpers, SQL σταθερές)."""
 
+import contextvars
+import functools
 import os
+import random
 import ssl
+import threading
+import time
 from contextlib import contextmanager
 
 import mysql.connector
 from dotenv import load_dotenv
-from mysql.connector.pooling import MySQLConnectionPool
+
+from metrics import POOL_STATEMENT, QueryMetrics, statement_name
+from pool import BROKEN_CONNECTION_ERRORS, ConnectionPool, PoolTimeoutError
+from prepared import StatementCache
+from replicas import Replica, ReplicaSet
+from resultcache import ResultCache, sql_tables
+from rows import compact_rows, record_class
 
 # Φορτώνουμε τις μεταβλητές περιβάλλοντος από αρχείο .env (αν υπάρχει).
 load_dotenv()
 
+# Όσο είναι True στο τρέχον context, όλες οι αναγνώσεις πηγαίνουν στον primary (βλ. Database.use_primary).
+_force_primary = contextvars.ContextVar("force_primary", default=False)
+# Το ενεργό Database.session() του τρέχοντος context (None εκτός session).
+_session = contextvars.ContextVar("db_session", default=None)
+
+# ER_LOCK_DEADLOCK / ER_LOCK_WAIT_TIMEOUT: η συναλλαγή ακυρώνεται χωρίς να έχει γραφτεί τίποτα, άρα
+# μπορεί να ξανατρέξει ολόκληρη (βλ. Database.run_transaction).
+RETRYABLE_TRANSACTION_ERRNOS = frozenset({1213, 1205})
+
 # Προσαρμογή του wrap_socket για νέες εκδόσεις Python όταν απαιτείται.
 if not hasattr(ssl, "wrap_socket"):
 
@@ -46,59 +66,387 @@ if not hasattr(ssl, "wrap_socket"):
     ssl.wrap_socket = _compat_wrap_socket
 
 
+class SqlText(str):
+    """Κείμενο SQL που θυμάται το όνομα της σταθεράς του SQL από την οποία προήλθε (για τις μετρήσεις).
+
+    Δηλώνει επίσης τους πίνακες που διαβάζει (`reads`) και γράφει (`writes`), για την ακύρωση της
+    ResultCache· αν δεν δοθούν, προκύπτουν από το κείμενο (βλ. resultcache.sql_tables).
+    """
+
+    __slots__ = ("name", "reads", "writes")
+
+    def __new__(cls, text, name=None, reads=None, writes=None):
+        obj = super().__new__(cls, text)
+        obj.name = name
+        if reads is None or writes is None:
+            reads, writes = sql_tables(text)
+        obj.reads = reads
+        obj.writes = writes
+        return obj
+
+
+def _derived_sql(sql_template, text):
+    """SqlText για κείμενο που παράχθηκε από template, με το όνομα και τους πίνακες του template."""
+    return SqlText(
+        text,
+        getattr(sql_template, "name", None),
+        getattr(sql_template, "reads", None),
+        getattr(sql_template, "writes", None),
+    )
+
+
 def _in_clause(count):
     """Επιστρέφει placeholders τύπου %s,%s,... για IN clauses."""
     return ",".join(["%s"] * count)
 
 
+@functools.lru_cache(maxsize=1024)
+def _in_clause_sql(sql_template, name, count, width):
+    """Το SqlText του template για `count` τιμές (ή γραμμές με `width` στήλες), ένα αντικείμενο ανά μορφή.
+
+    Ο prepared cursor του connector ξαναχρησιμοποιεί το statement μόνο όταν του δοθεί το ίδιο αντικείμενο
+    query, οπότε κάθε (template, πλήθος) φτιάχνεται μία φορά.
+    """
+    if width is None:
+        placeholders = _in_clause(count)
+    else:
+        placeholders = ",".join([f"({_in_clause(width)})"] * count)
+    return _derived_sql(sql_template, sql_template.format(placeholders=placeholders))
+
+
 def with_in_clause(sql_template, values):
     """Κάνει format σε query με δυναμικό πλήθος placeholders (χρήσιμο για IN ...)."""
     if not values:
         raise ValueError("Values are required for IN clause formatting.")
-    return sql_template.format(placeholders=_in_clause(len(values)))
+    return _in_clause_sql(sql_template, getattr(sql_template, "name", None), len(values), None)
+
+
+def with_row_in_clause(sql_template, rows):
+    """Όπως το with_in_clause αλλά για σύνθετα κλειδιά: (%s,%s),(%s,%s),... για `(a, b) IN (...)`."""
+    if not rows:
+        raise ValueError("Rows are required for IN clause formatting.")
+    return _in_clause_sql(sql_template, getattr(sql_template, "name", None), len(rows), len(rows[0]))
+
+
+def bucketed_in_clause(sql_template, values):
+    """Όπως το with_in_clause αλλά επιστρέφει (query, params) με το πλήθος τιμών στρογγυλεμένο σε δύναμη του 2.
+
+    Όταν είναι ενεργά τα prepared statements οι τιμές συμπληρώνονται με επανάληψη της τελευταίας
+    (ίδιο αποτέλεσμα για IN), ώστε π.χ. 5..8 ids να μοιράζονται ένα prepared statement.
+    """
+    values = list(values)
+    if not values:
+        raise ValueError("Values are required for IN clause formatting.")
+    if StatementCache.enabled:
+        bucket = 1 << (len(values) - 1).bit_length()
+        values.extend([values[-1]] * (bucket - len(values)))
+    return with_in_clause(sql_template, values), values
+
+
+def _shape_rows(name, columns, rows, dictionary=True, compact=False):
+    """Μετατρέπει γραμμές tuple σε CompactRow (compact) ή dict (dictionary), αλλιώς τις αφήνει ως έχουν."""
+    if compact:
+        return compact_rows(name, columns, rows)
+    if dictionary:
+        return [dict(zip(columns, row)) for row in rows]
+    return rows
+
+
+class _InstrumentedCursor:
+    """Περιτύλιγμα cursor που μετρά κάθε execute/executemany και τις γραμμές που διαβάζονται.
+
+    Ο χρόνος αφορά το execute (στους unbuffered cursors το fetch μετρά μόνο σε γραμμές). Τα execute
+    σταθερών SQL με παραμέτρους πηγαίνουν στον prepared cursor της σύνδεσης (StatementCache) και τα
+    fetch επιστρέφουν dicts όπως ο dictionary cursor. Όλα τα υπόλοιπα attributes (lastrowid,
+    rowcount, ...) περνούν στον cursor της τελευταίας εκτέλεσης. Οι πίνακες που γράφονται
+    συγκεντρώνονται στο `written` ώστε το transaction να ακυρώσει την ResultCache μετά το commit.
+    """
+
+    __slots__ = ("_conn", "_cursor", "_active", "_dictionary", "_statement", "written")
+
+    def __init__(self, conn, cursor, dictionary=True):
+        self._conn = conn
+        self._cursor = cursor
+        self._active = cursor
+        self._dictionary = dictionary
+        self._statement = None
+        self.written = set()
+
+    def _record_writes(self, operation):
+        writes = getattr(operation, "writes", None)
+        if writes is None:
+            writes = sql_tables(operation)[1]
+        self.written.update(writes)
+
+    def __getattr__(self, name):
+        return getattr(self._active, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def _timed(self, method, operation, params):
+        started = time.perf_counter()
+        try:
+            result = method(operation, params)
+        except Exception:
+            QueryMetrics.record_query(self._statement, time.perf_counter() - started, error=True)
+            raise
+        QueryMetrics.record_query(self._statement, time.perf_counter() - started)
+        return result
+
+    def execute(self, operation, params=()):
+        self._statement = statement_name(operation)
+        self._record_writes(operation)
+        if StatementCache.applies(getattr(operation, "name", None), params):
+            self._active = StatementCache.cursor(self._conn, self._statement, len(params))
+            return self._timed(functools.partial(StatementCache.execute, self._active), operation, params)
+        self._active = self._cursor
+        return self._timed(self._active.execute, operation, params)
+
+    def executemany(self, operation, seq_params):
+        # Το executemany μένει στον κανονικό cursor, που ενώνει τα INSERT σε ένα multi-row statement.
+        self._statement = statement_name(operation)
+        self._record_writes(operation)
+        self._active = self._cursor
+        return self._timed(self._cursor.executemany, operation, seq_params)
+
+    def _shape(self, rows):
+        if self._active is self._cursor:
+            return rows
+        return _shape_rows(self._statement, self._active.column_names, rows, self._dictionary)
+
+    def fetchone(self):
+        row = self._active.fetchone()
+        if row is None:
+            return None
+        QueryMetrics.record_rows(self._statement, 1)
+        return self._shape([row])[0]
+
+    def fetchmany(self, size=1):
+        rows = self._active.fetchmany(size)
+        QueryMetrics.record_rows(self._statement, len(rows))
+        return self._shape(rows)
+
+    def fetchall(self):
+        rows = self._active.fetchall()
+        QueryMetrics.record_rows(self._statement, len(rows))
+        return self._shape(rows)
+
+
+class _Session:
+    """Οι συνδέσεις ενός Database.session(): μία ανά προορισμό (None = primary, αλλιώς όνομα replica)."""
+
+    __slots__ = ("snapshot", "connections", "in_transaction")
+
+    def __init__(self, snapshot=False):
+        self.snapshot = snapshot
+        self.connections = {}  # key -> (pool, conn)
+        self.in_transaction = False
 
 
 class Database:
     """Βοηθητική κλάση για συνδέσεις MySQL με pool και συναλλαγές."""
 
     _pool = None
+    _replicas = None
+    _pool_lock = threading.Lock()
+    # Μετά από κάθε commit οι αναγνώσεις μένουν στον primary για τόσα δευτερόλεπτα (read-your-writes),
+    # ώστε π.χ. η νέα παραγγελία μετά το create_order ή το ιστορικό μετά το send_order να φαίνονται
+    # αμέσως ακόμη κι αν οι replicas δεν έχουν προλάβει.
+    PRIMARY_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+    _primary_until = 0.0
+    # Στρατηγική για μεγάλες λίστες IN (βλ. fetch_in). Το chunk είναι δύναμη του 2 ώστε να ταιριάζει με τα
+    # buckets των prepared statements.
+    IN_CHUNK_SIZE = int(os.getenv("DB_IN_CHUNK_SIZE", "512"))
+    IN_TEMP_TABLE_THRESHOLD = int(os.getenv("DB_IN_TEMP_TABLE_THRESHOLD", "4096"))
+    IN_TEMP_INSERT_BATCH = 5000
+    # Επαναλήψεις συναλλαγών μετά από deadlock/lock wait timeout (βλ. run_transaction).
+    TX_RETRY_ATTEMPTS = int(os.getenv("DB_TX_RETRY_ATTEMPTS", "5"))
+    TX_RETRY_BASE_DELAY = float(os.getenv("DB_TX_RETRY_BASE_DELAY", "0.02"))
+    TX_RETRY_MAX_DELAY = float(os.getenv("DB_TX_RETRY_MAX_DELAY", "1.0"))
 
     @staticmethod
-    def _config():
+    def _config(host=None, port=None):
         # Διαβάζουμε ρυθμίσεις από μεταβλητές περιβάλλοντος (φορτώνονται μέσω .env).
         return {
-            "host": os.getenv("DB_HOST", "127.0.0.1"),
+            "host": host or os.getenv("DB_HOST", "127.0.0.1"),
             "user": os.getenv("DB_USER", "admin"),
             "password": os.getenv("DB_PASSWORD", "password"),
             "database": os.getenv("DB_NAME", "farmakeio_db"),
-            "port": int(os.getenv("DB_PORT", "3306")),
+            "port": int(port or os.getenv("DB_PORT", "3306")),
         }
 
+    @staticmethod
+    def _new_pool(config, size=None, connect=None):
+        return ConnectionPool(
+            config,
+            size=int(size or os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_POOL_MAX_OVERFLOW", "2")),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            max_age=float(os.getenv("DB_POOL_MAX_AGE", "3600")),
+            ping_on_borrow=os.getenv("DB_POOL_PING", "1") != "0",
+            # Το reset σβήνει τα prepared statements της σύνδεσης, οπότε ξεχνιούνται και από την cache.
+            reset_session=os.getenv("DB_POOL_RESET_SESSION", "1") != "0",
+            on_session_reset=StatementCache.invalidate,
+            connect=connect,
+        )
+
     @classmethod
     def _get_pool(cls):
-        """Δημιουργεί ( μία φορά ) το connection pool ώστε να επαναχρησιμοποιούνται συνδέσεις."""
+        """Δημιουργεί ( μία φορά, thread-safe ) το connection pool ώστε να επαναχρησιμοποιούνται συνδέσεις."""
         if cls._pool is None:
-            pool_size = int(os.getenv("DB_POOL_SIZE", "5"))
-            cls._pool = MySQLConnectionPool(
-                pool_name="farmakeio_pool",
-                pool_size=max(1, pool_size),
-                pool_reset_session=True,
-                **cls._config(),
-            )
+            with cls._pool_lock:
+                if cls._pool is None:
+                    cls._pool = cls._new_pool(cls._config())
         return cls._pool
 
+    @classmethod
+    def _get_replicas(cls):
+        """Οι read replicas από το DB_REPLICAS ("host[:port],host[:port]"), κενό σύνολο αν δεν ορίστηκαν."""
+        if cls._replicas is None:
+            with cls._pool_lock:
+                if cls._replicas is None:
+                    replicas = []
+                    for entry in filter(None, (part.strip() for part in os.getenv("DB_REPLICAS", "").split(","))):
+                        host, _, port = entry.partition(":")
+                        pool = cls._new_pool(cls._config(host, port or None), os.getenv("DB_REPLICA_POOL_SIZE"))
+                        replicas.append(Replica(entry, pool))
+                    cls._replicas = cls._replica_set(replicas)
+        return cls._replicas
+
+    @classmethod
+    def _replica_set(cls, replicas):
+        max_lag = os.getenv("DB_REPLICA_MAX_LAG", "5")
+        return ReplicaSet(
+            replicas,
+            SQL.REPLICA_LAG,
+            max_lag=float(max_lag) if max_lag else None,
+            check_interval=float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5")),
+            cooldown=float(os.getenv("DB_REPLICA_COOLDOWN", "30")),
+        )
+
+    @classmethod
+    def configure_replicas(cls, connect_factories):
+        """Ορίζει replicas από συναρτήσεις σύνδεσης (π.χ. stub για δοκιμές ή δεύτερο τοπικό MySQL)."""
+        replicas = [
+            Replica(f"replica{index}", cls._new_pool({}, connect=factory))
+            for index, factory in enumerate(connect_factories, start=1)
+        ]
+        with cls._pool_lock:
+            cls._replicas = cls._replica_set(replicas)
+
+    @classmethod
+    def pool_stats(cls):
+        """Κατάσταση του pool (in_use, idle, waiters, συνολική αναμονή κ.λπ.)."""
+        return cls._get_pool().stats()
+
+    @classmethod
+    def replica_stats(cls):
+        """Lag, διαθεσιμότητα και pool κάθε replica."""
+        return cls._get_replicas().stats()
+
+    @classmethod
+    def pin_primary(cls, seconds=None):
+        """Κρατά όλες τις αναγνώσεις στον primary για `seconds` (προεπιλογή PRIMARY_STICKY_SECONDS)."""
+        seconds = cls.PRIMARY_STICKY_SECONDS if seconds is None else seconds
+        cls._primary_until = max(cls._primary_until, time.monotonic() + seconds)
+
+    @classmethod
+    @contextmanager
+    def use_primary(cls):
+        """Οι αναγνώσεις μέσα στο block διαβάζουν από τον primary (ρητό pinning για read-after-write)."""
+        token = _force_primary.set(True)
+        try:
+            yield
+        finally:
+            _force_primary.reset(token)
+
+    @classmethod
+    def _read_replica(cls):
+        """Η replica για μια ανάγνωση ή None όταν πρέπει να διαβαστεί ο primary."""
+        session = _session.get()
+        if _force_primary.get() or time.monotonic() < cls._primary_until or (session and session.snapshot):
+            return None
+        replicas = cls._get_replicas()
+        return replicas.choose() if replicas.replicas else None
+
     @classmethod
     @contextmanager
-    def connect(cls):
-        """Επιστρέφει context manager με ανοιχτή σύνδεση (fallback χωρίς pool αν αποτύχει)."""
+    def session(cls, *, snapshot=False):
+        """Unit of work: όλες οι κλήσεις του block (και των repositories που καλεί) μοιράζονται συνδέσεις.
+
+        Η πρώτη ανάγνωση/συναλλαγή δανείζεται σύνδεση (μία για τον primary και μία για κάθε replica
+        που χρησιμοποιηθεί) και οι επόμενες την ξαναχρησιμοποιούν, χωρίς νέο δανεισμό, ping και reset.
+        Οι αναγνώσεις εκτός συναλλαγής μοιράζονται το read view της InnoDB μέχρι την επόμενη
+        transaction() του session, που ξεκινά πάντα με φρέσκια εικόνα. Με snapshot=True όλες οι
+        αναγνώσεις γίνονται στον primary μέσα σε μία START TRANSACTION WITH CONSISTENT SNAPSHOT,
+        READ ONLY (χωρίς εγγραφές). Φωλιασμένα session χρησιμοποιούν το εξωτερικό.
+        """
+        if _session.get() is not None:
+            yield
+            return
+        session = _Session(snapshot)
+        token = _session.set(session)
         try:
-            conn = cls._get_pool().get_connection()
-        except mysql.connector.Error:
-            conn = mysql.connector.connect(**cls._config())
+            if snapshot:
+                with cls.connect() as conn:
+                    conn.start_transaction(consistent_snapshot=True, readonly=True)
+            yield
+        finally:
+            _session.reset(token)
+            for pool, conn in session.connections.values():
+                pool.release(conn)
+
+    @classmethod
+    @contextmanager
+    def connect(cls, statement=POOL_STATEMENT, replica=None, *, shared=True):
+        """Επιστρέφει context manager με δανεισμένη σύνδεση από το pool (του primary ή της `replica`).
+
+        Αν το pool είναι γεμάτο περιμένει έως DB_POOL_TIMEOUT και μετά σηκώνει PoolTimeoutError
+        (mysql.connector.Error). Ο χρόνος απόκτησης καταγράφεται στις μετρήσεις της εντολής `statement`.
+        Μέσα σε session() επιστρέφεται η σύνδεση του session, εκτός αν shared=False.
+        """
+        session = _session.get() if shared else None
+        if session is not None:
+            with cls._session_connection(session, statement, replica) as conn:
+                yield conn
+            return
+        pool = replica.pool if replica is not None else cls._get_pool()
+        started = time.perf_counter()
+        conn = pool.acquire()
+        QueryMetrics.record_acquire(statement, time.perf_counter() - started)
+        discard = False
         try:
             yield conn
+        except (GeneratorExit, *BROKEN_CONNECTION_ERRORS):
+            # GeneratorExit: stream που διακόπηκε με αδιάβαστες γραμμές· η σύνδεση δεν επαναχρησιμοποιείται.
+            discard = True
+            raise
         finally:
-            conn.close()
+            pool.release(conn, discard=discard)
+
+    @classmethod
+    @contextmanager
+    def _session_connection(cls, session, statement, replica):
+        """Η σύνδεση του session για τον προορισμό· δανείζεται στην πρώτη χρήση και επιστρέφεται στο τέλος του session."""
+        key = replica.name if replica is not None else None
+        entry = session.connections.get(key)
+        if entry is None:
+            pool = replica.pool if replica is not None else cls._get_pool()
+            started = time.perf_counter()
+            entry = (pool, pool.acquire())
+            QueryMetrics.record_acquire(statement, time.perf_counter() - started)
+            session.connections[key] = entry
+        else:
+            QueryMetrics.increment("session_connection_reuse")
+        pool, conn = entry
+        try:
+            yield conn
+        except BROKEN_CONNECTION_ERRORS:
+            # Η χαλασμένη σύνδεση πετιέται· η επόμενη κλήση του session δανείζεται καινούργια.
+            session.connections.pop(key, None)
+            pool.release(conn, discard=True)
+            raise
 
     @classmethod
     @contextmanager
@@ -107,57 +455,404 @@ class Database:
         with cls.connect() as conn:
             cur = conn.cursor(dictionary=dictionary)
             try:
-                yield cur
+                yield _InstrumentedCursor(conn, cur, dictionary)
             finally:
                 cur.close()
 
     @classmethod
     @contextmanager
     def transaction(cls, *, dictionary=True):
-        """Εκτελεί block με αυτόματο commit/rollback (χρήσιμο για πολλαπλές εντολές)."""
+        """Εκτελεί block με αυτόματο commit/rollback (χρήσιμο για πολλαπλές εντολές).
+
+        Τρέχει πάντα στον primary· μετά το commit ενεργοποιεί το pin_primary και ακυρώνει στην
+        ResultCache ό,τι διαβάζει πίνακες που γράφτηκαν, ώστε οι αμέσως επόμενες αναγνώσεις να
+        βλέπουν τις αλλαγές.
+        """
+        session = _session.get()
+        if session is not None and (session.snapshot or session.in_transaction):
+            raise RuntimeError("Δεν επιτρέπεται συναλλαγή μέσα σε session με snapshot ή σε άλλη συναλλαγή.")
         with cls.connect() as conn:
+            if session is not None:
+                if conn.in_transaction:
+                    # Κλείνει το read view των προηγούμενων αναγνώσεων του session.
+                    conn.rollback()
+                session.in_transaction = True
             cur = conn.cursor(dictionary=dictionary)
             try:
-                yield cur
+                instrumented = _InstrumentedCursor(conn, cur, dictionary)
+                yield instrumented
                 conn.commit()
+                cls.pin_primary()
+                ResultCache.invalidate_tables(instrumented.written)
             except Exception:
                 conn.rollback()
                 raise
             finally:
                 cur.close()
+                if session is not None:
+                    session.in_transaction = False
+
+    @classmethod
+    def run_transaction(cls, work, *, dictionary=True, name=None, attempts=None):
+        """Εκτελεί `work(cur)` σε συναλλαγή και την ξανατρέχει ολόκληρη σε deadlock (1213) ή lock wait timeout (1205).
+
+        Ανάμεσα στις προσπάθειες περιμένει τυχαίο χρόνο έως BASE * 2^n (full jitter, με ανώτατο
+        TX_RETRY_MAX_DELAY), ώστε οι συναλλαγές που συγκρούστηκαν να μην ξανασυγκρουστούν αμέσως.
+        Επιστρέφει ό,τι επιστρέψει το `work`. Το `work` πρέπει να κάνει όλους τους ελέγχους
+        κατάστασης μέσα στη συναλλαγή (π.χ. "υπάρχει ήδη αποστολή") και να μην έχει παρενέργειες εκτός
+        βάσης, ώστε η επανάληψη να είναι ασφαλής. Άλλα σφάλματα (και η τελευταία αποτυχία) περνούν
+        στον καλούντα. Οι επαναλήψεις καταγράφονται στους μετρητές tx_retry / tx_retry_exhausted.
+        """
+        name = name or getattr(work, "__qualname__", None) or "transaction"
+        attempts = max(1, cls.TX_RETRY_ATTEMPTS if attempts is None else attempts)
+        for attempt in range(attempts):
+            try:
+                with cls.transaction(dictionary=dictionary) as cur:
+                    return work(cur)
+            except mysql.connector.Error as exc:
+                if exc.errno not in RETRYABLE_TRANSACTION_ERRNOS:
+                    raise
+                if attempt + 1 >= attempts:
+                    QueryMetrics.increment(f"tx_retry_exhausted:{name}")
+                    raise
+                QueryMetrics.increment(f"tx_retry:{name}")
+                QueryMetrics.increment(f"tx_retry_errno:{exc.errno}")
+                time.sleep(random.uniform(0, min(cls.TX_RETRY_MAX_DELAY, cls.TX_RETRY_BASE_DELAY * 2 ** attempt)))
+
+    @classmethod
+    def fetch_all(cls, query, params=None, *, primary=False, compact=False, cache=False):
+        """Εκτελεί SELECT που επιστρέφει λίστες εγγραφών (ή κενή λίστα).
+
+        Διαβάζει από replica αν υπάρχει υγιής, εκτός αν primary=True ή ισχύει pinning στον primary.
+        Με compact=True οι γραμμές είναι rows.CompactRow (__slots__ ανά statement, πρόσβαση σαν dict).
+        Με cache=True (ή TTL σε δευτερόλεπτα) το αποτέλεσμα περνά από την ResultCache.
+        """
+        return cls._cached_fetch(query, params, False, primary, compact, cache)
 
     @classmethod
-    def fetch_all(cls, query, params=None):
-        """Εκτελεί SELECT που επιστρέφει λίστες εγγραφών (ή κενή λίστα)."""
-        with cls.cursor(dictionary=True) as cur:
-            cur.execute(query, params or ())
-            return cur.fetchall() or []
+    def fetch_one(cls, query, params=None, *, primary=False, compact=False, cache=False):
+        """Εκτελεί SELECT που περιμένει μοναδικό αποτέλεσμα (ίδια δρομολόγηση και cache με το fetch_all)."""
+        return cls._cached_fetch(query, params, True, primary, compact, cache)
 
     @classmethod
-    def fetch_one(cls, query, params=None):
-        """Εκτελεί SELECT που περιμένει μοναδικό αποτέλεσμα."""
-        with cls.cursor(dictionary=True) as cur:
-            cur.execute(query, params or ())
-            return cur.fetchone()
+    def _cached_fetch(cls, query, params, one, primary, compact, cache):
+        """Εξυπηρετεί από την ResultCache όταν ζητηθεί· αλλιώς (ή σε miss) εκτελεί κανονικά το query.
+
+        Το κλειδί είναι (εντολή, παράμετροι, μορφή)· οι ετικέτες είναι οι πίνακες που δηλώνει ότι
+        διαβάζει το query. Το primary=True παρακάμπτει την cache, αφού ζητά την πιο φρέσκια εικόνα, και
+        εντολές εκτός ResultCache.STATEMENTS εκτελούνται πάντα.
+        """
+        name = getattr(query, "name", None)
+        if cache is False or primary or not ResultCache.applies(name):
+            return cls._routed_fetch(query, params, one, primary, compact)
+        key = (name, tuple(params or ()), one, compact)
+        hit, result = ResultCache.get(key)
+        if hit:
+            return result
+        tables = getattr(query, "reads", None)
+        if tables is None:
+            tables = sql_tables(query)[0]
+        generation = ResultCache.generation(tables)
+        result = cls._routed_fetch(query, params, one, primary, compact)
+        ttl = None if cache is True else float(cache)
+        ResultCache.put(key, tables, result, generation, ttl)
+        return result
+
+    @classmethod
+    def fetch_in(cls, template, ids, *, compact=False):
+        """Εκτελεί SELECT με `IN ({placeholders})` για οσαδήποτε ids, χωρίς τεράστια statements.
+
+        Έως IN_CHUNK_SIZE ids: ένα query. Περισσότερα: παρτίδες των IN_CHUNK_SIZE και ένωση των
+        αποτελεσμάτων στην Python. Πάνω από IN_TEMP_TABLE_THRESHOLD, αν το template έχει εκδοχή με
+        προσωρινό πίνακα (IN_TEMP_TABLE_QUERIES), τα ids φορτώνονται στον TMP_IN_IDS της σύνδεσης
+        και γίνεται ένα JOIN. Όσες φορές εμφανίζεται το {placeholders} στο template, τόσες
+        επαναλαμβάνονται τα ids στις παραμέτρους.
+        """
+        ids = sorted(set(ids))
+        if not ids:
+            return []
+        temp_query = IN_TEMP_TABLE_QUERIES.get(getattr(template, "name", None))
+        if temp_query is not None and len(ids) > cls.IN_TEMP_TABLE_THRESHOLD:
+            return cls._fetch_via_temp_ids(temp_query, ids, compact)
+        occurrences = template.count("{placeholders}")
+        rows = []
+        for start in range(0, len(ids), cls.IN_CHUNK_SIZE):
+            query, chunk = bucketed_in_clause(template, ids[start:start + cls.IN_CHUNK_SIZE])
+            rows.extend(cls.fetch_all(query, chunk * occurrences, compact=compact))
+        return rows
+
+    @classmethod
+    def _fetch_via_temp_ids(cls, query, ids, compact):
+        """Γεμίζει τον προσωρινό TMP_IN_IDS με τα ids και εκτελεί το query που κάνει JOIN σε αυτόν.
+
+        Τρέχει στον primary, σε μία σύνδεση· ο πίνακας σβήνεται στο τέλος αφού το pool δεν κάνει
+        πάντα reset session.
+        """
+        name = statement_name(query)
+        with cls.connect(name) as conn:
+            cur = _InstrumentedCursor(conn, conn.cursor(dictionary=not compact), not compact)
+            try:
+                cur.execute(SQL.DROP_TEMP_IN_IDS)
+                cur.execute(SQL.CREATE_TEMP_IN_IDS)
+                for start in range(0, len(ids), cls.IN_TEMP_INSERT_BATCH):
+                    cur.executemany(SQL.INSERT_TEMP_IN_IDS, [(i,) for i in ids[start:start + cls.IN_TEMP_INSERT_BATCH]])
+                cur.execute(query)
+                rows = cur.fetchall() or []
+                if compact:
+                    rows = compact_rows(name, cur.column_names, rows)
+            finally:
+                try:
+                    cur.execute(SQL.DROP_TEMP_IN_IDS)
+                finally:
+                    cur.close()
+        return rows
+
+    @classmethod
+    def stream(cls, query, params=None, batch_size=1000, *, batches=False, primary=False):
+        """Generator πάνω σε μεγάλα αποτελέσματα με unbuffered cursor: φέρνει `batch_size` γραμμές τη φορά.
+
+        Επιστρέφει μία-μία τις γραμμές (ή λίστες έως batch_size με batches=True), οπότε η μνήμη
+        εξαρτάται από το batch και όχι από το μέγεθος του αποτελέσματος. Η σύνδεση μένει δανεισμένη
+        μέχρι να εξαντληθεί ή να κλείσει ο generator· αν κλείσει νωρίτερα, η σύνδεση απορρίπτεται
+        αντί να διαβαστούν οι υπόλοιπες γραμμές.
+        """
+        name = statement_name(query)
+        replica = None if primary else cls._read_replica()
+        # Δική του σύνδεση ακόμη και μέσα σε session: ο unbuffered cursor την κρατά μέχρι το τέλος.
+        with cls.connect(name, replica, shared=False) as conn:
+            cur = conn.cursor(dictionary=True, buffered=False)
+            started = time.perf_counter()
+            rows = 0
+            finished = False
+            try:
+                cur.execute(query, params or ())
+                while True:
+                    batch = cur.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    rows += len(batch)
+                    if batches:
+                        yield batch
+                    else:
+                        yield from batch
+                finished = True
+            except Exception:
+                QueryMetrics.record_query(name, time.perf_counter() - started, rows, error=True)
+                raise
+            finally:
+                try:
+                    cur.close()
+                except mysql.connector.Error:
+                    # Αδιάβαστες γραμμές μετά από πρόωρο κλείσιμο· η σύνδεση απορρίπτεται στο connect.
+                    if finished:
+                        raise
+            QueryMetrics.record_query(name, time.perf_counter() - started, rows)
+
+    @classmethod
+    def _routed_fetch(cls, query, params, one, primary, compact=False):
+        """Στέλνει την ανάγνωση σε replica· αν η replica αποτύχει σε επίπεδο σύνδεσης ή το pool της
+        είναι γεμάτο, ξαναδοκιμάζει στον primary."""
+        replica = None if primary else cls._read_replica()
+        if replica is not None:
+            try:
+                return cls._timed_fetch(query, params, one, replica, compact)
+            except BROKEN_CONNECTION_ERRORS:
+                cls._get_replicas().mark_failed(replica)
+            except PoolTimeoutError:
+                QueryMetrics.increment("replica_fallback_primary")
+        return cls._timed_fetch(query, params, one, None, compact)
+
+    @classmethod
+    def _timed_fetch(cls, query, params, one, replica=None, compact=False):
+        """Εκτελεί το query και καταγράφει χρόνο execute+fetch, γραμμές και αναμονή σύνδεσης.
+
+        Σταθερές SQL με παραμέτρους εκτελούνται ως prepared statements (StatementCache) όταν είναι ενεργά.
+        """
+        name = statement_name(query)
+        with cls.connect(name, replica) as conn:
+            prepared = StatementCache.applies(getattr(query, "name", None), params)
+            if prepared:
+                cur = StatementCache.cursor(conn, name, len(params))
+            else:
+                cur = conn.cursor(dictionary=not compact)
+            started = time.perf_counter()
+            try:
+                if prepared:
+                    StatementCache.execute(cur, query, params)
+                    # Διαβάζουμε πάντα ως το τέλος ώστε ο cursor να είναι έτοιμος για την επόμενη εκτέλεση.
+                    rows = _shape_rows(name, cur.column_names, cur.fetchall(), compact=compact)
+                    result = (rows[0] if rows else None) if one else rows
+                else:
+                    cur.execute(query, params or ())
+                    if one:
+                        result = cur.fetchone()
+                        if compact and result is not None:
+                            result = record_class(name, cur.column_names)(result)
+                    else:
+                        result = cur.fetchall() or []
+                        if compact:
+                            result = compact_rows(name, cur.column_names, result)
+            except Exception:
+                QueryMetrics.record_query(name, time.perf_counter() - started, error=True)
+                if prepared:
+                    StatementCache.invalidate(conn)
+                raise
+            finally:
+                if not prepared:
+                    cur.close()
+            elapsed = time.perf_counter() - started
+        rows = len(result) if isinstance(result, list) else int(result is not None)
+        QueryMetrics.record_query(name, elapsed, rows)
+        return result
 
 
 class SQL:
     """Σταθερές SQL εντολών για αποφυγή διαρροής κειμένων σε άλλα modules."""
 
-    # Επιστρέφει τη διαθεσιμότητα αποθέματος για συγκεκριμένα product_ids.
+    # Επιστρέφει τη διαθεσιμότητα (available-to-promise: απόθεμα μείον δεσμεύσεις) για συγκεκριμένα product_ids.
     INVENTORY_AVAILABLE_BY_IDS = """
-        SELECT product_id, COALESCE(SUM(qty_in_stock), 0) AS available
-        FROM PROION_YPARXEI_APOTHIKI_THESI
+        SELECT product_id, GREATEST(qty_diathesimo, 0) AS available
+        FROM PROION_SYNOLIKO_APOTHEMA
         WHERE product_id IN ({placeholders})
-        GROUP BY product_id
     """
-    # Όλη η αποθήκη συγκεντρωτικά για κάθε προϊόν (για γρήγορη εικόνα αποθεμάτων).
+    INVENTORY_AVAILABLE_BY_TEMP_IDS = """
+        SELECT s.product_id, GREATEST(s.qty_diathesimo, 0) AS available
+        FROM TMP_IN_IDS t
+        JOIN PROION_SYNOLIKO_APOTHEMA s ON s.product_id = t.id
+    """
+    # Όλη η αποθήκη συγκεντρωτικά για κάθε προϊόν: φυσικό απόθεμα και διαθέσιμο (χωρίς τις δεσμεύσεις).
     INVENTORY_ALL_STOCK = """
-        SELECT product_id, COALESCE(SUM(qty_in_stock), 0) AS available
-        FROM PROION_YPARXEI_APOTHIKI_THESI
-        GROUP BY product_id
+        SELECT product_id, qty_in_stock, GREATEST(qty_diathesimo, 0) AS available
+        FROM PROION_SYNOLIKO_APOTHEMA
+    """
+    # ADJUST_STOCK_TOTALS: προσθέτει (ή αφαιρεί με αρνητικό delta) τεμάχια στο σύνολο ενός προϊόντος.
+    # Με executemany στέλνεται ως ένα multi-row INSERT για όλα τα προϊόντα μιας συναλλαγής.
+    ADJUST_STOCK_TOTALS = """
+        INSERT INTO PROION_SYNOLIKO_APOTHEMA (product_id, qty_in_stock)
+        VALUES (%s,%s)
+        ON DUPLICATE KEY UPDATE qty_in_stock = qty_in_stock + VALUES(qty_in_stock)
+    """
+    # STOCK_TOTALS_DRIFT: προϊόντα όπου το αποθηκευμένο σύνολο διαφέρει από το πραγματικό SUM των θέσεων.
+    STOCK_TOTALS_DRIFT = """
+        SELECT p.product_id,
+               COALESCE(t.qty_in_stock, 0) AS recorded,
+               COALESCE(s.actual, 0) AS actual
+        FROM PROION p
+        LEFT JOIN PROION_SYNOLIKO_APOTHEMA t ON t.product_id = p.product_id
+        LEFT JOIN (
+            SELECT product_id, SUM(qty_in_stock) AS actual
+            FROM PROION_YPARXEI_APOTHIKI_THESI
+            GROUP BY product_id
+        ) s ON s.product_id = p.product_id
+        WHERE COALESCE(t.qty_in_stock, 0) <> COALESCE(s.actual, 0)
+        ORDER BY p.product_id
+    """
+    # REBUILD_STOCK_TOTALS: ξαναϋπολογίζει όλα τα σύνολα από τις θέσεις (backfill ή διόρθωση απόκλισης).
+    REBUILD_STOCK_TOTALS = """
+        INSERT INTO PROION_SYNOLIKO_APOTHEMA (product_id, qty_in_stock)
+        SELECT p.product_id, COALESCE(SUM(s.qty_in_stock), 0) AS total
+        FROM PROION p
+        LEFT JOIN PROION_YPARXEI_APOTHIKI_THESI s ON s.product_id = p.product_id
+        GROUP BY p.product_id
+        ON DUPLICATE KEY UPDATE qty_in_stock = VALUES(qty_in_stock)
     """
 
+    # INSERT_RESERVATION: δέσμευση τεμαχίων μιας γραμμής παραγγελίας (executemany για όλες τις γραμμές).
+    INSERT_RESERVATION = """
+        INSERT INTO PARAGGELIA_DESMEUSI (order_id, product_id, temaxia)
+        VALUES (%s,%s,%s)
+    """
+    # ADJUST_RESERVED_TOTALS: όπως το ADJUST_STOCK_TOTALS αλλά για τα δεσμευμένα τεμάχια ανά προϊόν.
+    ADJUST_RESERVED_TOTALS = """
+        INSERT INTO PROION_SYNOLIKO_APOTHEMA (product_id, qty_desmeumeno)
+        VALUES (%s,%s)
+        ON DUPLICATE KEY UPDATE qty_desmeumeno = qty_desmeumeno + VALUES(qty_desmeumeno)
+    """
+    # RELEASE_RESERVED_TOTALS: αφαιρεί από τα σύνολα τις δεσμεύσεις των παραγγελιών. Το SUM ανά προϊόν
+    # χρειάζεται γιατί το multi-table UPDATE ενημερώνει κάθε γραμμή στόχου μόνο μία φορά.
+    RELEASE_RESERVED_TOTALS = """
+        UPDATE PROION_SYNOLIKO_APOTHEMA t
+        JOIN (
+            SELECT product_id, SUM(temaxia) AS temaxia
+            FROM PARAGGELIA_DESMEUSI
+            WHERE order_id IN ({placeholders})
+            GROUP BY product_id
+        ) r ON r.product_id = t.product_id
+        SET t.qty_desmeumeno = t.qty_desmeumeno - r.temaxia
+    """
+    DELETE_RESERVATIONS = "DELETE FROM PARAGGELIA_DESMEUSI WHERE order_id IN ({placeholders})"
+    # ORDER_RESERVATIONS: οι δεσμεύσεις των παραγγελιών που πρόκειται να αποσταλούν.
+    ORDER_RESERVATIONS = """
+        SELECT order_id, product_id, temaxia
+        FROM PARAGGELIA_DESMEUSI
+        WHERE order_id IN ({placeholders})
+    """
+    # FREE_STOCK_FOR_UPDATE: αδέσμευτο απόθεμα ανά προϊόν, κλειδωμένο για την αποστολή/δέσμευση.
+    FREE_STOCK_FOR_UPDATE = """
+        SELECT product_id, qty_diathesimo
+        FROM PROION_SYNOLIKO_APOTHEMA
+        WHERE product_id IN ({placeholders})
+        ORDER BY product_id
+        FOR UPDATE
+    """
+    # ORDER_ITEMS_FOR_RESERVATION: ζητούμενα τεμάχια μιας παραγγελίας (για νέα δέσμευση μετά από επαναφορά ακύρωσης).
+    ORDER_ITEMS_FOR_RESERVATION = "SELECT product_id, temaxia_zitisis FROM PARAGGELEIA_PERIEXEI_PROION WHERE order_id = %s"
+    # RESERVED_TOTALS_DRIFT: προϊόντα όπου το qty_desmeumeno διαφέρει από το SUM των δεσμεύσεων.
+    RESERVED_TOTALS_DRIFT = """
+        SELECT t.product_id,
+               t.qty_desmeumeno AS recorded,
+               COALESCE(r.actual, 0) AS actual
+        FROM PROION_SYNOLIKO_APOTHEMA t
+        LEFT JOIN (
+            SELECT product_id, SUM(temaxia) AS actual
+            FROM PARAGGELIA_DESMEUSI
+            GROUP BY product_id
+        ) r ON r.product_id = t.product_id
+        WHERE t.qty_desmeumeno <> COALESCE(r.actual, 0)
+        ORDER BY t.product_id
+    """
+    # REBUILD_RESERVED_TOTALS: ξαναϋπολογίζει το qty_desmeumeno όλων των προϊόντων από τις δεσμεύσεις.
+    REBUILD_RESERVED_TOTALS = """
+        UPDATE PROION_SYNOLIKO_APOTHEMA t
+        LEFT JOIN (
+            SELECT product_id, SUM(temaxia) AS actual
+            FROM PARAGGELIA_DESMEUSI
+            GROUP BY product_id
+        ) r ON r.product_id = t.product_id
+        SET t.qty_desmeumeno = COALESCE(r.actual, 0)
+    """
+    CLEAR_RESERVATIONS = "DELETE FROM PARAGGELIA_DESMEUSI"
+    # BACKFILL_RESERVATIONS: δεσμεύει απόθεμα για όλες τις εκκρεμείς παραγγελίες χωρίς αποστολή, με σειρά
+    # παλαιότητας ανά προϊόν (ό,τι προηγείται "τρώει" πρώτο από το φυσικό απόθεμα). Παράμετροι οι καταστάσεις.
+    BACKFILL_RESERVATIONS = """
+        INSERT INTO PARAGGELIA_DESMEUSI (order_id, product_id, temaxia)
+        SELECT order_id, product_id, LEAST(temaxia_zitisis, GREATEST(0, stock - prior)) AS temaxia
+        FROM (
+            SELECT i.order_id,
+                   i.product_id,
+                   i.temaxia_zitisis,
+                   COALESCE(t.qty_in_stock, 0) AS stock,
+                   COALESCE(SUM(i.temaxia_zitisis) OVER (
+                       PARTITION BY i.product_id
+                       ORDER BY p.hm_ora_ektelesis, p.order_id
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                   ), 0) AS prior
+            FROM PARAGGELEIA_PERIEXEI_PROION i
+            JOIN PARAGGELIA p ON p.order_id = i.order_id
+            LEFT JOIN PROION_SYNOLIKO_APOTHEMA t ON t.product_id = i.product_id
+            WHERE p.katastasi IN (%s, %s) AND p.teleftaia_apostoli_id IS NULL
+        ) x
+        WHERE LEAST(temaxia_zitisis, GREATEST(0, stock - prior)) > 0
+    """
+
+    # Προσωρινός πίνακας ids της σύνδεσης για μεγάλες λίστες IN (Database.fetch_in).
+    CREATE_TEMP_IN_IDS = "CREATE TEMPORARY TABLE TMP_IN_IDS (id INT NOT NULL PRIMARY KEY) ENGINE=MEMORY"
+    INSERT_TEMP_IN_IDS = "INSERT IGNORE INTO TMP_IN_IDS (id) VALUES (%s)"
+    DROP_TEMP_IN_IDS = "DROP TEMPORARY TABLE IF EXISTS TMP_IN_IDS"
+
+    # REPLICA_LAG: Seconds_Behind_Source μιας replica (χρησιμοποιείται από το replicas.ReplicaSet).
+    REPLICA_LAG = "SHOW REPLICA STATUS"
+
     # USER_EXISTS: γρήγορος έλεγχος ύπαρξης username (χρησιμοποιείται στην εγγραφή).
     USER_EXISTS = "SELECT 1 FROM XRISTIS WHERE username = %s"
     # PHARMACY_AFM_EXISTS: διασφαλίζει ότι ένα ΑΦΜ δεν έχει δηλωθεί από άλλο φαρμακείο.
@@ -181,7 +876,8 @@ class SQL:
         WHERE x.username = %s
     """
 
-    # PHARMACY_PRODUCTS: επιστρέφει το master list προϊόντων μαζί με συνολικό stock (join με αποθήκη).
+    # PHARMACY_PRODUCTS: επιστρέφει το master list προϊόντων μαζί με συνολικό stock και το διαθέσιμο (χωρίς τις
+    # δεσμεύσεις εκκρεμών παραγγελιών), από τα σύνολα αποθέματος.
     PHARMACY_PRODUCTS = """
         SELECT p.product_id,
                p.onoma,
@@ -189,12 +885,26 @@ class SQL:
                p.arx_kostos_temaxiou,
                p.etairia,
                p.periektikotita,
-               COALESCE(SUM(s.qty_in_stock), 0) AS stock_qty
+               COALESCE(t.qty_in_stock, 0) AS stock_qty,
+               GREATEST(COALESCE(t.qty_diathesimo, 0), 0) AS available_qty
         FROM PROION p
-        LEFT JOIN PROION_YPARXEI_APOTHIKI_THESI s ON s.product_id = p.product_id
-        GROUP BY p.product_id, p.onoma, p.katigoria, p.arx_kostos_temaxiou, p.etairia, p.periektikotita
+        LEFT JOIN PROION_SYNOLIKO_APOTHEMA t ON t.product_id = p.product_id
         ORDER BY p.onoma
     """
+    # CATALOG_VERSION: φθηνό token αλλαγών για τη cache καταλόγου (MAX πάνω σε indexes· το COUNT(*) πιάνει
+    # διαγραφές προϊόντων που δεν αλλάζουν ούτε το MAX(product_id) ούτε το MAX(enimerothike)).
+    CATALOG_VERSION = """
+        SELECT (SELECT MAX(product_id) FROM PROION) AS max_product_id,
+               (SELECT COUNT(*) FROM PROION) AS product_count,
+               (SELECT MAX(enimerothike) FROM PROION) AS catalog_key,
+               (SELECT MAX(enimerothike) FROM PROION_SYNOLIKO_APOTHEMA) AS stock_key
+    """
+    # STOCK_TOTALS_CHANGED_SINCE: μόνο τα σύνολα που άλλαξαν από μια χρονοσφραγίδα (incremental ανανέωση cache).
+    STOCK_TOTALS_CHANGED_SINCE = """
+        SELECT product_id, qty_in_stock, GREATEST(qty_diathesimo, 0) AS available
+        FROM PROION_SYNOLIKO_APOTHEMA
+        WHERE enimerothike >= %s
+    """
     # PHARMACY_AFM: παίρνει το ΑΦΜ του φαρμακείου με βάση το username του XRISTIS.
     PHARMACY_AFM = "SELECT afm FROM FARMAKEIO WHERE username = %s"
     # PHARMACY_CONTRACTS: φέρνει όλα τα συμβόλαια ενός φαρμακείου ταξινομημένα με πιο πρόσφατη υπογραφή.
@@ -239,12 +949,45 @@ class SQL:
         FROM PROION
         WHERE product_id IN ({placeholders})
     """
+    PRODUCT_PRICES_BY_TEMP_IDS = """
+        SELECT p.product_id, p.arx_kostos_temaxiou
+        FROM TMP_IN_IDS t
+        JOIN PROION p ON p.product_id = t.id
+    """
     # PRODUCT_NAMES_BY_IDS: παίρνει τα ονόματα ώστε να εμπλουτίσουμε JSON παραγγελίες προμηθευτή.
     PRODUCT_NAMES_BY_IDS = """
         SELECT product_id, onoma
         FROM PROION
         WHERE product_id IN ({placeholders})
     """
+    # ORDER_PRICING_LOCKED: όλα όσα χρειάζεται η τιμολόγηση μιας νέας παραγγελίας σε ένα query: ΑΦΜ του
+    # φαρμακείου, το τρέχον συμβόλαιο (το ενεργό, αλλιώς το πιο πρόσφατο, όπως το select_current_contract·
+    # παράμετρος η σημερινή ημερομηνία) και οι τιμές των προϊόντων, με shared lock στις
+    # γραμμές PROION ώστε η τιμή να μην αλλάξει πριν το commit. Επιστρέφει και το αδέσμευτο απόθεμα (atp) με
+    # αποκλειστικό lock στα σύνολα, για τη δέσμευση της ίδιας συναλλαγής. Μία γραμμή ανά προϊόν (product_id
+    # NULL αν δεν βρέθηκε κανένα)· καμία γραμμή αν δεν υπάρχει το φαρμακείο.
+    ORDER_PRICING_LOCKED = """
+        SELECT f.afm,
+               s.hm_ypografis,
+               s.hm_liksis,
+               s.diarkeia_mhnwn,
+               p.product_id,
+               p.arx_kostos_temaxiou,
+               GREATEST(COALESCE(t.qty_diathesimo, 0), 0) AS atp
+        FROM FARMAKEIO f
+        LEFT JOIN SYMBOLAIO s ON s.agreement_id = (
+            SELECT s2.agreement_id
+            FROM SYMBOLAIO s2
+            WHERE s2.afm_farmakeiou = f.afm
+            ORDER BY s2.hm_liksis > %s DESC, s2.hm_ypografis DESC
+            LIMIT 1
+        )
+        LEFT JOIN PROION p ON p.product_id IN ({placeholders})
+        LEFT JOIN PROION_SYNOLIKO_APOTHEMA t ON t.product_id = p.product_id
+        WHERE f.username = %s
+        FOR SHARE OF p
+        FOR UPDATE OF t
+    """
     # INSERT_ORDER: δημιουργεί την κεφαλίδα παραγγελίας (κατάσταση, κόστος, έκπτωση, αφμ, timestamp).
     INSERT_ORDER = """
         INSERT INTO PARAGGELIA (katastasi, arxiko_kostos, ekptosi, afm_farmakeiou, hm_ora_ektelesis)
@@ -255,60 +998,77 @@ class SQL:
         INSERT INTO PARAGGELEIA_PERIEXEI_PROION (order_id, product_id, temaxia_zitisis)
         VALUES (%s,%s,%s)
     """
-    # ORDER_HISTORY: φέρνει όλες τις παραγγελίες φαρμακείου και κάνει LEFT JOIN με max(hm_ora_apostolis)
-    # ώστε να εμφανίζεται η τελευταία αποστολή (αν υπάρχει). Η υποερώτηση ship ομαδοποιεί ανά order_id.
+    # ORDER_HISTORY: φέρνει μία σελίδα παραγγελιών φαρμακείου μαζί με την τελευταία αποστολή (αν υπάρχει),
+    # από τις στήλες teleftaia_apostoli_* της PARAGGELIA που ενημερώνει κάθε νέα αποστολή (SET_LATEST_SHIPMENT).
+    # Keyset σελιδοποίηση: παραγγελίες πριν από τον cursor (after_executed_at, after_order_id) με LIMIT,
+    # ώστε κάθε σελίδα να είναι range scan στο idx_paraggelia_afm_date όσο παλιό κι αν είναι το ιστορικό.
     ORDER_HISTORY = """
         SELECT p.order_id,
                p.hm_ora_ektelesis AS executed_at,
                p.katastasi,
                p.arxiko_kostos,
-               ship.hm_ora_apostolis AS shipment_at,
-               ship.katastasi AS shipment_status
+               p.teleftaia_apostoli_id AS shipment_id,
+               p.hm_ora_teleftaias_apostolis AS shipment_at,
+               p.katastasi_teleftaias_apostolis AS shipment_status
         FROM PARAGGELIA p
         JOIN FARMAKEIO f ON f.afm = p.afm_farmakeiou
-        LEFT JOIN (
-            SELECT latest.order_id,
-                   a.hm_ora_apostolis,
-                   a.katastasi
-            FROM APOSTOLI a
-            JOIN (
-                SELECT order_id, MAX(hm_ora_apostolis) AS hm_ora_apostolis
-                FROM APOSTOLI
-                GROUP BY order_id
-            ) latest
-              ON latest.order_id = a.order_id
-             AND latest.hm_ora_apostolis = a.hm_ora_apostolis
-        ) ship ON ship.order_id = p.order_id
         WHERE f.username = %s
-        ORDER BY p.hm_ora_ektelesis DESC
+          AND (p.hm_ora_ektelesis < %s OR (p.hm_ora_ektelesis = %s AND p.order_id < %s))
+        ORDER BY p.hm_ora_ektelesis DESC, p.order_id DESC
+        LIMIT %s
     """
-    # ORDER_HISTORY_BY_STATUS: ίδιο με παραπάνω αλλά προσθέτει φίλτρο κατάστασης p.katastasi = %s.
+    # ORDER_HISTORY_BY_STATUS: ίδιο με παραπάνω αλλά προσθέτει φίλτρο κατάστασης p.katastasi = %s
+    # (idx_paraggelia_afm_status_date).
     ORDER_HISTORY_BY_STATUS = """
         SELECT p.order_id,
                p.hm_ora_ektelesis AS executed_at,
                p.katastasi,
                p.arxiko_kostos,
-               ship.hm_ora_apostolis AS shipment_at,
-               ship.katastasi AS shipment_status
+               p.teleftaia_apostoli_id AS shipment_id,
+               p.hm_ora_teleftaias_apostolis AS shipment_at,
+               p.katastasi_teleftaias_apostolis AS shipment_status
         FROM PARAGGELIA p
         JOIN FARMAKEIO f ON f.afm = p.afm_farmakeiou
-        LEFT JOIN (
-            SELECT latest.order_id,
-                   a.hm_ora_apostolis,
-                   a.katastasi
-            FROM APOSTOLI a
-            JOIN (
-                SELECT order_id, MAX(hm_ora_apostolis) AS hm_ora_apostolis
-                FROM APOSTOLI
-                GROUP BY order_id
-            ) latest
-              ON latest.order_id = a.order_id
-             AND latest.hm_ora_apostolis = a.hm_ora_apostolis
-        ) ship ON ship.order_id = p.order_id
         WHERE f.username = %s AND p.katastasi = %s
-        ORDER BY p.hm_ora_ektelesis DESC
+          AND (p.hm_ora_ektelesis < %s OR (p.hm_ora_ektelesis = %s AND p.order_id < %s))
+        ORDER BY p.hm_ora_ektelesis DESC, p.order_id DESC
+        LIMIT %s
+    """
+    # ORDER_HISTORY_UNDATED(_BY_STATUS): οι παραγγελίες χωρίς hm_ora_ektelesis, που έρχονται μετά από όλες
+    # τις χρονολογημένες (όπως το NULL στο DESC), με δικό τους keyset μόνο στο order_id.
+    ORDER_HISTORY_UNDATED = """
+        SELECT p.order_id,
+               p.hm_ora_ektelesis AS executed_at,
+               p.katastasi,
+               p.arxiko_kostos,
+               p.teleftaia_apostoli_id AS shipment_id,
+               p.hm_ora_teleftaias_apostolis AS shipment_at,
+               p.katastasi_teleftaias_apostolis AS shipment_status
+        FROM PARAGGELIA p
+        JOIN FARMAKEIO f ON f.afm = p.afm_farmakeiou
+        WHERE f.username = %s
+          AND p.hm_ora_ektelesis IS NULL AND p.order_id < %s
+        ORDER BY p.order_id DESC
+        LIMIT %s
+    """
+    ORDER_HISTORY_UNDATED_BY_STATUS = """
+        SELECT p.order_id,
+               p.hm_ora_ektelesis AS executed_at,
+               p.katastasi,
+               p.arxiko_kostos,
+               p.teleftaia_apostoli_id AS shipment_id,
+               p.hm_ora_teleftaias_apostolis AS shipment_at,
+               p.katastasi_teleftaias_apostolis AS shipment_status
+        FROM PARAGGELIA p
+        JOIN FARMAKEIO f ON f.afm = p.afm_farmakeiou
+        WHERE f.username = %s AND p.katastasi = %s
+          AND p.hm_ora_ektelesis IS NULL AND p.order_id < %s
+        ORDER BY p.order_id DESC
+        LIMIT %s
     """
     # ORDER_ITEMS_WITH_STOCK: περιγράφει τις γραμμές μιας παραγγελίας μαζί με διαθέσιμο stock και shipped qty.
+    # Διαθέσιμα για τη γραμμή = η δέσμευση της ίδιας της παραγγελίας + το αδέσμευτο απόθεμα (qty_diathesimo),
+    # άρα οι υπόλοιπες εκκρεμείς παραγγελίες αφαιρούνται χωρίς να διαβαστούν.
     # Η εσωτερική ship subquery αφαιρείται ανά order_id/product και επιστρέφει sum των αποσταλμένων τεμαχίων.
     ORDER_ITEMS_WITH_STOCK = """
         SELECT i.order_id,
@@ -316,11 +1076,12 @@ class SQL:
                pr.onoma,
                i.temaxia_zitisis,
                pr.arx_kostos_temaxiou,
-               COALESCE(SUM(stock.qty_in_stock), 0) AS available,
+               COALESCE(r.temaxia, 0) + GREATEST(COALESCE(stock.qty_diathesimo, 0), 0) AS available,
                COALESCE(shipments.shipped_qty, 0) AS shipped_qty
         FROM PARAGGELEIA_PERIEXEI_PROION i
         JOIN PROION pr ON pr.product_id = i.product_id
-        LEFT JOIN PROION_YPARXEI_APOTHIKI_THESI stock ON stock.product_id = i.product_id
+        LEFT JOIN PROION_SYNOLIKO_APOTHEMA stock ON stock.product_id = i.product_id
+        LEFT JOIN PARAGGELIA_DESMEUSI r ON r.order_id = i.order_id AND r.product_id = i.product_id
         LEFT JOIN (
             SELECT a.order_id, ap.product_id, SUM(ap.temaxia_apostolis) AS shipped_qty
             FROM APOSTOLI_PERIEXEI_PROION ap
@@ -329,24 +1090,44 @@ class SQL:
             GROUP BY a.order_id, ap.product_id
         ) shipments ON shipments.order_id = i.order_id AND shipments.product_id = i.product_id
         WHERE i.order_id IN ({placeholders})
-        GROUP BY i.order_id,
-                 i.product_id,
-                 pr.onoma,
-                 i.temaxia_zitisis,
-                 pr.arx_kostos_temaxiou,
-                 shipments.shipped_qty
     """
 
-    # WAREHOUSE_ORDERS: δίνει στο προσωπικό αποθήκης όλες τις παραγγελίες μαζί με username φαρμακείου.
+    # ORDER_ITEMS_WITH_STOCK_BY_TEMP_IDS: ίδιο με το ORDER_ITEMS_WITH_STOCK για τα order_id του TMP_IN_IDS.
+    # Ένας TEMPORARY πίνακας δεν μπορεί να εμφανιστεί δύο φορές στο ίδιο query, οπότε το shipped_qty
+    # υπολογίζεται με correlated subquery (idx_apostoli_order + PK γραμμών αποστολής).
+    ORDER_ITEMS_WITH_STOCK_BY_TEMP_IDS = """
+        SELECT i.order_id,
+               i.product_id,
+               pr.onoma,
+               i.temaxia_zitisis,
+               pr.arx_kostos_temaxiou,
+               COALESCE(r.temaxia, 0) + GREATEST(COALESCE(stock.qty_diathesimo, 0), 0) AS available,
+               COALESCE((
+                   SELECT SUM(ap.temaxia_apostolis)
+                   FROM APOSTOLI a
+                   JOIN APOSTOLI_PERIEXEI_PROION ap ON ap.shipment_id = a.shipment_id
+                   WHERE a.order_id = i.order_id AND ap.product_id = i.product_id
+               ), 0) AS shipped_qty
+        FROM TMP_IN_IDS t
+        JOIN PARAGGELEIA_PERIEXEI_PROION i ON i.order_id = t.id
+        JOIN PROION pr ON pr.product_id = i.product_id
+        LEFT JOIN PROION_SYNOLIKO_APOTHEMA stock ON stock.product_id = i.product_id
+        LEFT JOIN PARAGGELIA_DESMEUSI r ON r.order_id = i.order_id AND r.product_id = i.product_id
+    """
+
+    # WAREHOUSE_ORDERS: δίνει στο προσωπικό αποθήκης μία σελίδα παραγγελιών με username φαρμακείου,
+    # με τον ίδιο keyset cursor (after_executed_at, after_order_id) πάνω στο idx_paraggelia_date_id.
     WAREHOUSE_ORDERS = """
         SELECT p.order_id, x.username AS pharmacy, p.hm_ora_ektelesis AS executed_at,
                p.katastasi, p.arxiko_kostos
         FROM PARAGGELIA p
         JOIN FARMAKEIO f ON f.afm = p.afm_farmakeiou
         JOIN XRISTIS x ON x.username = f.username
-        ORDER BY p.hm_ora_ektelesis DESC
+        WHERE (p.hm_ora_ektelesis < %s OR (p.hm_ora_ektelesis = %s AND p.order_id < %s))
+        ORDER BY p.hm_ora_ektelesis DESC, p.order_id DESC
+        LIMIT %s
     """
-    # WAREHOUSE_ORDERS_BY_STATUS: έκδοση με φίλτρο κατάστασης για την οθόνη filters.
+    # WAREHOUSE_ORDERS_BY_STATUS: έκδοση με φίλτρο κατάστασης για την οθόνη filters (idx_paraggelia_status_date).
     WAREHOUSE_ORDERS_BY_STATUS = """
         SELECT p.order_id, x.username AS pharmacy, p.hm_ora_ektelesis AS executed_at,
                p.katastasi, p.arxiko_kostos
@@ -354,14 +1135,84 @@ class SQL:
         JOIN FARMAKEIO f ON f.afm = p.afm_farmakeiou
         JOIN XRISTIS x ON x.username = f.username
         WHERE p.katastasi = %s
-        ORDER BY p.hm_ora_ektelesis DESC
+          AND (p.hm_ora_ektelesis < %s OR (p.hm_ora_ektelesis = %s AND p.order_id < %s))
+        ORDER BY p.hm_ora_ektelesis DESC, p.order_id DESC
+        LIMIT %s
+    """
+    # WAREHOUSE_ORDERS_UNDATED(_BY_STATUS): όπως το ORDER_HISTORY_UNDATED, για την οθόνη αποθήκης.
+    WAREHOUSE_ORDERS_UNDATED = """
+        SELECT p.order_id, x.username AS pharmacy, p.hm_ora_ektelesis AS executed_at,
+               p.katastasi, p.arxiko_kostos
+        FROM PARAGGELIA p
+        JOIN FARMAKEIO f ON f.afm = p.afm_farmakeiou
+        JOIN XRISTIS x ON x.username = f.username
+        WHERE p.hm_ora_ektelesis IS NULL AND p.order_id < %s
+        ORDER BY p.order_id DESC
+        LIMIT %s
+    """
+    WAREHOUSE_ORDERS_UNDATED_BY_STATUS = """
+        SELECT p.order_id, x.username AS pharmacy, p.hm_ora_ektelesis AS executed_at,
+               p.katastasi, p.arxiko_kostos
+        FROM PARAGGELIA p
+        JOIN FARMAKEIO f ON f.afm = p.afm_farmakeiou
+        JOIN XRISTIS x ON x.username = f.username
+        WHERE p.katastasi = %s
+          AND p.hm_ora_ektelesis IS NULL AND p.order_id < %s
+        ORDER BY p.order_id DESC
+        LIMIT %s
+    """
+    # ORDER_ITEMS_REPORT: όλες οι γραμμές παραγγελιών ενός διαστήματος για αναφορές/εξαγωγή (διαβάζεται με stream).
+    ORDER_ITEMS_REPORT = """
+        SELECT p.order_id,
+               p.hm_ora_ektelesis AS executed_at,
+               p.afm_farmakeiou,
+               p.katastasi,
+               i.product_id,
+               pr.onoma,
+               i.temaxia_zitisis,
+               pr.arx_kostos_temaxiou
+        FROM PARAGGELIA p
+        JOIN PARAGGELEIA_PERIEXEI_PROION i ON i.order_id = p.order_id
+        JOIN PROION pr ON pr.product_id = i.product_id
+        WHERE p.hm_ora_ektelesis >= %s AND p.hm_ora_ektelesis < %s
+        ORDER BY p.hm_ora_ektelesis, p.order_id, i.product_id
     """
     # ORDER_STATUS_BY_ID: χρησιμοποιείται πριν από updates για να ελέγξουμε τρέχουσα κατάσταση/κόστος.
     ORDER_STATUS_BY_ID = "SELECT katastasi, arxiko_kostos FROM PARAGGELIA WHERE order_id = %s"
     # UPDATE_ORDER_STATUS: ενημερώνει μόνο το πεδίο katastasi.
     UPDATE_ORDER_STATUS = "UPDATE PARAGGELIA SET katastasi = %s WHERE order_id = %s"
     # ORDER_DETAILS_FOR_SHIPMENT: επιστρέφει βασικά πεδία που χρειάζονται για τη δημιουργία αποστολής.
-    ORDER_DETAILS_FOR_SHIPMENT = "SELECT katastasi, arxiko_kostos, ekptosi FROM PARAGGELIA WHERE order_id = %s"
+    # Το FOR UPDATE σειριοποιεί δύο ταυτόχρονες αποστολές της ίδιας παραγγελίας.
+    ORDER_DETAILS_FOR_SHIPMENT = "SELECT katastasi, arxiko_kostos, ekptosi FROM PARAGGELIA WHERE order_id = %s FOR UPDATE"
+    # ORDERS_FOR_WAVE: κεφαλίδες πολλών παραγγελιών κλειδωμένες για αποστολή σε ένα wave, με ένδειξη υπάρχουσας αποστολής.
+    ORDERS_FOR_WAVE = """
+        SELECT p.order_id,
+               p.katastasi,
+               p.arxiko_kostos,
+               p.ekptosi,
+               p.hm_ora_ektelesis,
+               EXISTS(SELECT 1 FROM APOSTOLI a WHERE a.order_id = p.order_id) AS has_shipment
+        FROM PARAGGELIA p
+        WHERE p.order_id IN ({placeholders})
+        ORDER BY p.order_id
+        FOR UPDATE
+    """
+    # ORDER_ITEMS_FOR_WAVE: οι γραμμές όλων των παραγγελιών ενός wave με μία ανάγνωση.
+    ORDER_ITEMS_FOR_WAVE = """
+        SELECT i.order_id, i.product_id, i.temaxia_zitisis, pr.arx_kostos_temaxiou, pr.onoma
+        FROM PARAGGELEIA_PERIEXEI_PROION i
+        JOIN PROION pr ON pr.product_id = i.product_id
+        WHERE i.order_id IN ({placeholders})
+        ORDER BY i.order_id, i.product_id
+    """
+    # SHIPMENT_IDS_BY_ORDERS: αντιστοίχιση order_id -> shipment_id μετά από μαζική εισαγωγή αποστολών.
+    SHIPMENT_IDS_BY_ORDERS = """
+        SELECT order_id, shipment_id
+        FROM APOSTOLI
+        WHERE order_id IN ({placeholders})
+    """
+    # UPDATE_ORDERS_STATUS: ίδιο με UPDATE_ORDER_STATUS για πολλές παραγγελίες (πρώτη παράμετρος η κατάσταση).
+    UPDATE_ORDERS_STATUS = "UPDATE PARAGGELIA SET katastasi = %s WHERE order_id IN ({placeholders})"
     # ORDER_ITEMS_SIMPLE: χρησιμοποιείται στο picking για να έχουμε τις ζητούμενες ποσότητες/τιμές ανά προϊόν.
     ORDER_ITEMS_SIMPLE = """
         SELECT i.product_id, i.temaxia_zitisis, pr.arx_kostos_temaxiou, pr.onoma
@@ -369,59 +1220,51 @@ class SQL:
         JOIN PROION pr ON pr.product_id = i.product_id
         WHERE i.order_id = %s
     """
-    # PRODUCT_LOCATIONS: επιστρέφει όλες τις θέσεις (storage/διάδρομος/ράφι) για ένα προϊόν ταξινομημένες,
-    # ώστε ο αλγόριθμος αποστολής να εξαντλεί τις ποσότητες σειριακά.
-    PRODUCT_LOCATIONS = """
-        SELECT storage_id, ar_diadromou, ar_rafiou, qty_in_stock
+    # PRODUCT_LOCATIONS_FOR_UPDATE: όλες οι θέσεις για πολλά προϊόντα μαζί, κλειδωμένες για το picking.
+    # Η ταξινόμηση ακολουθεί το PK ώστε τα locks να παίρνονται πάντα με την ίδια σειρά (λιγότερα deadlocks)
+    # και ανά προϊόν οι θέσεις να εξαντλούνται με σειρά storage/διάδρομος/ράφι.
+    PRODUCT_LOCATIONS_FOR_UPDATE = """
+        SELECT product_id, storage_id, ar_diadromou, ar_rafiou, qty_in_stock
         FROM PROION_YPARXEI_APOTHIKI_THESI
-        WHERE product_id = %s
-        ORDER BY storage_id, ar_diadromou, ar_rafiou
+        WHERE product_id IN ({placeholders})
+        ORDER BY product_id, storage_id, ar_diadromou, ar_rafiou
+        FOR UPDATE
     """
-    # UPDATE_STOCK: μειώνει το απόθεμα συγκεκριμένης θέσης (χρησιμοποιείται κατά τη διαδικασία picking).
-    UPDATE_STOCK = """
-        UPDATE PROION_YPARXEI_APOTHIKI_THESI
-        SET qty_in_stock = %s
-        WHERE product_id = %s AND storage_id = %s AND ar_diadromou = %s AND ar_rafiou = %s
+    # BULK_SET_STOCK: γράφει το νέο qty πολλών (ήδη κλειδωμένων) θέσεων· με executemany στέλνεται ως ένα multi-row INSERT.
+    BULK_SET_STOCK = """
+        INSERT INTO PROION_YPARXEI_APOTHIKI_THESI (product_id, storage_id, ar_diadromou, ar_rafiou, qty_in_stock)
+        VALUES (%s,%s,%s,%s,%s)
+        ON DUPLICATE KEY UPDATE qty_in_stock = VALUES(qty_in_stock)
     """
-    # DELETE_STOCK: διαγράφει τη γραμμή όταν μια θέση αδειάσει πλήρως ώστε να μην κρατά «νεκρά» rows.
-    DELETE_STOCK = """
+    # BULK_DELETE_STOCK: αδειάζει με μία εντολή όλες τις θέσεις που μηδενίστηκαν (χρησιμοποιεί with_row_in_clause).
+    BULK_DELETE_STOCK = """
         DELETE FROM PROION_YPARXEI_APOTHIKI_THESI
-        WHERE product_id = %s AND storage_id = %s AND ar_diadromou = %s AND ar_rafiou = %s
+        WHERE (product_id, storage_id, ar_diadromou, ar_rafiou) IN ({placeholders})
     """
 
-    # SUPPLIER_PRODUCTS: όμοιο με PHARMACY_PRODUCTS αλλά χρησιμοποιείται από την αποθήκη για προμήθειες.
-    SUPPLIER_PRODUCTS = """
-        SELECT p.product_id,
-               p.onoma,
-               p.arx_kostos_temaxiou,
-               p.etairia,
-               p.katigoria,
-               COALESCE(SUM(s.qty_in_stock), 0) AS stock_qty
-        FROM PROION p
-        LEFT JOIN PROION_YPARXEI_APOTHIKI_THESI s ON s.product_id = p.product_id
-        GROUP BY p.product_id, p.onoma, p.arx_kostos_temaxiou, p.etairia, p.katigoria
-        ORDER BY p.onoma
-    """
-    # BEST_PRODUCT_POSITION: βρίσκει την πλουσιότερη θέση μιας SKU ώστε να προστεθεί εκεί νέο απόθεμα.
-    BEST_PRODUCT_POSITION = """
-        SELECT storage_id, ar_diadromou, ar_rafiou, qty_in_stock
-        FROM PROION_YPARXEI_APOTHIKI_THESI
-        WHERE product_id = %s
-        ORDER BY qty_in_stock DESC
-        LIMIT 1
+    # BEST_PRODUCT_POSITIONS: η πλουσιότερη θέση κάθε SKU μιας παραλαβής (μία γραμμή ανά προϊόν), ώστε
+    # το νέο απόθεμα να προστεθεί εκεί· ισοβαθμίες λύνονται με τη σειρά του PK.
+    BEST_PRODUCT_POSITIONS = """
+        SELECT product_id, storage_id, ar_diadromou, ar_rafiou
+        FROM (
+            SELECT product_id, storage_id, ar_diadromou, ar_rafiou,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY product_id
+                       ORDER BY qty_in_stock DESC, storage_id, ar_diadromou, ar_rafiou
+                   ) AS rn
+            FROM PROION_YPARXEI_APOTHIKI_THESI
+            WHERE product_id IN ({placeholders})
+        ) ranked
+        WHERE rn = 1
     """
-    # UPDATE_POSITION_STOCK: αυξάνει το qty μιας υπάρχουσας θέσης (χρησιμοποιείται μετά από παραλαβή).
-    UPDATE_POSITION_STOCK = """
-        UPDATE PROION_YPARXEI_APOTHIKI_THESI
-        SET qty_in_stock = qty_in_stock + %s
-        WHERE product_id = %s AND storage_id = %s AND ar_diadromou = %s AND ar_rafiou = %s
-    """
-    # INSERT_POSITION_STOCK: δημιουργεί νέα εγγραφή στη γέφυρα προϊόντος/θέσης (όταν δεν υπάρχει ήδη).
-    INSERT_POSITION_STOCK = """
+    # PUTAWAY_STOCK: προσθέτει την παραλαβή στις θέσεις (νέα γραμμή ή αύξηση υπάρχουσας)· με executemany
+    # στέλνεται ως ένα multi-row INSERT για όλη την παράδοση.
+    PUTAWAY_STOCK = """
         INSERT INTO PROION_YPARXEI_APOTHIKI_THESI (product_id, storage_id, ar_diadromou, ar_rafiou, qty_in_stock)
         VALUES (%s,%s,%s,%s,%s)
+        ON DUPLICATE KEY UPDATE qty_in_stock = qty_in_stock + VALUES(qty_in_stock)
     """
-    # Helpers για δημιουργία καινούριων αποθηκών/διαδρόμων/ραφιών όταν εξαντληθούν οι διαθέσιμες θέσεις.
+    # Helpers για δημιουργία καινούριων αποθηκών/διαδρόμων/ραφιών όταν αδειάσει η free-list (THESI_ELEFTHERI).
     STORAGE_IDS = "SELECT storage_id FROM APOTHIKI"
     NEXT_STORAGE_ID = "SELECT COALESCE(MAX(storage_id), 0) + 1 AS next_id FROM APOTHIKI"
     INSERT_STORAGE = "INSERT INTO APOTHIKI (storage_id, topothesia) VALUES (%s,%s)"
@@ -432,8 +1275,68 @@ class SQL:
         INSERT INTO THESI_BRISKETAI_APOTHIKI (storage_id, ar_diadromou, ar_rafiou)
         VALUES (%s,%s,%s)
     """
-    # Θέσεις αποθήκης που δεν είναι πιασμένες από άλλο προϊόν (για νέα παρτίδα).
-    AVAILABLE_POSITIONS = """
+    # Free-list θέσεων: κάθε θέση αποθήκης χωρίς προϊόν έχει μία γραμμή στη THESI_ELEFTHERI, ώστε η τοποθέτηση
+    # νέας SKU να παίρνει θέση με ένα index lookup αντί για anti-join σε όλη τη THESI_BRISKETAI_APOTHIKI.
+    # TAKE_FREE_POSITIONS: κλειδώνει έως %s ελεύθερες θέσεις· το SKIP LOCKED αφήνει τις παράλληλες παραλαβές
+    # να πάρουν άλλες θέσεις αντί να περιμένουν η μία την άλλη.
+    TAKE_FREE_POSITIONS = """
+        SELECT storage_id, ar_diadromou, ar_rafiou
+        FROM THESI_ELEFTHERI
+        ORDER BY storage_id, ar_diadromou, ar_rafiou
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """
+    # DELETE_FREE_POSITIONS: βγάζει από τη free-list τις θέσεις που μόλις δόθηκαν (with_row_in_clause).
+    DELETE_FREE_POSITIONS = """
+        DELETE FROM THESI_ELEFTHERI
+        WHERE (storage_id, ar_diadromou, ar_rafiou) IN ({placeholders})
+    """
+    INSERT_FREE_POSITION = """
+        INSERT IGNORE INTO THESI_ELEFTHERI (storage_id, ar_diadromou, ar_rafiou)
+        VALUES (%s,%s,%s)
+    """
+    # RELEASE_FREE_POSITIONS: ξαναβάζει στη free-list όσες από τις θέσεις που άδειασαν δεν έχουν πλέον κανένα
+    # προϊόν (with_row_in_clause, στην ίδια συναλλαγή με το BULK_DELETE_STOCK).
+    RELEASE_FREE_POSITIONS = """
+        INSERT IGNORE INTO THESI_ELEFTHERI (storage_id, ar_diadromou, ar_rafiou)
+        SELECT t.storage_id, t.ar_diadromou, t.ar_rafiou
+        FROM THESI_BRISKETAI_APOTHIKI t
+        WHERE (t.storage_id, t.ar_diadromou, t.ar_rafiou) IN ({placeholders})
+          AND NOT EXISTS (
+              SELECT 1
+              FROM PROION_YPARXEI_APOTHIKI_THESI p
+              WHERE p.storage_id = t.storage_id
+                AND p.ar_diadromou = t.ar_diadromou
+                AND p.ar_rafiou = t.ar_rafiou
+          )
+    """
+    # FREE_POSITIONS_DRIFT: θέσεις όπου η free-list διαφωνεί με τις πραγματικές εγγραφές αποθέματος
+    # (ελεύθερη αλλά εκτός λίστας ή πιασμένη αλλά μέσα στη λίστα).
+    FREE_POSITIONS_DRIFT = """
+        SELECT storage_id, ar_diadromou, ar_rafiou, listed, occupied
+        FROM (
+            SELECT t.storage_id, t.ar_diadromou, t.ar_rafiou,
+                   f.storage_id IS NOT NULL AS listed,
+                   EXISTS (
+                       SELECT 1
+                       FROM PROION_YPARXEI_APOTHIKI_THESI p
+                       WHERE p.storage_id = t.storage_id
+                         AND p.ar_diadromou = t.ar_diadromou
+                         AND p.ar_rafiou = t.ar_rafiou
+                   ) AS occupied
+            FROM THESI_BRISKETAI_APOTHIKI t
+            LEFT JOIN THESI_ELEFTHERI f
+              ON f.storage_id = t.storage_id
+             AND f.ar_diadromou = t.ar_diadromou
+             AND f.ar_rafiou = t.ar_rafiou
+        ) state
+        WHERE listed = occupied
+        ORDER BY storage_id, ar_diadromou, ar_rafiou
+    """
+    CLEAR_FREE_POSITIONS = "DELETE FROM THESI_ELEFTHERI"
+    # BACKFILL_FREE_POSITIONS: γεμίζει τη free-list με όλες τις θέσεις που δεν είναι πιασμένες από προϊόν.
+    BACKFILL_FREE_POSITIONS = """
+        INSERT IGNORE INTO THESI_ELEFTHERI (storage_id, ar_diadromou, ar_rafiou)
         SELECT t.storage_id, t.ar_diadromou, t.ar_rafiou
         FROM THESI_BRISKETAI_APOTHIKI t
         LEFT JOIN PROION_YPARXEI_APOTHIKI_THESI p
@@ -441,7 +1344,6 @@ class SQL:
          AND p.ar_diadromou = t.ar_diadromou
          AND p.ar_rafiou = t.ar_rafiou
         WHERE p.product_id IS NULL
-        LIMIT 1
     """
     # INSERT_BACKORDER: αρχεία στο ιστορικό backorders πότε εξυπηρετήθηκε μια αποθήκη (oloklirothike flag).
     INSERT_BACKORDER = "INSERT INTO BACKORDER (storage_id, oloklirothike, hm_apostolis) VALUES (%s,%s,%s)"
@@ -453,6 +1355,31 @@ class SQL:
         INSERT INTO APOSTOLI (dromologio, katastasi, hm_ora_apostolis, teliko_kostos, order_id)
         VALUES (%s,%s,%s,%s,%s)
     """
+    # SET_LATEST_SHIPMENT: κρατά στην παραγγελία την τελευταία αποστολή (id, ώρα, κατάσταση) για το ιστορικό.
+    # Δεν αντικαθιστά νεότερη αποστολή αν κάποια παλαιότερη γραφτεί αργότερα.
+    SET_LATEST_SHIPMENT = """
+        UPDATE PARAGGELIA
+        SET teleftaia_apostoli_id = %s,
+            hm_ora_teleftaias_apostolis = %s,
+            katastasi_teleftaias_apostolis = %s
+        WHERE order_id = %s
+          AND (hm_ora_teleftaias_apostolis IS NULL OR hm_ora_teleftaias_apostolis <= %s)
+    """
+    # BACKFILL_LATEST_SHIPMENTS: ξαναϋπολογίζει τις στήλες τελευταίας αποστολής από όλο τον APOSTOLI
+    # (για υπάρχοντα δεδομένα ή μετά από χειροκίνητες αλλαγές). Ισοβαθμίες λύνονται με το μεγαλύτερο shipment_id.
+    BACKFILL_LATEST_SHIPMENTS = """
+        UPDATE PARAGGELIA p
+        JOIN (
+            SELECT order_id, shipment_id, hm_ora_apostolis, katastasi,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY order_id ORDER BY hm_ora_apostolis DESC, shipment_id DESC
+                   ) AS rn
+            FROM APOSTOLI
+        ) latest ON latest.order_id = p.order_id AND latest.rn = 1
+        SET p.teleftaia_apostoli_id = latest.shipment_id,
+            p.hm_ora_teleftaias_apostolis = latest.hm_ora_apostolis,
+            p.katastasi_teleftaias_apostolis = latest.katastasi
+    """
     # INSERT_SHIPMENT_ITEM: συμπληρώνει τα προϊόντα που στάλθηκαν σε κάθε αποστολή.
     INSERT_SHIPMENT_ITEM = """
         INSERT INTO APOSTOLI_PERIEXEI_PROION (shipment_id, product_id, temaxia_apostolis)
@@ -462,21 +1389,106 @@ class SQL:
     # --- Καταγραφή παραγγελιών προμηθευτών μέσα από τα BACKORDER ---
     SUPPLIER_STORAGE_BY_LABEL = "SELECT storage_id FROM APOTHIKI WHERE topothesia = %s LIMIT 1"
     INSERT_SUPPLIER = "INSERT INTO PROMITHEYTIS (onoma, tilefono) VALUES (%s,%s)"
+    # CURRENT_PRODUCT_SUPPLIERS: ο ενεργός προμηθευτής κάθε προϊόντος σε μια ημερομηνία (params: ημερομηνία x2)·
+    # με περισσότερους ισχύοντες κερδίζει η πιο πρόσφατη συνεργασία. Μικρός πίνακας, διαβάζεται όλος με cache.
+    CURRENT_PRODUCT_SUPPLIERS = """
+        SELECT product_id, supplier_id
+        FROM (
+            SELECT product_id, supplier_id,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY product_id ORDER BY hm_enarksis DESC, supplier_id
+                   ) AS rn
+            FROM PROMITHEYTIS_PROMITHEYEI_PROION
+            WHERE (hm_enarksis IS NULL OR hm_enarksis <= %s)
+              AND (hm_liksis IS NULL OR hm_liksis >= %s)
+        ) ranked
+        WHERE rn = 1
+    """
+    # AUTO_SUPPLIER_ID: ο κοινός placeholder προμηθευτής για προϊόντα χωρίς ενεργή συνεργασία.
+    AUTO_SUPPLIER_ID = """
+        SELECT supplier_id
+        FROM PROMITHEYTIS
+        WHERE onoma = %s AND tilefono = %s
+        ORDER BY supplier_id
+        LIMIT 1
+    """
+    # AUTO_SUPPLIER_ID_LOCK: όπως το AUTO_SUPPLIER_ID μέσα σε συναλλαγή· το shared κλείδωμα του κενού στο index
+    # εμποδίζει δύο παράλληλες παραγγελίες να δημιουργήσουν από έναν placeholder η καθεμία.
+    AUTO_SUPPLIER_ID_LOCK = """
+        SELECT supplier_id
+        FROM PROMITHEYTIS
+        WHERE onoma = %s AND tilefono = %s
+        ORDER BY supplier_id
+        LIMIT 1
+        FOR SHARE
+    """
+    # Συγχώνευση διπλών placeholder προμηθευτών (maintenance.py compact-suppliers)· params σε όλες: κρατούμενο id,
+    # όνομα, τηλέφωνο. MERGE_SUPPLIER_BACKORDER_ITEMS αθροίζει τις γραμμές κάθε (προϊόν, παραγγελία) στο κρατούμενο id.
+    MERGE_SUPPLIER_BACKORDER_ITEMS = """
+        INSERT INTO PROMITHEYTIS_APOSTELEI_PROION_BACKORDER (supplier_id, product_id, backorder_id, quantity)
+        SELECT %s, papb.product_id, papb.backorder_id, SUM(papb.quantity)
+        FROM PROMITHEYTIS_APOSTELEI_PROION_BACKORDER papb
+        JOIN PROMITHEYTIS sup ON sup.supplier_id = papb.supplier_id
+        WHERE sup.onoma = %s AND sup.tilefono = %s
+        GROUP BY papb.product_id, papb.backorder_id
+        ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+    """
+    DELETE_MERGED_SUPPLIER_ITEMS = """
+        DELETE papb
+        FROM PROMITHEYTIS_APOSTELEI_PROION_BACKORDER papb
+        JOIN PROMITHEYTIS sup ON sup.supplier_id = papb.supplier_id
+        WHERE sup.supplier_id <> %s AND sup.onoma = %s AND sup.tilefono = %s
+    """
+    DELETE_MERGED_SUPPLIERS = """
+        DELETE FROM PROMITHEYTIS
+        WHERE supplier_id <> %s AND onoma = %s AND tilefono = %s
+    """
     INSERT_SUPPLIER_BACKORDER_ITEM = """
         INSERT INTO PROMITHEYTIS_APOSTELEI_PROION_BACKORDER (supplier_id, product_id, backorder_id, quantity)
         VALUES (%s,%s,%s,%s)
     """
-    SUPPLIER_BACKORDERS = """
-        SELECT backorder_id, storage_id, hm_apostolis, oloklirothike
-        FROM BACKORDER
-        WHERE storage_id = %s
-        ORDER BY backorder_id DESC
+    # SUPPLIER_ORDERS_PAGE: μία σελίδα παραγγελιών προμηθευτών (keyset στο backorder_id, νεότερη πρώτη) με το
+    # σύνολο κάθε παραγγελίας· η άθροιση γίνεται μόνο για τις γραμμές της σελίδας.
+    # Params: storage_id, after_backorder_id, limit.
+    SUPPLIER_ORDERS_PAGE = """
+        SELECT b.backorder_id, b.hm_apostolis, b.oloklirothike,
+               COALESCE(SUM(GREATEST(COALESCE(papb.quantity, 0), 1) * pr.arx_kostos_temaxiou), 0) AS total_cost
+        FROM (
+            SELECT backorder_id, hm_apostolis, oloklirothike
+            FROM BACKORDER
+            WHERE storage_id = %s AND backorder_id < %s
+            ORDER BY backorder_id DESC
+            LIMIT %s
+        ) b
+        LEFT JOIN PROMITHEYTIS_APOSTELEI_PROION_BACKORDER papb ON papb.backorder_id = b.backorder_id
+        LEFT JOIN PROION pr ON pr.product_id = papb.product_id
+        GROUP BY b.backorder_id, b.hm_apostolis, b.oloklirothike
+        ORDER BY b.backorder_id DESC
+    """
+    # SUPPLIER_ORDERS_PAGE_BY_STATUS: όπως το SUPPLIER_ORDERS_PAGE με φίλτρο oloklirothike
+    # (idx_backorder_storage_status). Params: storage_id, oloklirothike, after_backorder_id, limit.
+    SUPPLIER_ORDERS_PAGE_BY_STATUS = """
+        SELECT b.backorder_id, b.hm_apostolis, b.oloklirothike,
+               COALESCE(SUM(GREATEST(COALESCE(papb.quantity, 0), 1) * pr.arx_kostos_temaxiou), 0) AS total_cost
+        FROM (
+            SELECT backorder_id, hm_apostolis, oloklirothike
+            FROM BACKORDER
+            WHERE storage_id = %s AND oloklirothike = %s AND backorder_id < %s
+            ORDER BY backorder_id DESC
+            LIMIT %s
+        ) b
+        LEFT JOIN PROMITHEYTIS_APOSTELEI_PROION_BACKORDER papb ON papb.backorder_id = b.backorder_id
+        LEFT JOIN PROION pr ON pr.product_id = papb.product_id
+        GROUP BY b.backorder_id, b.hm_apostolis, b.oloklirothike
+        ORDER BY b.backorder_id DESC
     """
     SUPPLIER_BACKORDER_BY_ID = """
         SELECT backorder_id, storage_id, hm_apostolis, oloklirothike
         FROM BACKORDER
         WHERE backorder_id = %s
     """
+    # SUPPLIER_BACKORDER_LOCK: κλειδώνει την παραγγελία προμηθευτή ώστε η παραλαβή να γίνει μία φορά.
+    SUPPLIER_BACKORDER_LOCK = "SELECT oloklirothike FROM BACKORDER WHERE backorder_id = %s FOR UPDATE"
     SUPPLIER_BACKORDER_ITEMS = """
         SELECT papb.backorder_id,
                papb.product_id,
@@ -490,4 +1502,32 @@ class SQL:
         JOIN PROMITHEYTIS sup ON sup.supplier_id = papb.supplier_id
         WHERE papb.backorder_id IN ({placeholders})
     """
+    SUPPLIER_BACKORDER_ITEMS_BY_TEMP_IDS = """
+        SELECT papb.backorder_id,
+               papb.product_id,
+               pr.onoma,
+               pr.arx_kostos_temaxiou,
+               sup.supplier_id,
+               sup.tilefono,
+               papb.quantity
+        FROM TMP_IN_IDS t
+        JOIN PROMITHEYTIS_APOSTELEI_PROION_BACKORDER papb ON papb.backorder_id = t.id
+        JOIN PROION pr ON pr.product_id = papb.product_id
+        JOIN PROMITHEYTIS sup ON sup.supplier_id = papb.supplier_id
+    """
     UPDATE_BACKORDER_STATUS = "UPDATE BACKORDER SET oloklirothike = %s, hm_apostolis = %s WHERE backorder_id = %s"
+
+
+# Κάθε σταθερά γίνεται SqlText με το όνομά της, ώστε οι μετρήσεις να ομαδοποιούνται ανά attribute.
+for _name, _value in list(vars(SQL).items()):
+    if _name.isupper() and isinstance(_value, str):
+        setattr(SQL, _name, SqlText(_value, _name))
+del _name, _value
+
+# Templates με IN ({placeholders}) που έχουν εκδοχή JOIN με τον TMP_IN_IDS για πολύ μεγάλες λίστες.
+IN_TEMP_TABLE_QUERIES = {
+    "INVENTORY_AVAILABLE_BY_IDS": SQL.INVENTORY_AVAILABLE_BY_TEMP_IDS,
+    "PRODUCT_PRICES_BY_IDS": SQL.PRODUCT_PRICES_BY_TEMP_IDS,
+    "ORDER_ITEMS_WITH_STOCK": SQL.ORDER_ITEMS_WITH_STOCK_BY_TEMP_IDS,
+    "SUPPLIER_BACKORDER_ITEMS": SQL.SUPPLIER_BACKORDER_ITEMS_BY_TEMP_IDS,
+}
@@ -82,8 +82,11 @@ def add_months(start_date, months):
 
 
 def _get_item_fields(item):
-    """Ομογενοποιεί διαφορετικούς τύπους αντικειμένων/tuple που περιγράφουν προϊόντα."""
-    if isinstance(item, dict):
+    """Ομογενοποιεί διαφορετικούς τύπους αντικειμένων/tuple που περιγράφουν προϊόντα.
+
+    Κάθε mapping (dict ή rows.CompactRow, που δεν είναι dict) διαβάζεται με κλειδιά, αλλιώς ως (product_id, qty).
+    """
+    if hasattr(item, "get"):
         product_id = item.get("product_id")
         qty = item.get("temaxia_zitisis")
         if qty is None:
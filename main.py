@@ -1,9 +1,15 @@
 """Σημείο εκκίνησης της desktop εφαρμογής."""
 
 from app import App
+from metrics import QueryMetrics
 
 # Το main παραμένει λιτό για να διευκολύνει την ενσωμάτωση με άλλες CLI εντολές/δοκιμές.
 
 
 if __name__ == "__main__":
-    App().mainloop()
+    # Περιοδικό dump μετρήσεων SQL αν έχει οριστεί DB_METRICS_FILE (βλ. metrics.py).
+    QueryMetrics.start_from_env()
+    try:
+        App().mainloop()
+    finally:
+        QueryMetrics.stop_dumper()
@@ -0,0 +1,177 @@
+"""Εντολές συντήρησης της βάσης από τη γραμμή εντολών (έλεγχος/ανακατασκευή παράγωγων πινάκων).
+
+Παράδειγμα:
+    python3 maintenance.py stock-totals            # μόνο αναφορά αποκλίσεων
+    python3 maintenance.py stock-totals --repair   # ανακατασκευή συνόλων αποθέματος
+    python3 maintenance.py free-positions --repair # ανακατασκευή της free-list κενών θέσεων
+    python3 maintenance.py compact-suppliers       # συγχώνευση διπλών AUTO_SUPPLIER (μία φορά)
+    python3 maintenance.py latest-shipments        # backfill τελευταίας αποστολής ανά παραγγελία
+    python3 maintenance.py reservations --rebuild  # δεσμεύσεις αποθέματος για τις εκκρεμείς παραγγελίες
+    python3 maintenance.py export-order-items 2025-01-01 2026-01-01 --out items.csv
+    python3 maintenance.py bench-prepared --ids 5 --runs 2000
+"""
+
+import argparse
+import csv
+import sys
+import time
+from datetime import date
+
+from db import SQL, Database
+from models import InventoryRepository, WarehouseRepository
+from prepared import StatementCache
+
+
+def _stock_totals(args):
+    """Ελέγχει (και προαιρετικά διορθώνει) το PROION_SYNOLIKO_APOTHEMA έναντι των θέσεων αποθήκης."""
+    drift = InventoryRepository.check_stock_totals(repair=args.repair)
+    for row in drift:
+        print(f"product_id={row['product_id']}: καταγεγραμμένο={row['recorded']} πραγματικό={row['actual']}")
+    if not drift:
+        print("Τα συνολικά αποθέματα είναι συνεπή.")
+        return 0
+    if args.repair:
+        print(f"Ανακατασκευάστηκαν τα σύνολα ({len(drift)} αποκλίσεις διορθώθηκαν).")
+        return 0
+    return 1
+
+
+def _reservations(args):
+    """Ελέγχει τα δεσμευμένα σύνολα (ή ξαναχτίζει όλες τις δεσμεύσεις από τις εκκρεμείς παραγγελίες)."""
+    if args.rebuild:
+        created = InventoryRepository.rebuild_reservations()
+        print(f"Δημιουργήθηκαν {created} δεσμεύσεις για εκκρεμείς παραγγελίες.")
+        return 0
+    drift = InventoryRepository.check_reserved_totals(repair=args.repair)
+    for row in drift:
+        print(f"product_id={row['product_id']}: καταγεγραμμένο={row['recorded']} πραγματικό={row['actual']}")
+    if not drift:
+        print("Τα δεσμευμένα σύνολα είναι συνεπή.")
+        return 0
+    if args.repair:
+        print(f"Ανακατασκευάστηκαν τα δεσμευμένα σύνολα ({len(drift)} αποκλίσεις διορθώθηκαν).")
+        return 0
+    return 1
+
+
+def _free_positions(args):
+    """Ελέγχει (και προαιρετικά ξαναχτίζει) τη free-list κενών θέσεων THESI_ELEFTHERI."""
+    drift = WarehouseRepository.check_free_positions(repair=args.repair)
+    for row in drift:
+        state = "πιασμένη αλλά στη free-list" if row["occupied"] else "κενή αλλά εκτός free-list"
+        print(f"θέση {row['storage_id']}/{row['ar_diadromou']}/{row['ar_rafiou']}: {state}")
+    if not drift:
+        print("Η free-list θέσεων είναι συνεπής.")
+        return 0
+    if args.repair:
+        print(f"Ανακατασκευάστηκε η free-list ({len(drift)} αποκλίσεις διορθώθηκαν).")
+        return 0
+    return 1
+
+
+def _compact_suppliers(_args):
+    """Συγχωνεύει τους διπλούς placeholder προμηθευτές που δημιουργούσαν οι παλιές παραγγελίες προμηθευτών."""
+    removed = WarehouseRepository.compact_auto_suppliers()
+    print(f"Αφαιρέθηκαν {removed} διπλοί προμηθευτές {WarehouseRepository.AUTO_SUPPLIER_NAME}.")
+    return 0
+
+
+def _latest_shipments(_args):
+    """Συμπληρώνει τις στήλες τελευταίας αποστολής της PARAGGELIA για υπάρχοντα δεδομένα."""
+    updated = WarehouseRepository.backfill_latest_shipments()
+    print(f"Ενημερώθηκαν {updated} παραγγελίες με την τελευταία τους αποστολή.")
+    return 0
+
+
+def _export_order_items(args):
+    """Γράφει σε CSV τις γραμμές παραγγελιών ενός διαστήματος χωρίς να τις φορτώσει όλες στη μνήμη."""
+    columns = [
+        "order_id", "executed_at", "afm_farmakeiou", "katastasi",
+        "product_id", "onoma", "temaxia_zitisis", "arx_kostos_temaxiou",
+    ]
+    handle = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    try:
+        writer = csv.DictWriter(handle, fieldnames=columns)
+        writer.writeheader()
+        count = 0
+        for row in WarehouseRepository.stream_order_items(args.start, args.end, args.batch_size):
+            writer.writerow(row)
+            count += 1
+    finally:
+        if args.out:
+            handle.close()
+    print(f"Εξήχθησαν {count} γραμμές παραγγελιών.", file=sys.stderr)
+    return 0
+
+
+def _bench_prepared(args):
+    """Μετρά τον χρόνο ανά κλήση ενός IN query με κείμενο SQL και με prepared statements (ίδιες συνδέσεις)."""
+    ids = list(range(1, args.ids + 1))
+    for enabled in (False, True):
+        StatementCache.enabled = enabled
+        Database.fetch_in(SQL.INVENTORY_AVAILABLE_BY_IDS, ids)
+        timings = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            Database.fetch_in(SQL.INVENTORY_AVAILABLE_BY_IDS, ids)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        mode = "prepared" if enabled else "text"
+        print(
+            f"{mode}: p50={timings[len(timings) // 2] * 1000:.3f}ms "
+            f"p95={timings[int(len(timings) * 0.95)] * 1000:.3f}ms ({args.runs} κλήσεις, {len(ids)} ids)"
+        )
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Εργαλεία συντήρησης farmakeio_db.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stock = commands.add_parser("stock-totals", help="Έλεγχος/ανακατασκευή συνολικών αποθεμάτων ανά προϊόν.")
+    stock.add_argument("--repair", action="store_true", help="Ξαναϋπολογίζει τα σύνολα από τις θέσεις αποθήκης.")
+    stock.set_defaults(handler=_stock_totals)
+
+    reservations = commands.add_parser("reservations", help="Έλεγχος/ανακατασκευή δεσμεύσεων αποθέματος.")
+    mode = reservations.add_mutually_exclusive_group()
+    mode.add_argument("--repair", action="store_true", help="Ξαναϋπολογίζει τα δεσμευμένα σύνολα από τις δεσμεύσεις.")
+    mode.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Σβήνει και ξαναδημιουργεί τις δεσμεύσεις όλων των εκκρεμών παραγγελιών (παλαιότερη πρώτη).",
+    )
+    reservations.set_defaults(handler=_reservations)
+
+    free = commands.add_parser("free-positions", help="Έλεγχος/ανακατασκευή της free-list κενών θέσεων.")
+    free.add_argument("--repair", action="store_true", help="Ξαναχτίζει τη free-list από τις θέσεις αποθήκης.")
+    free.set_defaults(handler=_free_positions)
+
+    suppliers = commands.add_parser(
+        "compact-suppliers", help="Συγχώνευση διπλών placeholder προμηθευτών σε έναν."
+    )
+    suppliers.set_defaults(handler=_compact_suppliers)
+
+    shipments = commands.add_parser("latest-shipments", help="Backfill τελευταίας αποστολής ανά παραγγελία.")
+    shipments.set_defaults(handler=_latest_shipments)
+
+    export = commands.add_parser("export-order-items", help="Εξαγωγή γραμμών παραγγελιών διαστήματος σε CSV.")
+    export.add_argument("start", type=date.fromisoformat, help="Από ημερομηνία (YYYY-MM-DD, συμπεριλαμβάνεται).")
+    export.add_argument("end", type=date.fromisoformat, help="Έως ημερομηνία (YYYY-MM-DD, δεν συμπεριλαμβάνεται).")
+    export.add_argument("--out", help="Αρχείο CSV (προεπιλογή: stdout).")
+    export.add_argument("--batch-size", type=int, default=2000, help="Γραμμές ανά ανάγνωση από τη βάση.")
+    export.set_defaults(handler=_export_order_items)
+
+    bench = commands.add_parser("bench-prepared", help="Σύγκριση latency με/χωρίς prepared statements.")
+    bench.add_argument("--ids", type=int, default=5, help="Πλήθος ids στο IN.")
+    bench.add_argument("--runs", type=int, default=2000, help="Κλήσεις ανά τρόπο εκτέλεσης.")
+    bench.set_defaults(handler=_bench_prepared)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""Μετρήσεις εκτέλεσης SQL ανά σταθερά της κλάσης SQL (πλήθος, latency, γραμμές, αναμονή σύνδεσης).
+
+Κάθε εντολή αναγνωρίζεται από το όνομα του attribute της στο `SQL` (π.χ. "PHARMACY_PRODUCTS") και όχι
+από το κείμενο, ώστε τα IN clauses με διαφορετικό πλήθος placeholders να μετρώνται μαζί. Οι χρόνοι
+κρατιούνται σε σταθερά buckets (histogram), άρα η μνήμη δεν μεγαλώνει με τις κλήσεις και τα
+p50/p95/p99 είναι εκτιμήσεις με ακρίβεια bucket.
+
+Ρυθμίσεις από το περιβάλλον:
+    DB_METRICS=0                  απενεργοποιεί την καταγραφή
+    DB_METRICS_FILE=/tmp/db.prom  περιοδικό dump σε αρχείο
+    DB_METRICS_FORMAT=prometheus  ή json (προεπιλογή: από την κατάληξη του αρχείου)
+    DB_METRICS_INTERVAL=60        δευτερόλεπτα ανάμεσα στα dumps
+"""
+
+import json
+import os
+import threading
+
+# Άνω όρια των buckets σε δευτερόλεπτα (το τελευταίο, +Inf, είναι εννοούμενο).
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Ψευδο-όνομα για εντολές που δεν προέρχονται από σταθερά του SQL (π.χ. ad-hoc κείμενο).
+UNNAMED_STATEMENT = "<unnamed>"
+# Ψευδο-όνομα για αναμονές σύνδεσης που δεν αποδίδονται σε μία εντολή (transactions, cursor()).
+POOL_STATEMENT = "<pool>"
+
+
+class Histogram:
+    """Αθροιστικό histogram με σταθερά buckets (ίδια σημασιολογία με τα Prometheus histograms)."""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, fraction):
+        """Εκτίμηση του ποσοστημορίου με γραμμική παρεμβολή μέσα στο bucket όπου πέφτει."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = LATENCY_BUCKETS[index - 1] if index > 0 else 0.0
+                if index >= len(LATENCY_BUCKETS):
+                    return lower
+                upper = LATENCY_BUCKETS[index]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return LATENCY_BUCKETS[-1]
+
+
+class StatementStats:
+    """Συσσωρευμένα στοιχεία μίας εντολής."""
+
+    __slots__ = ("calls", "errors", "rows", "latency", "acquire")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.latency = Histogram()
+        self.acquire = Histogram()
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "latency_total_s": self.latency.total,
+            "latency_p50_s": self.latency.percentile(0.50),
+            "latency_p95_s": self.latency.percentile(0.95),
+            "latency_p99_s": self.latency.percentile(0.99),
+            "acquire_count": self.acquire.count,
+            "acquire_total_s": self.acquire.total,
+            "acquire_p95_s": self.acquire.percentile(0.95),
+        }
+
+
+def statement_name(query):
+    """Το όνομα σταθεράς SQL μιας εντολής (βλ. db.SqlText) ή UNNAMED_STATEMENT."""
+    return getattr(query, "name", None) or UNNAMED_STATEMENT
+
+
+class QueryMetrics:
+    """Thread-safe μητρώο μετρήσεων για όλη τη διεργασία."""
+
+    enabled = os.getenv("DB_METRICS", "1") != "0"
+
+    _lock = threading.Lock()
+    _stats = {}
+    _counters = {}
+    _dumper = None
+
+    @classmethod
+    def _get(cls, name):
+        stats = cls._stats.get(name)
+        if stats is None:
+            stats = cls._stats[name] = StatementStats()
+        return stats
+
+    @classmethod
+    def record_query(cls, name, seconds, rows=0, error=False):
+        """Καταγράφει μία εκτέλεση εντολής (χρόνος execute+fetch και γραμμές που επιστράφηκαν)."""
+        if not cls.enabled:
+            return
+        with cls._lock:
+            stats = cls._get(name)
+            stats.calls += 1
+            stats.rows += rows
+            if error:
+                stats.errors += 1
+            stats.latency.observe(seconds)
+
+    @classmethod
+    def record_rows(cls, name, rows):
+        """Προσθέτει γραμμές που διαβάστηκαν μετά το execute (fetch σε cursor συναλλαγής)."""
+        if not cls.enabled or not rows:
+            return
+        with cls._lock:
+            cls._get(name).rows += rows
+
+    @classmethod
+    def record_acquire(cls, name, seconds):
+        """Καταγράφει αναμονή για σύνδεση από το pool, αποδοσμένη στην εντολή που τη χρειάστηκε."""
+        if not cls.enabled:
+            return
+        with cls._lock:
+            cls._get(name).acquire.observe(seconds)
+
+    @classmethod
+    def increment(cls, counter, amount=1):
+        """Γενικός μετρητής γεγονότων (π.χ. επαναλήψεις συναλλαγών)."""
+        if not cls.enabled:
+            return
+        with cls._lock:
+            cls._counters[counter] = cls._counters.get(counter, 0) + amount
+
+    @classmethod
+    def snapshot(cls):
+        """Στιγμιότυπο όλων των μετρήσεων ως απλά λεξικά (ασφαλές για ανάγνωση από άλλο thread)."""
+        with cls._lock:
+            return {
+                "statements": {name: stats.as_dict() for name, stats in sorted(cls._stats.items())},
+                "counters": dict(sorted(cls._counters.items())),
+            }
+
+    @classmethod
+    def statement(cls, name):
+        """Τα στοιχεία μίας εντολής (ή None αν δεν έχει εκτελεστεί)."""
+        with cls._lock:
+            stats = cls._stats.get(name)
+            return stats.as_dict() if stats else None
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._stats = {}
+            cls._counters = {}
+
+    @classmethod
+    def to_json(cls):
+        return json.dumps(cls.snapshot(), indent=2, sort_keys=True)
+
+    @classmethod
+    def to_prometheus(cls):
+        """Κείμενο σε μορφή Prometheus exposition (histograms ανά statement)."""
+        with cls._lock:
+            items = [(name, cls._copy(stats)) for name, stats in sorted(cls._stats.items())]
+            counters = sorted(cls._counters.items())
+        lines = []
+        for metric, attribute, help_text in (
+            ("farmakeio_db_query_seconds", "latency", "Χρόνος εκτέλεσης εντολής SQL."),
+            ("farmakeio_db_acquire_seconds", "acquire", "Αναμονή για σύνδεση από το pool."),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, stats in items:
+                histogram = getattr(stats, attribute)
+                if not histogram.count:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{statement="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{statement="{name}"}} {histogram.total}')
+                lines.append(f'{metric}_count{{statement="{name}"}} {histogram.count}')
+        for metric, attribute in (("farmakeio_db_query_rows_total", "rows"), ("farmakeio_db_query_errors_total", "errors")):
+            lines.append(f"# TYPE {metric} counter")
+            for name, stats in items:
+                lines.append(f'{metric}{{statement="{name}"}} {getattr(stats, attribute)}')
+        if counters:
+            lines.append("# TYPE farmakeio_db_events_total counter")
+            for counter, value in counters:
+                lines.append(f'farmakeio_db_events_total{{event="{counter}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _copy(stats):
+        copy = StatementStats()
+        copy.calls, copy.errors, copy.rows = stats.calls, stats.errors, stats.rows
+        for attribute in ("latency", "acquire"):
+            source, target = getattr(stats, attribute), getattr(copy, attribute)
+            target.counts, target.count, target.total = list(source.counts), source.count, source.total
+        return copy
+
+    @classmethod
+    def dump(cls, path, fmt=None):
+        """Γράφει τις μετρήσεις σε αρχείο (ατομικά, μέσω προσωρινού αρχείου και rename)."""
+        fmt = fmt or ("json" if path.endswith(".json") else "prometheus")
+        text = cls.to_json() if fmt == "json" else cls.to_prometheus()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def start_dumper(cls, path, fmt=None, interval=60.0):
+        """Ξεκινά daemon thread που κάνει dump κάθε `interval` δευτερόλεπτα (μία φορά ανά διεργασία)."""
+        with cls._lock:
+            if cls._dumper is not None:
+                return cls._dumper
+            stop = threading.Event()
+
+            def loop():
+                while not stop.wait(interval):
+                    try:
+                        cls.dump(path, fmt)
+                    except OSError:
+                        # Ένα προσωρινό πρόβλημα στο αρχείο δεν πρέπει να σταματά τις επόμενες εγγραφές.
+                        continue
+                try:
+                    cls.dump(path, fmt)
+                except OSError:
+                    # Στον τερματισμό δεν υπάρχει επόμενη ευκαιρία· το σφάλμα δεν πρέπει να σκάσει μέσα στο thread.
+                    pass
+
+            thread = threading.Thread(target=loop, name="db-metrics-dump", daemon=True)
+            thread.stop = stop
+            cls._dumper = thread
+        thread.start()
+        return thread
+
+    @classmethod
+    def stop_dumper(cls):
+        """Σταματά το περιοδικό dump γράφοντας μία τελευταία φορά."""
+        with cls._lock:
+            thread, cls._dumper = cls._dumper, None
+        if thread is not None:
+            thread.stop.set()
+            thread.join(timeout=5)
+
+    @classmethod
+    def start_from_env(cls):
+        """Ξεκινά το dump αν έχει οριστεί DB_METRICS_FILE."""
+        path = os.getenv("DB_METRICS_FILE")
+        if not path or not cls.enabled:
+            return None
+        fmt = os.getenv("DB_METRICS_FORMAT") or None
+        interval = float(os.getenv("DB_METRICS_INTERVAL", "60"))
+        return cls.start_dumper(path, fmt, max(1.0, interval))
@@ -8,7 +8,9 @@ from datetime import datetime
 
 import mysql.connector
 
-from db import Database, SQL, with_in_clause
+import picking
+from catalog import ProductCatalog
+from db import Database, SQL, bucketed_in_clause, with_in_clause, with_row_in_clause
 from domain import (
     CONTRACT_DURATION_CHOICES,
     CONTRACT_DURATION_LOOKUP,
@@ -32,21 +34,62 @@ SHIPMENT_STATUS_LABELS = {
     "ΟΛΟΚΛΗΡΩΜΕΝΗ": "Αποστολή ολοκληρώθηκε",
     "ΜΕΡΙΚΗ": "Αποστολή μερική",
 }
+# Πλήθος παραγγελιών ανά σελίδα στις λίστες ιστορικού/αποθήκης.
+ORDER_PAGE_SIZE = 100
+# Cursor πρώτης σελίδας: μετά από κάθε πραγματική (hm_ora_ektelesis, order_id).
+FIRST_PAGE_CURSOR = (datetime(9999, 12, 31, 23, 59, 59), 2**31 - 1)
 
 
 def _group_order_items(order_ids):
     """Συγκεντρώνει τα προϊόντα κάθε παραγγελίας σε λεξικό για εύκολη πρόσβαση."""
     if not order_ids:
         return {}
-    query = with_in_clause(SQL.ORDER_ITEMS_WITH_STOCK, order_ids)
-    params = list(order_ids) + list(order_ids)
-    items = Database.fetch_all(query, params)
+    items = Database.fetch_in(SQL.ORDER_ITEMS_WITH_STOCK, order_ids, compact=True)
     grouped = defaultdict(list)
     for item in items:
         grouped[item["order_id"]].append(item)
     return grouped
 
 
+def _fetch_order_page(dated_query, undated_query, params, cursor, limit):
+    """Μία σελίδα παραγγελιών: πρώτα οι χρονολογημένες (νεότερη πρώτη), μετά όσες δεν έχουν hm_ora_ektelesis.
+
+    Ο cursor είναι (after_executed_at, after_order_id)· με after_executed_at None η σελιδοποίηση βρίσκεται
+    ήδη στις παραγγελίες χωρίς ημερομηνία. Μια σελίδα που τελειώνει τις χρονολογημένες συμπληρώνεται
+    από τις υπόλοιπες, ώστε καμία παραγγελία να μη μένει εκτός λίστας.
+    """
+    after_executed_at, after_order_id = cursor or FIRST_PAGE_CURSOR
+    rows = []
+    if after_executed_at is not None:
+        rows = Database.fetch_all(
+            dated_query, (*params, after_executed_at, after_executed_at, after_order_id, limit), compact=True
+        )
+        if len(rows) >= limit:
+            return rows
+        after_order_id = FIRST_PAGE_CURSOR[1]
+    rows.extend(Database.fetch_all(undated_query, (*params, after_order_id, limit - len(rows)), compact=True))
+    return rows
+
+
+def _next_cursor(rows, limit):
+    """Cursor της επόμενης σελίδας (executed_at, order_id της τελευταίας γραμμής) ή None στην τελευταία."""
+    if len(rows) < limit:
+        return None
+    last = rows[-1]
+    return last["executed_at"], last["order_id"]
+
+
+def _iter_pages(fetch_page):
+    """Διατρέχει όλες τις σελίδες μιας fetch_page(cursor) -> (rows, next_cursor) και επιστρέφει μία-μία."""
+    cursor = None
+    while True:
+        rows, cursor = fetch_page(cursor)
+        if rows:
+            yield rows
+        if cursor is None:
+            return
+
+
 def _normalize_status_filter(status_label):
     """Μετατρέπει την φιλική περιγραφή κατάστασης σε κωδικό βάσης."""
     if not status_label or status_label == "Όλες":
@@ -62,16 +105,107 @@ class InventoryRepository:
         """Επιστρέφει λεξικό με διαθέσιμα τεμάχια για συγκεκριμένα προϊόντα."""
         if not product_ids:
             return {}
-        query = with_in_clause(SQL.INVENTORY_AVAILABLE_BY_IDS, product_ids)
-        rows = Database.fetch_all(query, product_ids)
+        rows = Database.fetch_in(SQL.INVENTORY_AVAILABLE_BY_IDS, product_ids, compact=True)
         return {row["product_id"]: int(row["available"]) for row in rows}
 
     @staticmethod
     def fetch_all_stock():
         """Φέρνει συγκεντρωτικό απόθεμα για όλα τα προϊόντα (χρησιμοποιείται σε εκτιμήσεις)."""
-        rows = Database.fetch_all(SQL.INVENTORY_ALL_STOCK)
+        rows = Database.fetch_all(SQL.INVENTORY_ALL_STOCK, compact=True)
         return {row["product_id"]: int(row["available"]) for row in rows}
 
+    @staticmethod
+    def adjust_stock_totals(cur, deltas):
+        """Ενημερώνει τα συνολικά αποθέματα μέσα στη συναλλαγή που άλλαξε τις θέσεις.
+
+        Κάθε κώδικας που γράφει στην PROION_YPARXEI_APOTHIKI_THESI πρέπει να περνά από εδώ
+        τη μεταβολή ανά προϊόν, αλλιώς το PROION_SYNOLIKO_APOTHEMA αποκλίνει.
+        """
+        rows = [(product_id, int(delta)) for product_id, delta in sorted(deltas.items()) if delta]
+        if rows:
+            cur.executemany(SQL.ADJUST_STOCK_TOTALS, rows)
+
+    @staticmethod
+    def adjust_reserved_totals(cur, deltas):
+        """Όπως το adjust_stock_totals, για τα δεσμευμένα τεμάχια (qty_desmeumeno) ανά προϊόν."""
+        rows = [(product_id, int(delta)) for product_id, delta in sorted(deltas.items()) if delta]
+        if rows:
+            cur.executemany(SQL.ADJUST_RESERVED_TOTALS, rows)
+
+    @staticmethod
+    def lock_free_stock(cur, product_ids):
+        """Κλειδώνει τα σύνολα των προϊόντων και επιστρέφει product_id -> αδέσμευτα τεμάχια (μπορεί < 0)."""
+        product_ids = sorted(set(product_ids))
+        if not product_ids:
+            return {}
+        cur.execute(*bucketed_in_clause(SQL.FREE_STOCK_FOR_UPDATE, product_ids))
+        return {row["product_id"]: int(row["qty_diathesimo"]) for row in cur.fetchall()}
+
+    @staticmethod
+    def reserve_stock(cur, order_id, requested, free):
+        """Δεσμεύει για την παραγγελία έως το αδέσμευτο απόθεμα κάθε προϊόντος.
+
+        requested: product_id -> ζητούμενα, free: product_id -> αδέσμευτα (από γραμμές ήδη κλειδωμένες
+        στην ίδια συναλλαγή). Επιστρέφει product_id -> δεσμευμένα τεμάχια.
+        """
+        reserved = {}
+        for product_id, qty in sorted(requested.items()):
+            take = min(int(qty), max(0, int(free.get(product_id, 0))))
+            if take > 0:
+                reserved[product_id] = take
+        if reserved:
+            cur.executemany(SQL.INSERT_RESERVATION, [(order_id, pid, qty) for pid, qty in reserved.items()])
+            InventoryRepository.adjust_reserved_totals(cur, reserved)
+        return reserved
+
+    @staticmethod
+    def release_reservations(cur, order_ids):
+        """Απελευθερώνει (ή καταναλώνει μετά την αποστολή) όλες τις δεσμεύσεις των παραγγελιών."""
+        order_ids = sorted(set(order_ids))
+        if not order_ids:
+            return
+        cur.execute(*bucketed_in_clause(SQL.RELEASE_RESERVED_TOTALS, order_ids))
+        cur.execute(*bucketed_in_clause(SQL.DELETE_RESERVATIONS, order_ids))
+
+    @staticmethod
+    def check_reserved_totals(repair=False):
+        """Όπως το check_stock_totals, για το qty_desmeumeno έναντι των δεσμεύσεων της PARAGGELIA_DESMEUSI."""
+        with Database.transaction(dictionary=True) as cur:
+            cur.execute(SQL.RESERVED_TOTALS_DRIFT)
+            drift = cur.fetchall() or []
+            if drift and repair:
+                cur.execute(SQL.REBUILD_RESERVED_TOTALS)
+        return drift
+
+    @staticmethod
+    def rebuild_reservations():
+        """Ξαναχτίζει όλες τις δεσμεύσεις από τις εκκρεμείς παραγγελίες (παλαιότερη πρώτη) και τα σύνολά τους.
+
+        Για το πρώτο γέμισμα μετά τη μετάβαση ή μετά από χειροκίνητες αλλαγές· επιστρέφει πόσες γραμμές δεσμεύτηκαν.
+        """
+        with Database.transaction(dictionary=True) as cur:
+            cur.execute(SQL.CLEAR_RESERVATIONS)
+            cur.execute(
+                SQL.BACKFILL_RESERVATIONS,
+                (DEFAULT_ORDER_STATUS, ORDER_STATUS_TO_DB["Σε επεξεργασία"]),
+            )
+            created = cur.rowcount
+            cur.execute(SQL.REBUILD_RESERVED_TOTALS)
+        return created
+
+    @staticmethod
+    def check_stock_totals(repair=False):
+        """Συγκρίνει τα αποθηκευμένα σύνολα με το SUM των θέσεων και, αν ζητηθεί, τα ξαναχτίζει.
+
+        Επιστρέφει τη λίστα αποκλίσεων (product_id, recorded, actual) που βρέθηκαν πριν την επισκευή.
+        """
+        with Database.transaction(dictionary=True) as cur:
+            cur.execute(SQL.STOCK_TOTALS_DRIFT)
+            drift = cur.fetchall() or []
+            if drift and repair:
+                cur.execute(SQL.REBUILD_STOCK_TOTALS)
+        return drift
+
 
 class AuthManager:
     """Διαχείριση χρηστών: εγγραφή, σύνδεση και χειρισμός κωδικών."""
@@ -162,15 +296,23 @@ class PharmacyRepository:
 
     @staticmethod
     def fetch_products():
-        """Επιστρέφει όλα τα προϊόντα με τα συνολικά διαθέσιμα τεμάχια."""
-        return Database.fetch_all(SQL.PHARMACY_PRODUCTS)
+        """Επιστρέφει όλα τα προϊόντα με τα συνολικά διαθέσιμα τεμάχια (από την κοινή cache καταλόγου)."""
+        return ProductCatalog.products()
 
     @staticmethod
     def get_afm(username):
         """Βρίσκει το ΑΦΜ που αντιστοιχεί στο δοθέν username."""
-        row = Database.fetch_one(SQL.PHARMACY_AFM, (username,))
+        row = Database.fetch_one(SQL.PHARMACY_AFM, (username,), cache=True)
         return row["afm"] if row else None
 
+    @staticmethod
+    def _contract_months(row):
+        """Διάρκεια συμβολαίου σε μήνες (από τη στήλη ή από τις ημερομηνίες)."""
+        duration_months = row.get("diarkeia_mhnwn")
+        if not duration_months:
+            duration_months = contract_duration_months(row.get("hm_ypografis"), row.get("hm_liksis"))
+        return int(duration_months or 0)
+
     @staticmethod
     def _annotate_contract(row):
         """Εμπλουτίζει μια εγγραφή συμβολαίου με παράγωγα πεδία για εμφάνιση."""
@@ -178,10 +320,7 @@ class PharmacyRepository:
         end_date = row["hm_liksis"]
         row["is_active"] = bool(end_date and end_date > today)
         row["is_expired"] = bool(end_date and end_date <= today)
-        duration_months = row.get("diarkeia_mhnwn")
-        if not duration_months:
-            duration_months = contract_duration_months(row.get("hm_ypografis"), row.get("hm_liksis"))
-        row["duration_months"] = int(duration_months or 0)
+        row["duration_months"] = PharmacyRepository._contract_months(row)
         row["discount_percent"] = discount_percent_for_months(row["duration_months"])
         row["frequency_label"] = DELIVERY_DB_TO_LABEL.get(row["suxnotita_paradosis"], row["suxnotita_paradosis"])
         row["payment_label"] = PAYMENT_DB_TO_LABEL.get(row["tropos_pliromis"], row["tropos_pliromis"])
@@ -192,7 +331,7 @@ class PharmacyRepository:
         """Επιστρέφει λίστα συμβολαίων που σχετίζονται με το φαρμακείο."""
         if not username:
             return []
-        rows = Database.fetch_all(SQL.PHARMACY_CONTRACTS, (username,))
+        rows = Database.fetch_all(SQL.PHARMACY_CONTRACTS, (username,), cache=True)
         return [PharmacyRepository._annotate_contract(row) for row in rows]
 
     @staticmethod
@@ -274,57 +413,87 @@ class PharmacyRepository:
         if not items:
             return False, "Δεν υπάρχουν προϊόντα στην παραγγελία."
 
-        afm = PharmacyRepository.get_afm(username)
-        if not afm:
-            return False, "Δεν βρέθηκε το συνδεδεμένο φαρμακείο."
-
-        # Αντιστοίχηση προϊόντων με τιμές βάσης για σωστό υπολογισμό κόστους.
-        product_ids = [product_id for product_id, _, _ in items]
-        query = with_in_clause(SQL.PRODUCT_PRICES_BY_IDS, product_ids)
-        # Παίρνουμε όλες τις τιμές (arx_kostos_temaxiou) για να αποφύγουμε πολλαπλά trips στη βάση.
-        price_rows = Database.fetch_all(query, product_ids)
-        price_map = {row["product_id"]: float(row["arx_kostos_temaxiou"]) for row in price_rows}
-        if len(price_map) != len(product_ids):
-            return False, "Δεν βρέθηκαν στοιχεία τιμών για όλα τα προϊόντα."
-
-        base_total = 0.0
-        for product_id, quantity, _ in items:
-            base_total += int(quantity) * price_map.get(product_id, 0.0)
-        discount_percent = PharmacyRepository.get_active_discount(username)
-        discount_amount = base_total * (discount_percent / 100)
-        discounted_total = max(0.0, base_total - discount_amount)
+        product_ids = sorted({product_id for product_id, _, _ in items})
+
+        def work(cur):
+            # 1. Ένα query για ΑΦΜ, τρέχον συμβόλαιο, τιμές (shared lock) και αδέσμευτο απόθεμα (exclusive lock).
+            today = datetime.utcnow().date()
+            query, ids = bucketed_in_clause(SQL.ORDER_PRICING_LOCKED, product_ids)
+            cur.execute(query, (today, *ids, username))
+            rows = cur.fetchall()
+            if not rows:
+                return False, "Δεν βρέθηκε το συνδεδεμένο φαρμακείο."
+            price_map = {
+                row["product_id"]: float(row["arx_kostos_temaxiou"])
+                for row in rows
+                if row["product_id"] is not None
+            }
+            if len(price_map) != len(product_ids):
+                return False, "Δεν βρέθηκαν στοιχεία τιμών για όλα τα προϊόντα."
+            free = {row["product_id"]: int(row["atp"]) for row in rows if row["product_id"] is not None}
+            pricing = rows[0]
+            discount_percent = 0
+            if pricing["hm_liksis"] and pricing["hm_liksis"] > today:
+                discount_percent = int(discount_percent_for_months(PharmacyRepository._contract_months(pricing)))
+
+            base_total = 0.0
+            for product_id, quantity, _ in items:
+                base_total += int(quantity) * price_map[product_id]
+            discount_amount = base_total * (discount_percent / 100)
+            discounted_total = max(0.0, base_total - discount_amount)
+
+            # 2. Κεφαλίδα και 3. γραμμές (ένα multi-row INSERT μέσω executemany) στην ίδια συναλλαγή.
+            cur.execute(
+                SQL.INSERT_ORDER,
+                (DEFAULT_ORDER_STATUS, discounted_total, discount_percent, pricing["afm"], datetime.now()),
+            )
+            order_id = cur.lastrowid
+            item_rows = [(order_id, product_id, quantity) for product_id, quantity, _ in items]
+            cur.executemany(SQL.INSERT_ORDER_ITEM, item_rows)
+
+            # 4. Δέσμευση όσων τεμαχίων είναι διαθέσιμα· το ETA βασίζεται μόνο σε αυτά.
+            requested = defaultdict(int)
+            for product_id, quantity, _ in items:
+                requested[product_id] += int(quantity)
+            reserved = InventoryRepository.reserve_stock(cur, order_id, requested, free)
+            eta_days = calculate_delivery_days(list(requested.items()), reserved)
+            day_label = "ημέρα" if eta_days == 1 else "ημέρες"
+            return True, f"Η παραγγελία #{order_id} στάλθηκε.\nΕκτιμώμενη παράδοση σε {eta_days} {day_label}."
 
         try:
-            with Database.transaction(dictionary=False) as cur:
-                # Εισαγωγή κεφαλίδας παραγγελίας και κατόπιν γραμμών προϊόντων.
-                cur.execute(
-                    SQL.INSERT_ORDER,
-                    (DEFAULT_ORDER_STATUS, discounted_total, discount_percent, afm, datetime.now()),
-                )
-                order_id = cur.lastrowid
-                # Δημιουργούμε ένα bulk list για executemany ώστε να είναι αποδοτικότερο.
-                item_rows = [(order_id, product_id, quantity) for product_id, quantity, _ in items]
-                cur.executemany(SQL.INSERT_ORDER_ITEM, item_rows)
-            return True, f"Η παραγγελία #{order_id} στάλθηκε."
+            # Η επανάληψη μετά από deadlock δεν διπλασιάζει την παραγγελία: η αποτυχημένη προσπάθεια
+            # έχει γίνει rollback, οπότε κεφαλίδα και γραμμές γράφονται μία φορά.
+            return Database.run_transaction(work, dictionary=True, name="create_order")
         except mysql.connector.Error as exc:
             return False, f"Σφάλμα βάσης: {exc.msg}"
 
     @staticmethod
-    def fetch_history(username, status_filter=None):
-        """Φέρνει ιστορικό παραγγελιών και ομαδοποιεί προϊόντα ανά παραγγελία."""
+    def fetch_history(username, status_filter=None, cursor=None, limit=ORDER_PAGE_SIZE):
+        """Φέρνει μία σελίδα ιστορικού παραγγελιών και επιστρέφει (παραγγελίες, cursor επόμενης σελίδας).
+
+        Οι γραμμές προϊόντων φορτώνονται μόνο για παραγγελίες χωρίς αποστολή, που τις χρειάζονται
+        για την εκτίμηση παράδοσης· για τις υπόλοιπες το "items" είναι None και φέρνονται με
+        fetch_order_items όταν ανοίξει η παραγγελία. Ο cursor είναι (after_executed_at, after_order_id)
+        ή None για την πρώτη σελίδα.
+        """
         status_db = _normalize_status_filter(status_filter)
         if status_db:
-            orders = Database.fetch_all(SQL.ORDER_HISTORY_BY_STATUS, (username, status_db))
+            orders = _fetch_order_page(
+                SQL.ORDER_HISTORY_BY_STATUS, SQL.ORDER_HISTORY_UNDATED_BY_STATUS, (username, status_db), cursor, limit
+            )
         else:
-            orders = Database.fetch_all(SQL.ORDER_HISTORY, (username,))
+            orders = _fetch_order_page(SQL.ORDER_HISTORY, SQL.ORDER_HISTORY_UNDATED, (username,), cursor, limit)
         if not orders:
-            return []
+            return [], None
 
-        order_ids = [o["order_id"] for o in orders]
-        grouped = _group_order_items(order_ids)
+        cancelled = ORDER_STATUS_TO_DB.get("Ακυρώθηκε")
+        pending_ids = [
+            o["order_id"] for o in orders if not o.get("shipment_at") and o.get("katastasi") != cancelled
+        ]
+        grouped = _group_order_items(pending_ids)
 
         for order in orders:
-            order["items"] = grouped.get(order["order_id"], [])
+            order["items"] = grouped.get(order["order_id"], []) if order["order_id"] in pending_ids else None
             base_status = order.get("katastasi")
             shipment_status = order.get("shipment_status")
             display_status = base_status
@@ -334,7 +503,19 @@ class PharmacyRepository:
                 order["katastasi"] = SHIPMENT_STATUS_LABELS[display_status]
             else:
                 order["katastasi"] = ORDER_STATUS_FROM_DB.get(display_status, display_status)
-        return orders
+        return orders, _next_cursor(orders, limit)
+
+    @staticmethod
+    def iter_history(username, status_filter=None, page_size=ORDER_PAGE_SIZE):
+        """Iterator πάνω σε όλο το ιστορικό, σελίδα-σελίδα (λίστες παραγγελιών), με keyset cursors."""
+        return _iter_pages(
+            lambda cursor: PharmacyRepository.fetch_history(username, status_filter, cursor=cursor, limit=page_size)
+        )
+
+    @staticmethod
+    def fetch_order_items(order_id):
+        """Φέρνει τις γραμμές μίας παραγγελίας όταν ο χρήστης την ανοίξει στο ιστορικό."""
+        return _group_order_items([order_id]).get(order_id, [])
 
 
 class WarehouseRepository:
@@ -343,28 +524,62 @@ class WarehouseRepository:
     SUPPLIER_STORAGE_LABEL = "SUPPLIER_ORDERS_VIRTUAL"
     AUTO_SUPPLIER_NAME = "AUTO_SUPPLIER"
     AUTO_SUPPLIER_DEFAULT_PHONE = "2100000000"
+    # Ράφια που δημιουργούνται μαζί όταν αδειάσει η free-list (τα περισσευούμενα μένουν ελεύθερα).
+    SHELVES_PER_NEW_AISLE = 20
 
     @staticmethod
-    def fetch_pharmacy_orders(status_filter=None):
-        """Φιλτράρει τις παραγγελίες ανά κατάσταση και συσχετίζει γραμμές με προϊόντα."""
+    def fetch_pharmacy_orders(status_filter=None, cursor=None, limit=ORDER_PAGE_SIZE):
+        """Φέρνει μία σελίδα παραγγελιών (χωρίς γραμμές) και τον cursor της επόμενης σελίδας.
+
+        Οι γραμμές κάθε παραγγελίας φορτώνονται χωριστά με fetch_order_items όταν χρειαστούν.
+        Ο cursor είναι (after_executed_at, after_order_id) ή None για την πρώτη σελίδα.
+        """
         status_db = _normalize_status_filter(status_filter)
         if status_db:
-            orders = Database.fetch_all(SQL.WAREHOUSE_ORDERS_BY_STATUS, (status_db,))
+            orders = _fetch_order_page(
+                SQL.WAREHOUSE_ORDERS_BY_STATUS, SQL.WAREHOUSE_ORDERS_UNDATED_BY_STATUS, (status_db,), cursor, limit
+            )
         else:
-            orders = Database.fetch_all(SQL.WAREHOUSE_ORDERS)
-        if not orders:
-            return []
-
-        # Φέρνουμε όλα τα order_ids ώστε να επαναχρησιμοποιήσουμε το group helper για τα προϊόντα.
-        order_ids = [o["order_id"] for o in orders]
-        grouped = _group_order_items(order_ids)
+            orders = _fetch_order_page(SQL.WAREHOUSE_ORDERS, SQL.WAREHOUSE_ORDERS_UNDATED, (), cursor, limit)
 
         for order in orders:
-            # Εμπλουτίζουμε κάθε παραγγελία με τις γραμμές της και μεταφράζουμε την κατάσταση.
-            order["items"] = grouped.get(order["order_id"], [])
             status = order.get("katastasi")
             order["katastasi"] = ORDER_STATUS_FROM_DB.get(status, status)
-        return orders
+        return orders, _next_cursor(orders, limit)
+
+    @staticmethod
+    def iter_pharmacy_orders(status_filter=None, page_size=ORDER_PAGE_SIZE):
+        """Iterator πάνω σε όλες τις παραγγελίες φαρμακείων, σελίδα-σελίδα, με keyset cursors."""
+        return _iter_pages(
+            lambda cursor: WarehouseRepository.fetch_pharmacy_orders(status_filter, cursor=cursor, limit=page_size)
+        )
+
+    @staticmethod
+    def fetch_order_items(order_id):
+        """Φέρνει τις γραμμές μίας παραγγελίας (με διαθέσιμο stock και απεσταλμένα) όταν χρειαστούν."""
+        return _group_order_items([order_id]).get(order_id, [])
+
+    @staticmethod
+    def stream_order_items(start, end, batch_size=2000):
+        """Όλες οι γραμμές παραγγελιών με hm_ora_ektelesis στο [start, end), ως generator με σταθερή μνήμη.
+
+        Για αναφορές και εξαγωγές μεγάλων διαστημάτων (βλ. maintenance.py export-order-items)· οι
+        γραμμές έρχονται από unbuffered cursor σε παρτίδες των batch_size.
+        """
+        for row in Database.stream(SQL.ORDER_ITEMS_REPORT, (start, end), batch_size):
+            status = row.get("katastasi")
+            row["katastasi"] = ORDER_STATUS_FROM_DB.get(status, status)
+            yield row
+
+    @staticmethod
+    def backfill_latest_shipments():
+        """Ξαναγεμίζει τις στήλες τελευταίας αποστολής της PARAGGELIA από τον APOSTOLI.
+
+        Επιστρέφει πόσες παραγγελίες άλλαξαν.
+        """
+        with Database.transaction() as cur:
+            cur.execute(SQL.BACKFILL_LATEST_SHIPMENTS)
+            return cur.rowcount
 
     @staticmethod
     def update_order_status(order_id, new_status):
@@ -385,13 +600,22 @@ class WarehouseRepository:
                 return False, "Η παραγγελία έχει ήδη αποστολή και δεν μπορεί να αλλάξει κατάσταση."
 
             cur.execute(SQL.UPDATE_ORDER_STATUS, (normalized, order_id))
+            # Η ακύρωση απελευθερώνει τις δεσμεύσεις· η επαναφορά από ακύρωση δεσμεύει ξανά όσα είναι διαθέσιμα.
+            cancelled = ORDER_STATUS_TO_DB["Ακυρώθηκε"]
+            if normalized == cancelled and order_row["katastasi"] != cancelled:
+                InventoryRepository.release_reservations(cur, [order_id])
+            elif order_row["katastasi"] == cancelled and normalized != cancelled and not existing_shipment:
+                cur.execute(SQL.ORDER_ITEMS_FOR_RESERVATION, (order_id,))
+                requested = {row["product_id"]: int(row["temaxia_zitisis"]) for row in cur.fetchall()}
+                free = InventoryRepository.lock_free_stock(cur, requested)
+                InventoryRepository.reserve_stock(cur, order_id, requested, free)
             message = f"Η παραγγελία {order_id} άλλαξε σε '{new_status}'."
         return True, message
 
     @staticmethod
     def send_order(order_id):
         """Δημιουργεί αποστολή και μειώνει το διαθέσιμο στοκ ανά θέση αποθήκης."""
-        with Database.transaction(dictionary=True) as cur:
+        def work(cur):
             # 1. Φορτώνουμε την κεφαλίδα παραγγελίας για να ξέρουμε τρέχουσα κατάσταση/έκπτωση.
             cur.execute(SQL.ORDER_DETAILS_FOR_SHIPMENT, (order_id,))
             order_row = cur.fetchone()
@@ -405,73 +629,24 @@ class WarehouseRepository:
             if not items:
                 return False, "Δεν μπορείτε να αποστείλετε παραγγελία χωρίς προϊόντα."
 
-            shipped = []
-            all_fulfilled = True
-            total_cost_base = 0
             discount_percent = float(order_row.get("ekptosi") or 0)
 
-            for item in items:
-                # Για κάθε προϊόν εξαντλούμε σταδιακά τις θέσεις αποθήκης (FIFO ανά θέση).
-                product_id = item["product_id"]
-                requested = int(item["temaxia_zitisis"])
-                unit_price = float(item["arx_kostos_temaxiou"])
-                remaining = requested
-                shipped_qty = 0
-
-                # Φέρνουμε τις διαθέσιμες θέσεις για το συγκεκριμένο προϊόν ταξινομημένες.
-                cur.execute(SQL.PRODUCT_LOCATIONS, (product_id,))
-                locations = cur.fetchall()
-
-                for loc in locations:
-                    # Εφόσον ικανοποιήθηκε η ποσότητα προχωράμε στο επόμενο προϊόν.
-                    if remaining <= 0:
-                        break
-                    available = int(loc["qty_in_stock"] or 0)
-                    if available <= 0:
-                        continue
-                    # Παίρνουμε όσες μονάδες επιτρέπουν τα διαθέσιμα της θέσης.
-                    take = min(available, remaining)
-                    new_qty = available - take
-                    if new_qty > 0:
-                        # Εάν μένει υπόλοιπο, απλώς ενημερώνουμε το qty της θέσης.
-                        cur.execute(
-                            SQL.UPDATE_STOCK,
-                            (
-                                new_qty,
-                                product_id,
-                                loc["storage_id"],
-                                loc["ar_diadromou"],
-                                loc["ar_rafiou"],
-                            ),
-                        )
-                    else:
-                        # Διαφορετικά, διαγράφουμε τη γραμμή για να αδειάσει η θέση.
-                        cur.execute(
-                            SQL.DELETE_STOCK,
-                            (
-                                product_id,
-                                loc["storage_id"],
-                                loc["ar_diadromou"],
-                                loc["ar_rafiou"],
-                            ),
-                        )
-                    shipped_qty += take
-                    remaining -= take
-
-                if shipped_qty > 0:
-                    # Προσθέτουμε τις αποσταλείσες μονάδες για υπολογισμό κόστους.
-                    total_cost_base += shipped_qty * unit_price
-                    shipped.append(
-                        {
-                            "product_id": product_id,
-                            "temaxia_zitisis": shipped_qty,
-                        }
-                    )
-                if remaining > 0:
-                    all_fulfilled = False
+            # 3. Κλειδώνουμε με ένα SELECT ... FOR UPDATE όλες τις θέσεις των προϊόντων της παραγγελίας,
+            #    σχεδιάζουμε το picking στη μνήμη και γράφουμε τις αλλαγές μαζικά.
+            product_ids = [item["product_id"] for item in items]
+            locations = WarehouseRepository._lock_product_locations(cur, product_ids)
+            # Η παραγγελία παίρνει τη δική της δέσμευση και ό,τι δεν έχει δεσμευτεί για άλλες.
+            reserved_by_order, free = WarehouseRepository._lock_reservations(cur, [order_id], product_ids)
+            limits = picking.reservation_limits(reserved_by_order.get(order_id, {}), free)
+            touched = {}
+            shipped, total_cost_base, all_fulfilled = picking.plan_order(items, locations, touched, limits)
 
             if not shipped:
                 return False, "Δεν υπάρχει διαθέσιμο απόθεμα για αποστολή."
+            WarehouseRepository._apply_stock_changes(
+                cur, touched, {item["product_id"]: -item["temaxia_zitisis"] for item in shipped}
+            )
+            InventoryRepository.release_reservations(cur, [order_id])
 
             # Κατάσταση αποστολής ανάλογα με το αν ικανοποιήθηκε πλήρως η ζήτηση.
             shipment_status = "ΟΛΟΚΛΗΡΩΜΕΝΗ" if all_fulfilled else "ΜΕΡΙΚΗ"
@@ -481,12 +656,120 @@ class WarehouseRepository:
             WarehouseRepository._create_shipment(cur, order_id, total_cost, shipment_status, shipped)
             shipped_status = ORDER_STATUS_TO_DB.get("Απεστάλη", "ΑΠΕΣΤΑΛΕΙ")
             cur.execute(SQL.UPDATE_ORDER_STATUS, (shipped_status, order_id))
-        return True, "Η παραγγελία αποστάλθηκε."
+            return True, "Η παραγγελία αποστάλθηκε."
+
+        # Σε deadlock με άλλη αποστολή ξανατρέχει ολόκληρη· ο έλεγχος "υπάρχει ήδη αποστολή" είναι μέσα στη συναλλαγή.
+        return Database.run_transaction(work, dictionary=True, name="send_order")
+
+    @staticmethod
+    def send_orders(order_ids, policy=picking.WAVE_POLICY_OLDEST):
+        """Αποστέλλει πολλές παραγγελίες σε μία συναλλαγή (wave) και επιστρέφει αποτέλεσμα ανά παραγγελία.
+
+        Το απόθεμα κλειδώνεται μία φορά για όλα τα προϊόντα και μοιράζεται στις παραγγελίες με τη σειρά
+        της πολιτικής `policy` (βλ. picking.order_wave). Το αποτέλεσμα είναι λεξικό
+        order_id -> (success, message) με τα ίδια μηνύματα που δίνει το send_order.
+        """
+        order_ids = sorted({int(order_id) for order_id in order_ids or []})
+        if not order_ids:
+            return {}
+
+        def work(cur):
+            results = {}
+            # 1. Κεφαλίδες και γραμμές όλων των παραγγελιών με δύο αναγνώσεις.
+            cur.execute(*bucketed_in_clause(SQL.ORDERS_FOR_WAVE, order_ids))
+            orders = {row["order_id"]: row for row in cur.fetchall()}
+            cur.execute(*bucketed_in_clause(SQL.ORDER_ITEMS_FOR_WAVE, order_ids))
+            items_by_order = defaultdict(list)
+            for row in cur.fetchall():
+                items_by_order[row["order_id"]].append(row)
+
+            candidates = []
+            for order_id in order_ids:
+                order_row = orders.get(order_id)
+                if not order_row:
+                    results[order_id] = (False, "Η παραγγελία δεν βρέθηκε.")
+                elif order_row["has_shipment"]:
+                    results[order_id] = (False, "Υπάρχει ήδη αποστολή για την παραγγελία.")
+                elif not items_by_order.get(order_id):
+                    results[order_id] = (False, "Δεν μπορείτε να αποστείλετε παραγγελία χωρίς προϊόντα.")
+                else:
+                    candidates.append(order_row)
+            if not candidates:
+                return results
+
+            # 2. Ένα κλείδωμα για όλες τις θέσεις και κατανομή στη μνήμη με σειρά προτεραιότητας.
+            product_ids = [item["product_id"] for order in candidates for item in items_by_order[order["order_id"]]]
+            locations = WarehouseRepository._lock_product_locations(cur, product_ids)
+            reserved_by_order, free = WarehouseRepository._lock_reservations(
+                cur, [order["order_id"] for order in candidates], product_ids
+            )
+            touched = {}
+            planned = []
+            for order_row in picking.order_wave(candidates, policy):
+                order_id = order_row["order_id"]
+                reserved = reserved_by_order.get(order_id, {})
+                shipped, total_cost_base, all_fulfilled = picking.plan_order(
+                    items_by_order[order_id], locations, touched, picking.reservation_limits(reserved, free)
+                )
+                picking.consume_free(shipped, reserved, free)
+                if not shipped:
+                    results[order_id] = (False, "Δεν υπάρχει διαθέσιμο απόθεμα για αποστολή.")
+                    continue
+                discount_percent = float(order_row.get("ekptosi") or 0)
+                total_cost = max(0.0, total_cost_base * (1 - discount_percent / 100))
+                shipment_status = "ΟΛΟΚΛΗΡΩΜΕΝΗ" if all_fulfilled else "ΜΕΡΙΚΗ"
+                planned.append((order_id, total_cost, shipment_status, shipped))
+            if not planned:
+                return results
+
+            # 3. Μαζική εγγραφή: απόθεμα, κεφαλίδες αποστολών, γραμμές αποστολών και κατάσταση παραγγελιών.
+            deltas = defaultdict(int)
+            for _, _, _, shipped in planned:
+                for item in shipped:
+                    deltas[item["product_id"]] -= item["temaxia_zitisis"]
+            WarehouseRepository._apply_stock_changes(cur, touched, deltas)
+            InventoryRepository.release_reservations(cur, [order_id for order_id, _, _, _ in planned])
+            shipped_at = datetime.now()
+            cur.executemany(
+                SQL.INSERT_SHIPMENT,
+                [
+                    (random.randint(100, 999), status, shipped_at, total_cost, order_id)
+                    for order_id, total_cost, status, _ in planned
+                ],
+            )
+            shipped_ids = [order_id for order_id, _, _, _ in planned]
+            cur.execute(*bucketed_in_clause(SQL.SHIPMENT_IDS_BY_ORDERS, shipped_ids))
+            shipment_by_order = {row["order_id"]: row["shipment_id"] for row in cur.fetchall()}
+            cur.executemany(
+                SQL.INSERT_SHIPMENT_ITEM,
+                [
+                    (shipment_by_order[order_id], item["product_id"], item["temaxia_zitisis"])
+                    for order_id, _, _, shipped in planned
+                    for item in shipped
+                ],
+            )
+            cur.executemany(
+                SQL.SET_LATEST_SHIPMENT,
+                [
+                    (shipment_by_order[order_id], shipped_at, status, order_id, shipped_at)
+                    for order_id, _, status, _ in planned
+                ],
+            )
+            shipped_status = ORDER_STATUS_TO_DB.get("Απεστάλη", "ΑΠΕΣΤΑΛΕΙ")
+            cur.execute(
+                with_in_clause(SQL.UPDATE_ORDERS_STATUS, shipped_ids),
+                [shipped_status] + shipped_ids,
+            )
+            for order_id in shipped_ids:
+                results[order_id] = (True, "Η παραγγελία αποστάλθηκε.")
+            return results
+
+        return Database.run_transaction(work, dictionary=True, name="send_orders")
 
     @staticmethod
     def fetch_supplier_products():
-        """Επιστρέφει λίστα προϊόντων όπως θα εμφανιστεί στην προμήθεια αποθήκης."""
-        return Database.fetch_all(SQL.SUPPLIER_PRODUCTS)
+        """Επιστρέφει λίστα προϊόντων όπως θα εμφανιστεί στην προμήθεια αποθήκης (κοινή cache με τα φαρμακεία)."""
+        return ProductCatalog.products()
 
     @staticmethod
     def create_supplier_order(items):
@@ -494,7 +777,8 @@ class WarehouseRepository:
         if not items:
             return False, "Δεν προστέθηκαν προϊόντα."
 
-        prepared = []
+        # Ίδιο προϊόν σε πολλές γραμμές: μία γραμμή backorder ανά (προμηθευτής, προϊόν).
+        quantities = defaultdict(int)
         for product_id, quantity, unit_price in items:
             try:
                 product_id = int(product_id)
@@ -504,58 +788,63 @@ class WarehouseRepository:
                 continue
             if quantity <= 0 or unit_price <= 0:
                 continue
-            prepared.append(
-                {
-                    "product_id": product_id,
-                    "quantity": quantity,
-                    "unit_price": unit_price,
-                }
-            )
-        if not prepared:
+            quantities[product_id] += quantity
+        if not quantities:
             return False, "Δεν προστέθηκαν προϊόντα."
 
+        suppliers = WarehouseRepository._current_suppliers(datetime.now().date())
+        auto_supplier = Database.fetch_one(
+            SQL.AUTO_SUPPLIER_ID,
+            (WarehouseRepository.AUTO_SUPPLIER_NAME, WarehouseRepository.AUTO_SUPPLIER_DEFAULT_PHONE),
+        )
+
+        def work(cur):
+            supplier_storage_id = WarehouseRepository._ensure_supplier_storage(cur)
+            cur.execute(
+                SQL.INSERT_BACKORDER,
+                (supplier_storage_id, 0, datetime.utcnow().date()),
+            )
+            backorder_id = cur.lastrowid
+            auto_supplier_id = auto_supplier["supplier_id"] if auto_supplier else None
+            rows = []
+            for product_id, quantity in sorted(quantities.items()):
+                supplier_id = suppliers.get(product_id)
+                if supplier_id is None:
+                    # Χωρίς ενεργή συνεργασία: ο κοινός placeholder προμηθευτής (δημιουργείται μία φορά).
+                    if auto_supplier_id is None:
+                        auto_supplier_id = WarehouseRepository._ensure_auto_supplier(cur)
+                    supplier_id = auto_supplier_id
+                rows.append((supplier_id, product_id, backorder_id, quantity))
+            cur.executemany(SQL.INSERT_SUPPLIER_BACKORDER_ITEM, rows)
+            return backorder_id
+
         try:
-            with Database.transaction(dictionary=True) as cur:
-                supplier_storage_id = WarehouseRepository._ensure_supplier_storage(cur)
-                cur.execute(
-                    SQL.INSERT_BACKORDER,
-                    (supplier_storage_id, 0, datetime.utcnow().date()),
-                )
-                backorder_id = cur.lastrowid
-                for item in prepared:
-                    supplier_id = WarehouseRepository._create_auto_supplier(cur)
-                    cur.execute(
-                        SQL.INSERT_SUPPLIER_BACKORDER_ITEM,
-                        (supplier_id, item["product_id"], backorder_id, item["quantity"]),
-                    )
+            backorder_id = Database.run_transaction(work, dictionary=True, name="create_supplier_order")
             return True, backorder_id
         except mysql.connector.Error as exc:
             return False, f"Σφάλμα βάσης: {exc.msg}"
 
     @staticmethod
-    def fetch_supplier_orders(status_filter=None):
-        """Φορτώνει παραγγελίες προμηθευτών από τα BACKORDER entries με ειδική storage_id."""
+    def fetch_supplier_orders(status_filter=None, cursor=None, limit=ORDER_PAGE_SIZE):
+        """Φέρνει μία σελίδα παραγγελιών προμηθευτών (με σύνολο, χωρίς γραμμές) και τον cursor της επόμενης.
+
+        Φίλτρο, ταξινόμηση, σελιδοποίηση και αθροίσματα γίνονται στη βάση· τα προϊόντα κάθε παραγγελίας
+        φορτώνονται με fetch_supplier_order_items όταν χρειαστούν. Ο cursor είναι το τελευταίο backorder_id.
+        """
         storage_id = WarehouseRepository._get_supplier_storage_id()
         if not storage_id:
-            return []
-        rows = Database.fetch_all(SQL.SUPPLIER_BACKORDERS, (storage_id,))
-        if not rows:
-            return []
-
+            return [], None
+        after_id = cursor if cursor is not None else FIRST_PAGE_CURSOR[1]
         normalized = (status_filter or "Όλες").strip()
         status_lookup = {"Σε εξέλιξη": 0, "Ολοκληρώθηκε": 1}
         target = status_lookup.get(normalized)
-        filtered = [row for row in rows if target is None or row["oloklirothike"] == target]
-        if not filtered:
-            return []
-
-        order_ids = [row["backorder_id"] for row in filtered]
-        items_map = WarehouseRepository._fetch_supplier_items(order_ids)
+        if target is None:
+            rows = Database.fetch_all(SQL.SUPPLIER_ORDERS_PAGE, (storage_id, after_id, limit))
+        else:
+            rows = Database.fetch_all(SQL.SUPPLIER_ORDERS_PAGE_BY_STATUS, (storage_id, target, after_id, limit))
 
         orders = []
-        for row in filtered:
-            order_items = items_map.get(row["backorder_id"], [])
-            total_cost = sum(item["quantity"] * item["unit_price"] for item in order_items)
+        for row in rows:
             created_at = row.get("hm_apostolis")
             if created_at and not isinstance(created_at, datetime):
                 created_at = datetime.combine(created_at, datetime.min.time())
@@ -563,12 +852,17 @@ class WarehouseRepository:
                 {
                     "supplier_order_id": row["backorder_id"],
                     "created_at": created_at,
-                    "total_cost": total_cost,
+                    "total_cost": float(row["total_cost"] or 0),
                     "status": "Ολοκληρώθηκε" if row["oloklirothike"] else "Σε εξέλιξη",
-                    "items": order_items,
                 }
             )
-        return orders
+        next_cursor = orders[-1]["supplier_order_id"] if len(orders) >= limit else None
+        return orders, next_cursor
+
+    @staticmethod
+    def fetch_supplier_order_items(order_id):
+        """Φέρνει τα προϊόντα μίας παραγγελίας προμηθευτή όταν ανοίξει/επιλεγεί στην οθόνη."""
+        return WarehouseRepository._fetch_supplier_items([order_id]).get(order_id, [])
 
     @staticmethod
     def mark_supplier_order_complete(order_id):
@@ -587,26 +881,25 @@ class WarehouseRepository:
         if not items:
             return False, "Δεν βρέθηκαν προϊόντα για την παραγγελία."
 
-        with Database.transaction(dictionary=True) as cur:
-            storage_ids = set()
-            for item in items:
-                # Για κάθε προϊόν της παραλαβής βρίσκουμε σε ποια θέση θα τοποθετηθεί.
-                storage_id = WarehouseRepository._assign_product_to_position(
-                    cur, item["product_id"], item["quantity"]
-                )
-                if storage_id:
-                    storage_ids.add(storage_id)
+        def work(cur):
+            # Ξανακοιτάμε την κατάσταση με κλείδωμα: δύο ταυτόχρονες παραλαβές (ή μια επανάληψη μετά
+            # από deadlock) δεν πρέπει να βάλουν δύο φορές το ίδιο απόθεμα.
+            cur.execute(SQL.SUPPLIER_BACKORDER_LOCK, (order_id,))
+            locked = cur.fetchone()
+            if not locked or locked["oloklirothike"]:
+                return False, "Η παραγγελία έχει ήδη ολοκληρωθεί."
 
+            storage_ids = WarehouseRepository._put_away(cur, items)
             executed_at = datetime.now()
-            for storage_id in storage_ids:
-                # Από τη στιγμή που γεμίσαμε μια θέση, ενημερώνουμε τα backorders.
-                WarehouseRepository._record_backorder(cur, storage_id, executed_at)
+            # Από τη στιγμή που γεμίσαμε θέσεις, ενημερώνουμε τα backorders των αποθηκών τους.
+            WarehouseRepository._record_backorders(cur, storage_ids, executed_at)
             cur.execute(
                 SQL.UPDATE_BACKORDER_STATUS,
                 (1, executed_at.date(), order_id),
             )
+            return True, "Η παραγγελία ολοκληρώθηκε."
 
-        return True, "Η παραγγελία ολοκληρώθηκε."
+        return Database.run_transaction(work, dictionary=True, name="mark_supplier_order_complete")
 
     @staticmethod
     def _order_has_shipment(cur, order_id):
@@ -621,6 +914,37 @@ class WarehouseRepository:
         rows = cur.fetchall()
         return rows or []
 
+    @staticmethod
+    def _lock_product_locations(cur, product_ids):
+        """Φορτώνει και κλειδώνει όλες τις θέσεις των προϊόντων, ομαδοποιημένες ανά product_id."""
+        product_ids = sorted(set(product_ids))
+        if not product_ids:
+            return {}
+        cur.execute(*bucketed_in_clause(SQL.PRODUCT_LOCATIONS_FOR_UPDATE, product_ids))
+        return picking.group_locations(cur.fetchall())
+
+    @staticmethod
+    def _lock_reservations(cur, order_ids, product_ids):
+        """Δεσμεύσεις των παραγγελιών (order_id -> product_id -> τεμάχια) και κλειδωμένο αδέσμευτο απόθεμα."""
+        reserved_by_order = defaultdict(dict)
+        cur.execute(*bucketed_in_clause(SQL.ORDER_RESERVATIONS, sorted(set(order_ids))))
+        for row in cur.fetchall():
+            reserved_by_order[row["order_id"]][row["product_id"]] = int(row["temaxia"])
+        return reserved_by_order, InventoryRepository.lock_free_stock(cur, product_ids)
+
+    @staticmethod
+    def _apply_stock_changes(cur, touched, deltas):
+        """Γράφει τα αποτελέσματα του picking: μία εντολή για τα νέα qty, μία για τις άδειες θέσεις
+        και μία για τα συνολικά αποθέματα (deltas: product_id -> μεταβολή τεμαχίων)."""
+        updates, deletes = picking.split_stock_changes(touched)
+        if updates:
+            cur.executemany(SQL.BULK_SET_STOCK, updates)
+        if deletes:
+            params = [value for key in deletes for value in key]
+            cur.execute(with_row_in_clause(SQL.BULK_DELETE_STOCK, deletes), params)
+            WarehouseRepository._release_positions(cur, deletes)
+        InventoryRepository.adjust_stock_totals(cur, deltas)
+
     @staticmethod
     def _calculate_shipment_status(items, available_map):
         """Υπολογίζει αν η αποστολή θα είναι μερική ή πλήρης με βάση το διαθέσιμο."""
@@ -637,20 +961,24 @@ class WarehouseRepository:
     def _create_shipment(cur, order_id, total_cost, shipment_status, items):
         """Καταγράφει νέα αποστολή και τις αντίστοιχες γραμμές σε μια συναλλαγή."""
         status_db = shipment_status.upper() if isinstance(shipment_status, str) else shipment_status
+        shipped_at = datetime.now()
         cur.execute(
             SQL.INSERT_SHIPMENT,
-            (random.randint(100, 999), status_db, datetime.now(), total_cost, order_id),
+            (random.randint(100, 999), status_db, shipped_at, total_cost, order_id),
         )
         shipment_id = cur.lastrowid
         item_rows = [
             (shipment_id, item["product_id"], item["temaxia_zitisis"]) for item in items
         ]
         cur.executemany(SQL.INSERT_SHIPMENT_ITEM, item_rows)
+        cur.execute(SQL.SET_LATEST_SHIPMENT, (shipment_id, shipped_at, status_db, order_id, shipped_at))
         return shipment_id
 
     @staticmethod
     def _get_supplier_storage_id():
-        row = Database.fetch_one(SQL.SUPPLIER_STORAGE_BY_LABEL, (WarehouseRepository.SUPPLIER_STORAGE_LABEL,))
+        row = Database.fetch_one(
+            SQL.SUPPLIER_STORAGE_BY_LABEL, (WarehouseRepository.SUPPLIER_STORAGE_LABEL,), cache=True
+        )
         return row["storage_id"] if row else None
 
     @staticmethod
@@ -665,18 +993,50 @@ class WarehouseRepository:
         return storage_id
 
     @staticmethod
-    def _create_auto_supplier(cur):
-        """Δημιουργεί εγγραφή προμηθευτή placeholder με προκαθορισμένο τηλέφωνο."""
-        cur.execute(SQL.INSERT_SUPPLIER, (WarehouseRepository.AUTO_SUPPLIER_NAME, WarehouseRepository.AUTO_SUPPLIER_DEFAULT_PHONE))
+    def _current_suppliers(today):
+        """product_id -> ενεργός προμηθευτής (PROMITHEYTIS_PROMITHEYEI_PROION) την ημερομηνία `today`.
+
+        Όλος ο πίνακας διαβάζεται με ένα query (αντί για ένα ανά προϊόν της παραγγελίας).
+        """
+        rows = Database.fetch_all(SQL.CURRENT_PRODUCT_SUPPLIERS, (today, today), compact=True)
+        return {row["product_id"]: row["supplier_id"] for row in rows}
+
+    @staticmethod
+    def _ensure_auto_supplier(cur):
+        """Βρίσκει (ή δημιουργεί μία φορά) τον κοινό placeholder προμηθευτή με προκαθορισμένο τηλέφωνο."""
+        key = (WarehouseRepository.AUTO_SUPPLIER_NAME, WarehouseRepository.AUTO_SUPPLIER_DEFAULT_PHONE)
+        cur.execute(SQL.AUTO_SUPPLIER_ID_LOCK, key)
+        row = cur.fetchone()
+        if row:
+            return row["supplier_id"]
+        cur.execute(SQL.INSERT_SUPPLIER, key)
         return cur.lastrowid
 
+    @staticmethod
+    def compact_auto_suppliers():
+        """Συγχωνεύει τους διπλούς placeholder προμηθευτές στον παλαιότερο (μία φορά μετά τη μετάβαση).
+
+        Οι γραμμές backorder μεταφέρονται στο κρατούμενο supplier_id (αθροίζοντας όσες συμπίπτουν) και οι
+        υπόλοιπες εγγραφές PROMITHEYTIS σβήνονται. Επιστρέφει πόσοι προμηθευτές αφαιρέθηκαν.
+        """
+        key = (WarehouseRepository.AUTO_SUPPLIER_NAME, WarehouseRepository.AUTO_SUPPLIER_DEFAULT_PHONE)
+        with Database.transaction(dictionary=True) as cur:
+            cur.execute(SQL.AUTO_SUPPLIER_ID_LOCK, key)
+            row = cur.fetchone()
+            if not row:
+                return 0
+            params = (row["supplier_id"],) + key
+            cur.execute(SQL.MERGE_SUPPLIER_BACKORDER_ITEMS, params)
+            cur.execute(SQL.DELETE_MERGED_SUPPLIER_ITEMS, params)
+            cur.execute(SQL.DELETE_MERGED_SUPPLIERS, params)
+            return cur.rowcount
+
     @staticmethod
     def _fetch_supplier_items(order_ids):
         """Φέρνει τα προϊόντα των προμηθευτικών παραγγελιών από τις γέφυρες backorder/supplier."""
         if not order_ids:
             return {}
-        query = with_in_clause(SQL.SUPPLIER_BACKORDER_ITEMS, order_ids)
-        rows = Database.fetch_all(query, order_ids)
+        rows = Database.fetch_in(SQL.SUPPLIER_BACKORDER_ITEMS, order_ids)
         grouped = defaultdict(list)
         for row in rows:
             quantity = max(1, int(row.get("quantity") or 0))
@@ -691,50 +1051,70 @@ class WarehouseRepository:
         return grouped
 
     @staticmethod
-    def _assign_product_to_position(cur, product_id, quantity):
-        """Τοποθετεί την παραλαβή σε υπάρχουσα θέση ή δημιουργεί νέα θέση αποθήκης."""
-        if quantity <= 0:
-            return None
+    def _put_away(cur, items):
+        """Τοποθετεί όλη την παραλαβή με λίγες εντολές και επιστρέφει τις αποθήκες που γέμισαν.
 
-        # Προσπαθούμε πρώτα να ενισχύσουμε την «καλύτερη» θέση του προϊόντος (περισσότερο στοκ).
-        cur.execute(SQL.BEST_PRODUCT_POSITION, (product_id,))
-        best_slot = cur.fetchone()
-        if best_slot:
-            # Ενημερώνουμε την υπάρχουσα θέση με προσθετική ενημέρωση qty_in_stock.
-            cur.execute(
-                SQL.UPDATE_POSITION_STOCK,
-                (
-                    quantity,
-                    product_id,
-                    best_slot["storage_id"],
-                    best_slot["ar_diadromou"],
-                    best_slot["ar_rafiou"],
-                ),
-            )
-            return best_slot["storage_id"]
-
-        # Αν δεν υπάρχει καμία θέση για το προϊόν, βρίσκουμε ή δημιουργούμε νέα κενή τοποθεσία.
-        slot = WarehouseRepository._ensure_empty_position(cur)
-        cur.execute(
-            SQL.INSERT_POSITION_STOCK,
-            (
-                product_id,
-                slot["storage_id"],
-                slot["ar_diadromou"],
-                slot["ar_rafiou"],
-                quantity,
-            ),
-        )
-        return slot["storage_id"]
+        Κάθε προϊόν πηγαίνει στην πλουσιότερη υπάρχουσα θέση του (ένα windowed query για όλα), ενώ όσα
+        δεν έχουν θέση παίρνουν μαζί κενές θέσεις από τη free-list. Οι αυξήσεις γράφονται με ένα upsert.
+        """
+        quantities = defaultdict(int)
+        for item in items:
+            if item["quantity"] > 0:
+                quantities[item["product_id"]] += item["quantity"]
+        if not quantities:
+            return set()
+
+        product_ids = sorted(quantities)
+        cur.execute(*bucketed_in_clause(SQL.BEST_PRODUCT_POSITIONS, product_ids))
+        slots = {
+            row["product_id"]: (row["storage_id"], row["ar_diadromou"], row["ar_rafiou"])
+            for row in cur.fetchall()
+        }
+        # Προϊόντα χωρίς καμία θέση: μία κλήση στη free-list για όλα (ή νέος διάδρομος αν δεν φτάνει).
+        missing = [product_id for product_id in product_ids if product_id not in slots]
+        if missing:
+            free = WarehouseRepository._allocate_positions(cur, len(missing))
+            for product_id, slot in zip(missing, free):
+                slots[product_id] = (slot["storage_id"], slot["ar_diadromou"], slot["ar_rafiou"])
+
+        rows = sorted((product_id,) + slots[product_id] + (quantities[product_id],) for product_id in product_ids)
+        cur.executemany(SQL.PUTAWAY_STOCK, rows)
+        # Μια θέση που άδειασε από παράλληλη αποστολή μετά το windowed query ξαναγεμίζει από το upsert·
+        # τη βγάζουμε από τη free-list ώστε να μη δοθεί και σε άλλη SKU.
+        keys = sorted({row[1:4] for row in rows})
+        cur.execute(with_row_in_clause(SQL.DELETE_FREE_POSITIONS, keys), [value for key in keys for value in key])
+        InventoryRepository.adjust_stock_totals(cur, quantities)
+        return {key[0] for key in keys}
 
     @staticmethod
-    def _ensure_empty_position(cur):
-        """Βρίσκει κενή θέση αποθήκης ή δημιουργεί καινούρια όταν δεν υπάρχουν."""
-        cur.execute(SQL.AVAILABLE_POSITIONS)
-        slot = cur.fetchone()
-        if slot:
-            return slot
+    def _allocate_positions(cur, count):
+        """Παίρνει `count` κενές θέσεις από τη free-list και τις αφαιρεί από αυτήν.
+
+        Αν δεν φτάνουν, δημιουργεί νέο διάδρομο με SHELVES_PER_NEW_AISLE ράφια (ή όσα χρειάζονται) και
+        τα ράφια που περισσεύουν μπαίνουν στη free-list για τις επόμενες παραλαβές.
+        """
+        cur.execute(SQL.TAKE_FREE_POSITIONS, (count,))
+        slots = cur.fetchall() or []
+        if slots:
+            keys = [(slot["storage_id"], slot["ar_diadromou"], slot["ar_rafiou"]) for slot in slots]
+            params = [value for key in keys for value in key]
+            cur.execute(with_row_in_clause(SQL.DELETE_FREE_POSITIONS, keys), params)
+        missing = count - len(slots)
+        if missing > 0:
+            created = WarehouseRepository._create_aisle(
+                cur, max(missing, WarehouseRepository.SHELVES_PER_NEW_AISLE)
+            )
+            slots.extend(created[:missing])
+            spare = [
+                (slot["storage_id"], slot["ar_diadromou"], slot["ar_rafiou"]) for slot in created[missing:]
+            ]
+            if spare:
+                cur.executemany(SQL.INSERT_FREE_POSITION, spare)
+        return slots
 
+    @staticmethod
+    def _create_aisle(cur, shelves):
+        """Δημιουργεί νέα αποθήκη με έναν διάδρομο `shelves` ραφιών και επιστρέφει τις θέσεις του."""
         cur.execute(SQL.NEXT_STORAGE_ID)
         storage_id = cur.fetchone()["next_id"]
         # Δημιουργούμε νέα εγγραφή αποθήκης ώστε να φιλοξενήσει τις μελλοντικές θέσεις.
@@ -742,26 +1122,47 @@ class WarehouseRepository:
 
         cur.execute(SQL.NEXT_AISLE)
         aisle = cur.fetchone()["next_aisle"]
-        shelf = 1
-        # Προσθέτουμε καινούριο διάδρομο/ράφι και τον αντιστοιχούμε στην αποθήκη.
-        cur.execute(SQL.INSERT_THESI, (aisle, shelf))
-        cur.execute(SQL.INSERT_THESI_BRISKETAI, (storage_id, aisle, shelf))
-        return {"storage_id": storage_id, "ar_diadromou": aisle, "ar_rafiou": shelf}
+        # Όλα τα ράφια του διαδρόμου με δύο multi-row INSERT αντί για ένα ζεύγος εντολών ανά θέση.
+        cur.executemany(SQL.INSERT_THESI, [(aisle, shelf) for shelf in range(1, shelves + 1)])
+        cur.executemany(
+            SQL.INSERT_THESI_BRISKETAI, [(storage_id, aisle, shelf) for shelf in range(1, shelves + 1)]
+        )
+        return [
+            {"storage_id": storage_id, "ar_diadromou": aisle, "ar_rafiou": shelf}
+            for shelf in range(1, shelves + 1)
+        ]
 
     @staticmethod
-    def _record_backorder(cur, storage_id, executed_at):
-        """Καταγράφει στο BACKORDER ότι η συγκεκριμένη αποθήκη εξυπηρετήθηκε την ημερομηνία παραλαβής."""
-        if not storage_id:
+    def _release_positions(cur, keys):
+        """Επιστρέφει στη free-list όσες θέσεις (storage_id, διάδρομος, ράφι) έμειναν χωρίς κανένα προϊόν."""
+        keys = sorted({key[-3:] for key in keys})
+        if not keys:
             return
+        params = [value for key in keys for value in key]
+        cur.execute(with_row_in_clause(SQL.RELEASE_FREE_POSITIONS, keys), params)
+
+    @staticmethod
+    def check_free_positions(repair=False):
+        """Συγκρίνει τη free-list με τις πιασμένες θέσεις και, αν ζητηθεί, την ξαναχτίζει.
+
+        Επιστρέφει τις θέσεις που διαφωνούσαν (listed/occupied) πριν την επισκευή.
+        """
+        with Database.transaction(dictionary=True) as cur:
+            cur.execute(SQL.FREE_POSITIONS_DRIFT)
+            drift = cur.fetchall() or []
+            if drift and repair:
+                cur.execute(SQL.CLEAR_FREE_POSITIONS)
+                cur.execute(SQL.BACKFILL_FREE_POSITIONS)
+        return drift
+
+    @staticmethod
+    def _record_backorders(cur, storage_ids, executed_at):
+        """Καταγράφει στο BACKORDER ότι οι αποθήκες εξυπηρετήθηκαν την ημερομηνία παραλαβής (ένα multi-row INSERT)."""
         # Το hm_apostolis αναμένει ημερομηνία, οπότε χρησιμοποιούμε date() αν το input είναι datetime.
-        cur.execute(
-            SQL.INSERT_BACKORDER,
-            (
-                storage_id,
-                1,
-                (executed_at.date() if hasattr(executed_at, "date") else executed_at),
-            ),
-        )
+        served_on = executed_at.date() if hasattr(executed_at, "date") else executed_at
+        rows = [(storage_id, 1, served_on) for storage_id in sorted(storage_ids) if storage_id]
+        if rows:
+            cur.executemany(SQL.INSERT_BACKORDER, rows)
 
 
 __all__ = [
@@ -0,0 +1,128 @@
+"""Σχεδιασμός picking στη μνήμη: κατανομή ζητούμενων ποσοτήτων στις θέσεις αποθήκης.
+
+Οι συναρτήσεις εδώ δεν αγγίζουν τη βάση. Το repository φορτώνει (και κλειδώνει) όλες τις θέσεις
+των προϊόντων με ένα SELECT, ο planner αποφασίζει τι θα αφαιρεθεί από κάθε θέση και στο τέλος
+οι αλλαγές γράφονται μαζικά.
+"""
+
+from collections import defaultdict
+
+
+def group_locations(rows):
+    """Ομαδοποιεί τις θέσεις ανά product_id κρατώντας τη σειρά storage/διάδρομος/ράφι του query."""
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row["product_id"]].append(
+            {
+                "storage_id": row["storage_id"],
+                "ar_diadromou": row["ar_diadromou"],
+                "ar_rafiou": row["ar_rafiou"],
+                "qty_in_stock": int(row["qty_in_stock"] or 0),
+            }
+        )
+    return grouped
+
+
+def allocate(product_id, requested, locations, touched):
+    """Εξαντλεί σειριακά τις θέσεις ενός προϊόντος και επιστρέφει πόσα τεμάχια πάρθηκαν.
+
+    Το `locations` μεταβάλλεται επιτόπου ώστε διαδοχικές κλήσεις (π.χ. πολλές παραγγελίες στο ίδιο
+    wave) να βλέπουν το υπόλοιπο απόθεμα. Το `touched` κρατά το νέο qty κάθε θέσης που άλλαξε.
+    """
+    remaining = requested
+    taken = 0
+    for loc in locations:
+        if remaining <= 0:
+            break
+        available = loc["qty_in_stock"]
+        if available <= 0:
+            continue
+        take = min(available, remaining)
+        loc["qty_in_stock"] = available - take
+        key = (product_id, loc["storage_id"], loc["ar_diadromou"], loc["ar_rafiou"])
+        touched[key] = loc["qty_in_stock"]
+        taken += take
+        remaining -= take
+    return taken
+
+
+def plan_order(items, locations_by_product, touched, limits=None):
+    """Υπολογίζει τις γραμμές αποστολής μιας παραγγελίας χωρίς να εκτελέσει εντολές στη βάση.
+
+    Με `limits` (product_id -> μέγιστα τεμάχια, βλ. reservation_limits) η παραγγελία δεν παίρνει απόθεμα
+    που έχει δεσμευτεί για άλλες. Επιστρέφει (shipped, total_cost_base, all_fulfilled) με την ίδια
+    μορφή που περιμένει το `WarehouseRepository._create_shipment`.
+    """
+    shipped = []
+    total_cost_base = 0
+    all_fulfilled = True
+    for item in items:
+        product_id = item["product_id"]
+        requested = int(item["temaxia_zitisis"])
+        unit_price = float(item["arx_kostos_temaxiou"])
+        wanted = requested if limits is None else min(requested, max(0, limits.get(product_id, 0)))
+        shipped_qty = allocate(product_id, wanted, locations_by_product.get(product_id, []), touched)
+        if shipped_qty > 0:
+            total_cost_base += shipped_qty * unit_price
+            shipped.append({"product_id": product_id, "temaxia_zitisis": shipped_qty})
+        if shipped_qty < requested:
+            all_fulfilled = False
+    return shipped, total_cost_base, all_fulfilled
+
+
+def reservation_limits(reserved, free):
+    """Μέγιστα τεμάχια ανά προϊόν για μια παραγγελία: η δική της δέσμευση + το αδέσμευτο απόθεμα."""
+    limits = {product_id: max(0, int(qty)) for product_id, qty in free.items()}
+    for product_id, qty in reserved.items():
+        limits[product_id] = limits.get(product_id, 0) + int(qty)
+    return limits
+
+
+def consume_free(shipped, reserved, free):
+    """Αφαιρεί από το κοινό αδέσμευτο απόθεμα ό,τι πήρε η παραγγελία πέρα από τη δέσμευσή της (για wave)."""
+    for item in shipped:
+        product_id = item["product_id"]
+        extra = item["temaxia_zitisis"] - reserved.get(product_id, 0)
+        if extra > 0:
+            free[product_id] = free.get(product_id, 0) - extra
+
+
+def split_stock_changes(touched):
+    """Χωρίζει τις αλλαγμένες θέσεις σε ενημερώσεις qty και σε θέσεις που άδειασαν.
+
+    Επιστρέφει (updates, deletes): τα updates είναι tuples (product_id, storage_id, διάδρομος, ράφι, qty)
+    και τα deletes tuples (product_id, storage_id, διάδρομος, ράφι), ταξινομημένα με τη σειρά του PK.
+    """
+    updates = []
+    deletes = []
+    for key in sorted(touched):
+        new_qty = touched[key]
+        if new_qty > 0:
+            updates.append(key + (new_qty,))
+        else:
+            deletes.append(key)
+    return updates, deletes
+
+
+# Πολιτικές προτεραιότητας για την αποστολή πολλών παραγγελιών μαζί (wave).
+WAVE_POLICY_OLDEST = "oldest"
+WAVE_POLICY_CONTRACT = "contract"
+WAVE_POLICIES = (WAVE_POLICY_OLDEST, WAVE_POLICY_CONTRACT)
+
+
+def order_wave(orders, policy=WAVE_POLICY_OLDEST):
+    """Ταξινομεί τις παραγγελίες ενός wave με τη σειρά που θα διεκδικήσουν το απόθεμα.
+
+    `oldest`: η παλαιότερη hm_ora_ektelesis πρώτη. `contract`: πρώτα η μεγαλύτερη βαθμίδα συμβολαίου
+    (η έκπτωση `ekptosi` που κλείδωσε η παραγγελία), και μέσα στη βαθμίδα η παλαιότερη.
+    """
+    if policy not in WAVE_POLICIES:
+        raise ValueError(f"Unknown wave policy: {policy}")
+
+    def _age_key(order):
+        executed_at = order.get("hm_ora_ektelesis")
+        return (executed_at is None, executed_at or 0, order["order_id"])
+
+    if policy == WAVE_POLICY_CONTRACT:
+        return sorted(orders, key=lambda order: (-float(order.get("ekptosi") or 0),) + _age_key(order))
+    return sorted(orders, key=_age_key)
@@ -0,0 +1,193 @@
+"""Φραγμένο connection pool για MySQL με ουρά αναμονής.
+
+Σε αντίθεση με το MySQLConnectionPool του connector, όταν όλες οι συνδέσεις είναι δανεισμένες ο
+καλών περιμένει (μέχρι `timeout`) να επιστραφεί κάποια, αντί να αποτύχει αμέσως. Πάνω από το
+`size` επιτρέπονται έως `max_overflow` προσωρινές συνδέσεις που κλείνουν μόλις επιστραφούν, ώστε
+το σύνολο να μην ξεπερνά ποτέ το size + max_overflow (και το max_connections του server).
+"""
+
+import collections
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import errors
+
+# Σφάλματα που σημαίνουν ότι η σύνδεση δεν είναι πλέον χρήσιμη και πρέπει να πεταχτεί.
+BROKEN_CONNECTION_ERRORS = (errors.InterfaceError, errors.OperationalError)
+
+
+class PoolTimeoutError(errors.PoolError):
+    """Δεν βρέθηκε ελεύθερη σύνδεση μέσα στο χρονικό όριο αναμονής."""
+
+
+class ConnectionPool:
+    """Thread-safe pool με bounded αναμονή, overflow, έλεγχο υγείας και μέγιστη ηλικία συνδέσεων."""
+
+    def __init__(
+        self,
+        config,
+        size=5,
+        max_overflow=0,
+        timeout=10.0,
+        max_age=3600.0,
+        ping_on_borrow=True,
+        reset_session=True,
+        on_session_reset=None,
+        connect=None,
+    ):
+        self.config = dict(config)
+        self.size = max(1, int(size))
+        self.max_overflow = max(0, int(max_overflow))
+        self.timeout = float(timeout)
+        self.max_age = float(max_age) if max_age else None
+        self.ping_on_borrow = ping_on_borrow
+        self.reset_session = reset_session
+        # Καλείται όταν χάνεται το session state μιας σύνδεσης (reconnect/reset), π.χ. για prepared statements.
+        self.on_session_reset = on_session_reset
+        self._connect = connect or (lambda: mysql.connector.connect(**self.config))
+
+        self._cond = threading.Condition()
+        self._idle = collections.deque()  # (conn, created_at), το πιο πρόσφατο δεξιά
+        self._created_at = {}  # id(conn) -> created_at για τις δανεισμένες
+        self._total = 0
+        self._waiters = 0
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._timeouts = 0
+        self._opened = 0
+        self._discarded = 0
+
+    def acquire(self):
+        """Δανείζει σύνδεση· περιμένει έως `timeout` δευτερόλεπτα αν το pool είναι γεμάτο."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                    break
+                if self._total < self.size + self.max_overflow:
+                    self._total += 1
+                    conn, created_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._wait_count += 1
+                    self._wait_total += time.monotonic() - started
+                    raise PoolTimeoutError(
+                        msg=f"Δεν υπάρχει διαθέσιμη σύνδεση βάσης μετά από {self.timeout:g} δευτερόλεπτα."
+                    )
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self._wait_count += 1
+                self._wait_total += waited
+
+        # Δημιουργία/έλεγχος εκτός lock: ένα αργό handshake δεν μπλοκάρει τους υπόλοιπους.
+        try:
+            if conn is None or self._expired(created_at):
+                if conn is not None:
+                    self._discard(conn)
+                conn, created_at = self._open()
+            elif self.ping_on_borrow:
+                try:
+                    connection_id = getattr(conn, "connection_id", None)
+                    conn.ping(reconnect=True, attempts=1, delay=0)
+                    if self.on_session_reset and getattr(conn, "connection_id", None) != connection_id:
+                        self.on_session_reset(conn)
+                except errors.Error:
+                    self._discard(conn)
+                    conn, created_at = self._open()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._created_at[id(conn)] = created_at
+        return conn
+
+    def release(self, conn, discard=False):
+        """Επιστρέφει τη σύνδεση· με discard=True (ή αν είναι overflow/παλιά) την κλείνει."""
+        with self._cond:
+            created_at = self._created_at.pop(id(conn), None)
+            keep = (
+                not discard
+                and created_at is not None
+                and self._total <= self.size
+                and not self._expired(created_at)
+            )
+        if keep:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                if self.reset_session:
+                    conn.reset_session()
+                    if self.on_session_reset:
+                        self.on_session_reset(conn)
+            except errors.Error:
+                keep = False
+        if not keep:
+            self._close_quietly(conn)
+        with self._cond:
+            if keep:
+                self._idle.append((conn, created_at))
+            else:
+                self._total -= 1
+                self._discarded += 1
+            self._cond.notify()
+
+    def close(self):
+        """Κλείνει όλες τις αδρανείς συνδέσεις (οι δανεισμένες κλείνουν όταν επιστραφούν)."""
+        with self._cond:
+            idle, self._idle = list(self._idle), collections.deque()
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Στιγμιότυπο κατάστασης: δανεισμένες, αδρανείς, αναμένοντες και συνολική αναμονή."""
+        with self._cond:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "total": self._total,
+                "in_use": self._total - len(self._idle),
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "wait_count": self._wait_count,
+                "wait_total_s": self._wait_total,
+                "timeouts": self._timeouts,
+                "opened": self._opened,
+                "discarded": self._discarded,
+            }
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self._opened += 1
+        return conn, time.monotonic()
+
+    def _discard(self, conn):
+        """Κλείνει σύνδεση που αντικαθίσταται χωρίς να αλλάξει το πλήθος θέσεων του pool."""
+        self._close_quietly(conn)
+        with self._cond:
+            self._discarded += 1
+
+    def _expired(self, created_at):
+        return self.max_age is not None and time.monotonic() - created_at > self.max_age
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except errors.Error:
+            pass
@@ -0,0 +1,96 @@
+"""Cache server-side prepared statements ανά σύνδεση, με κλειδί το όνομα της σταθεράς SQL.
+
+Κάθε prepared cursor του connector κρατά ένα statement στον server· εδώ κρατάμε έναν ανά
+(όνομα σταθεράς, πλήθος παραμέτρων) σε κάθε σύνδεση, ώστε οι συχνές εντολές να γίνονται parse
+μία φορά και στη συνέχεια να στέλνονται μόνο οι τιμές (binary protocol). Τα IN clauses
+στρογγυλεύονται σε δυνάμεις του 2 (βλ. db.bucketed_in_clause) ώστε να υπάρχουν λίγες μορφές, και κάθε
+μορφή είναι ένα μόνο αντικείμενο SqlText: ο cursor ξαναχρησιμοποιεί το statement μόνο για το ίδιο αντικείμενο.
+
+Το reconnect και το COM_RESET_CONNECTION σβήνουν τα statements στον server, γι' αυτό το pool
+καλεί invalidate() σε αυτές τις περιπτώσεις. Ενεργοποίηση: DB_PREPARED_STATEMENTS=1.
+"""
+
+import collections
+import os
+
+from mysql.connector import errors
+
+# Όνομα attribute πάνω στο αντικείμενο σύνδεσης όπου κρατιέται η cache της.
+_CACHE_ATTRIBUTE = "_farmakeio_prepared"
+
+
+class StatementCache:
+    """LRU από prepared cursors ανά σύνδεση."""
+
+    enabled = os.getenv("DB_PREPARED_STATEMENTS", "0") != "0"
+    # Όριο ανά σύνδεση (ο server έχει συνολικό όριο max_prepared_stmt_count).
+    MAX_PER_CONNECTION = int(os.getenv("DB_PREPARED_PER_CONNECTION", "64"))
+
+    @classmethod
+    def applies(cls, name, params):
+        """Μόνο εντολές με όνομα σταθεράς και παραμέτρους περνούν από prepared statements."""
+        return cls.enabled and bool(name) and bool(params)
+
+    @classmethod
+    def cursor(cls, conn, name, param_count):
+        """Ο prepared cursor της εντολής σε αυτή τη σύνδεση (δημιουργείται στην πρώτη χρήση)."""
+        cache = getattr(conn, _CACHE_ATTRIBUTE, None)
+        if cache is None:
+            cache = collections.OrderedDict()
+            setattr(conn, _CACHE_ATTRIBUTE, cache)
+        key = (name, param_count)
+        cur = cache.get(key)
+        if cur is not None:
+            cache.move_to_end(key)
+            return cur
+        cur = conn.cursor(prepared=True)
+        cache[key] = cur
+        while len(cache) > cls.MAX_PER_CONNECTION:
+            _, oldest = cache.popitem(last=False)
+            cls._close(oldest)
+        return cur
+
+    @staticmethod
+    def execute(cur, operation, params):
+        """Εκτελεί την εντολή στον prepared cursor της· αν είναι ήδη prepared στέλνει μόνο το COM_STMT_EXECUTE.
+
+        Το execute του connector στέλνει πριν από κάθε εκτέλεση και COM_STMT_RESET (ένα ακόμη blocking round
+        trip), που χρειάζεται μόνο για long data ή server-side cursors· εδώ δεν χρησιμοποιούνται και τα
+        αποτελέσματα διαβάζονται πάντα ως το τέλος. Για πρώτη εκτέλεση, άλλο κείμενο ή cursor χωρίς αυτά τα
+        εσωτερικά (C extension) ισχύει το κανονικό execute.
+        """
+        prepared = getattr(cur, "_prepared", None)
+        if not prepared or operation is not getattr(cur, "_executed", None):
+            return cur.execute(operation, params)
+        if len(prepared["parameters"]) != len(params):
+            return cur.execute(operation, params)
+        res = cur._connection.cmd_stmt_execute(
+            prepared["statement_id"],
+            data=tuple(params),
+            parameters=prepared["parameters"],
+            read_timeout=getattr(cur, "_read_timeout", None),
+            write_timeout=getattr(cur, "_write_timeout", None),
+        )
+        cur._handle_result(res)
+        return None
+
+    @classmethod
+    def invalidate(cls, conn):
+        """Ξεχνά (και κλείνει όσο γίνεται) τα prepared statements της σύνδεσης."""
+        cache = getattr(conn, _CACHE_ATTRIBUTE, None)
+        if not cache:
+            return
+        setattr(conn, _CACHE_ATTRIBUTE, None)
+        for cur in cache.values():
+            cls._close(cur)
+
+    @classmethod
+    def size(cls, conn):
+        return len(getattr(conn, _CACHE_ATTRIBUTE, None) or ())
+
+    @staticmethod
+    def _close(cur):
+        try:
+            cur.close()
+        except errors.Error:
+            pass
@@ -0,0 +1,113 @@
+"""Δρομολόγηση αναγνώσεων σε read replicas με έλεγχο καθυστέρησης (lag).
+
+Κάθε replica έχει δικό της ConnectionPool. Πριν επιλεγεί, ελέγχεται (το πολύ κάθε `check_interval`
+δευτερόλεπτα) το Seconds_Behind_Source· αν ξεπερνά το `max_lag`, αν η αναπαραγωγή έχει σταματήσει ή δεν
+είναι ρυθμισμένη, ή αν η replica δεν απαντά, παρακάμπτεται και η ανάγνωση πηγαίνει στον primary.
+"""
+
+import itertools
+import threading
+import time
+
+from mysql.connector import errors
+
+from metrics import QueryMetrics
+
+
+class Replica:
+    """Μία replica: το pool της και η τελευταία γνωστή κατάσταση υγείας."""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.lag = None
+        self.checked_at = float("-inf")
+        self.down_until = 0.0
+        self.lock = threading.Lock()
+
+
+class ReplicaSet:
+    """Round-robin επιλογή ανάμεσα στις υγιείς replicas."""
+
+    def __init__(self, replicas, lag_query, max_lag=5.0, check_interval=5.0, cooldown=30.0):
+        self.replicas = list(replicas)
+        self.lag_query = lag_query
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.cooldown = cooldown
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+        self._cycle_lock = threading.Lock()
+
+    def choose(self):
+        """Επιστρέφει μια υγιή replica ή None (οπότε η ανάγνωση πηγαίνει στον primary)."""
+        for _ in range(len(self.replicas)):
+            with self._cycle_lock:
+                replica = next(self._cycle)
+            if self._healthy(replica):
+                return replica
+        if self.replicas:
+            QueryMetrics.increment("replica_fallback_primary")
+        return None
+
+    def mark_failed(self, replica):
+        """Βγάζει προσωρινά εκτός μια replica που απέτυχε (σφάλμα σύνδεσης)."""
+        replica.down_until = time.monotonic() + self.cooldown
+        QueryMetrics.increment(f"replica_failed:{replica.name}")
+
+    def stats(self):
+        return {
+            replica.name: {
+                "lag_s": replica.lag,
+                "down": replica.down_until > time.monotonic(),
+                "pool": replica.pool.stats(),
+            }
+            for replica in self.replicas
+        }
+
+    def _healthy(self, replica):
+        now = time.monotonic()
+        if replica.down_until > now:
+            return False
+        if self.max_lag is None:
+            return True
+        # Μόνο ένα thread ανανεώνει το lag· τα υπόλοιπα χρησιμοποιούν την προηγούμενη τιμή.
+        if now - replica.checked_at > self.check_interval and replica.lock.acquire(blocking=False):
+            try:
+                replica.lag = self._measure_lag(replica)
+                replica.checked_at = time.monotonic()
+            finally:
+                replica.lock.release()
+        if replica.lag is None or replica.lag > self.max_lag:
+            return False
+        return True
+
+    def _measure_lag(self, replica):
+        """Seconds_Behind_Source της replica, None αν δεν απάντησε.
+
+        Χωρίς replica status (ο server δεν είναι ρυθμισμένος ως replica) ή με NULL (σταματημένη αναπαραγωγή)
+        τα δεδομένα μπορεί να είναι οσοδήποτε παλιά, οπότε η καθυστέρηση θεωρείται άπειρη.
+        """
+        try:
+            conn = replica.pool.acquire()
+        except errors.Error:
+            self.mark_failed(replica)
+            return None
+        discard = False
+        try:
+            cur = conn.cursor(dictionary=True)
+            try:
+                cur.execute(self.lag_query)
+                row = cur.fetchone()
+                cur.fetchall()
+            finally:
+                cur.close()
+        except errors.Error:
+            discard = True
+            self.mark_failed(replica)
+            return None
+        finally:
+            replica.pool.release(conn, discard=discard)
+        if row is None:
+            return float("inf")
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        return float(lag) if lag is not None else float("inf")
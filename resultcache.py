@@ -0,0 +1,167 @@
+"""Cache αποτελεσμάτων αναγνώσεων με TTL, LRU όριο μνήμης και ακύρωση ανά πίνακα.
+
+Κάθε σταθερά SQL δηλώνει ποιους πίνακες διαβάζει και ποιους γράφει μέσα από το ίδιο της το κείμενο
+(FROM/JOIN και INSERT INTO/UPDATE/DELETE [alias] FROM, βλ. sql_tables). Η cache είναι opt-in
+(DB_RESULT_CACHE=1) και αφορά μόνο τις εντολές του ResultCache.STATEMENTS, όταν το ζητήσει ο καλών
+(`Database.fetch_all(..., cache=True)`)· κάθε commit του Database.transaction ακυρώνει όσες εγγραφές
+διαβάζουν κάποιον από τους πίνακες που έγραψε. Αλλαγές από άλλες διεργασίες φαίνονται το αργότερο μετά το TTL.
+"""
+
+import collections
+import functools
+import os
+import re
+import sys
+import threading
+import time
+
+from metrics import QueryMetrics
+
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+([A-Z_][A-Z0-9_]*)\b")
+# Το `FOR UPDATE [OF t | SKIP LOCKED]` των locking reads δεν είναι εγγραφή.
+_WRITE_TABLES = re.compile(r"\b(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|(?<!FOR\s)UPDATE|DELETE\s+FROM)\s+([A-Z_][A-Z0-9_]*)\b")
+# Multi-table DELETE της MySQL: `DELETE a[, b] FROM T a JOIN U b ...` γράφει τους πίνακες πίσω από τα aliases.
+_MULTI_DELETE = re.compile(r"\bDELETE\s+(\w+(?:\s*,\s*\w+)*)\s+FROM\b")
+_TABLE_ALIASES = re.compile(r"\b(?:FROM|JOIN|(?<!FOR\s)UPDATE)\s+([A-Z_][A-Z0-9_]*)(?:\s+(?:AS\s+)?([a-z_][a-z0-9_]*))?")
+
+
+def _multi_delete_tables(text):
+    """Οι πίνακες που σβήνει ένα multi-table DELETE (τα aliases λύνονται από τα FROM/JOIN του ίδιου κειμένου)."""
+    targets = set()
+    for match in _MULTI_DELETE.finditer(text):
+        aliases = {alias: table for table, alias in _TABLE_ALIASES.findall(text) if alias}
+        for name in re.split(r"\s*,\s*", match.group(1)):
+            targets.add(aliases.get(name, name))
+    return targets
+
+
+@functools.lru_cache(maxsize=1024)
+def sql_tables(text):
+    """(πίνακες που διαβάζει, πίνακες που γράφει) ένα κείμενο SQL."""
+    writes = frozenset(_WRITE_TABLES.findall(text)) | frozenset(_multi_delete_tables(text))
+    reads = frozenset(_READ_TABLES.findall(text)) - writes if writes else frozenset(_READ_TABLES.findall(text))
+    return reads, writes
+
+
+def _estimate_size(result):
+    """Χοντρική εκτίμηση bytes ενός αποτελέσματος (γραμμές + τιμές) για το όριο μνήμης."""
+    if result is None:
+        return 64
+    rows = result if isinstance(result, list) else [result]
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row.values():
+            size += sys.getsizeof(value)
+    return size
+
+
+def _copy(result):
+    """Ρηχό αντίγραφο ώστε οι καλούντες να μπορούν να αλλάζουν τις γραμμές (π.χ. _annotate_contract)."""
+    if result is None:
+        return None
+    if isinstance(result, list):
+        return [row.copy() for row in result]
+    return result.copy()
+
+
+class ResultCache:
+    """Thread-safe LRU με TTL ανά εγγραφή και ετικέτες πινάκων."""
+
+    enabled = os.getenv("DB_RESULT_CACHE", "0") != "0"
+    # Οι μόνες εντολές που μπαίνουν στην cache: μικρά, συχνά και σχεδόν αμετάβλητα αποτελέσματα.
+    STATEMENTS = frozenset({"PHARMACY_AFM", "PHARMACY_CONTRACTS", "SUPPLIER_STORAGE_BY_LABEL", "CATALOG_VERSION"})
+    DEFAULT_TTL = float(os.getenv("DB_RESULT_CACHE_TTL", "30"))
+    MAX_BYTES = int(float(os.getenv("DB_RESULT_CACHE_MB", "32")) * 1024 * 1024)
+
+    _lock = threading.Lock()
+    _entries = collections.OrderedDict()  # key -> (expires_at, tables, size, result)
+    _by_table = collections.defaultdict(set)
+    _generations = collections.defaultdict(int)
+    _bytes = 0
+
+    @classmethod
+    def generation(cls, tables):
+        """Στιγμιότυπο εκδόσεων των πινάκων πριν την ανάγνωση (για να μην αποθηκευτεί παλιό αποτέλεσμα)."""
+        with cls._lock:
+            return tuple(cls._generations[table] for table in sorted(tables))
+
+    @classmethod
+    def applies(cls, name):
+        """Αν η εντολή με αυτό το όνομα μπορεί να περάσει από την cache."""
+        return cls.enabled and name in cls.STATEMENTS
+
+    @classmethod
+    def get(cls, key):
+        """(True, αντίγραφο αποτελέσματος) αν υπάρχει φρέσκια εγγραφή, αλλιώς (False, None)."""
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None:
+                QueryMetrics.increment("result_cache_miss")
+                return False, None
+            if entry[0] < time.monotonic():
+                cls._remove(key)
+                QueryMetrics.increment("result_cache_miss")
+                return False, None
+            cls._entries.move_to_end(key)
+            result = entry[3]
+        QueryMetrics.increment("result_cache_hit")
+        return True, _copy(result)
+
+    @classmethod
+    def put(cls, key, tables, result, generation, ttl=None):
+        """Αποθηκεύει το αποτέλεσμα εκτός αν κάποιος από τους πίνακες άλλαξε όσο γινόταν η ανάγνωση."""
+        size = _estimate_size(result)
+        if size > cls.MAX_BYTES:
+            return
+        stored = _copy(result)
+        with cls._lock:
+            if tuple(cls._generations[table] for table in sorted(tables)) != generation:
+                return
+            if key in cls._entries:
+                cls._remove(key)
+            expires_at = time.monotonic() + (cls.DEFAULT_TTL if ttl is None else ttl)
+            cls._entries[key] = (expires_at, tables, size, stored)
+            cls._bytes += size
+            for table in tables:
+                cls._by_table[table].add(key)
+            while cls._bytes > cls.MAX_BYTES and cls._entries:
+                cls._remove(next(iter(cls._entries)))
+
+    @classmethod
+    def invalidate_tables(cls, tables):
+        """Ακυρώνει όσες εγγραφές διαβάζουν κάποιον από τους πίνακες (καλείται μετά από commit)."""
+        if not tables:
+            return
+        with cls._lock:
+            for table in tables:
+                cls._generations[table] += 1
+                for key in list(cls._by_table.pop(table, ())):
+                    cls._remove(key)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            for table in list(cls._by_table):
+                cls._generations[table] += 1
+            cls._entries.clear()
+            cls._by_table.clear()
+            cls._bytes = 0
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            return {"entries": len(cls._entries), "bytes": cls._bytes, "max_bytes": cls.MAX_BYTES}
+
+    @classmethod
+    def _remove(cls, key):
+        entry = cls._entries.pop(key, None)
+        if entry is None:
+            return
+        cls._bytes -= entry[2]
+        for table in entry[1]:
+            keys = cls._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del cls._by_table[table]
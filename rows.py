@@ -0,0 +1,111 @@
+"""Συμπαγείς εγγραφές αποτελεσμάτων: κλάσεις με __slots__ ανά SQL σταθερά, με πρόσβαση τύπου dict.
+
+Ο dictionary cursor δημιουργεί ένα dict ανά γραμμή με δικό του πίνακα κλειδιών. Εδώ τα ονόματα
+στηλών ανήκουν μία φορά στην κλάση και κάθε γραμμή κρατά μόνο τις τιμές της, ενώ οι οθόνες
+συνεχίζουν να γράφουν row["onoma"] / row.get(...). Κλειδιά που προστίθενται αργότερα
+(π.χ. order["items"]) μπαίνουν σε ένα μικρό dict που δημιουργείται μόνο όταν χρειαστεί.
+"""
+
+import threading
+
+_classes = {}
+_lock = threading.Lock()
+
+
+class CompactRow:
+    """Βάση των παραγόμενων κλάσεων· οι στήλες ορίζονται στο _columns της υποκλάσης."""
+
+    __slots__ = ("_extra",)
+    _columns = ()
+    _column_set = frozenset()
+
+    def __init__(self, values):
+        for column, value in zip(self._columns, values):
+            setattr(self, column, value)
+        self._extra = None
+
+    def __getitem__(self, key):
+        if key in self._column_set:
+            return getattr(self, key)
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._column_set:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __contains__(self, key):
+        return key in self._column_set or (self._extra is not None and key in self._extra)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._columns) + (list(self._extra) if self._extra else [])
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._columns) + (len(self._extra) if self._extra else 0)
+
+    def __eq__(self, other):
+        if isinstance(other, (CompactRow, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def copy(self):
+        """Ρηχό αντίγραφο της ίδιας κλάσης (όπως το dict.copy)."""
+        clone = type(self)([getattr(self, column) for column in self._columns])
+        if self._extra:
+            clone._extra = dict(self._extra)
+        return clone
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def record_class(name, columns):
+    """Η (κοινή) κλάση εγγραφής για ένα statement και σύνολο στηλών, δημιουργείται μία φορά."""
+    columns = tuple(columns)
+    key = (name, columns)
+    cls = _classes.get(key)
+    if cls is None:
+        with _lock:
+            cls = _classes.get(key)
+            if cls is None:
+                reserved = [column for column in columns if hasattr(CompactRow, column)]
+                if reserved:
+                    raise ValueError(f"Οι στήλες {reserved} συγκρούονται με μεθόδους του CompactRow.")
+                cls = type(
+                    f"{name or 'Row'}Row",
+                    (CompactRow,),
+                    {"__slots__": columns, "_columns": columns, "_column_set": frozenset(columns)},
+                )
+                _classes[key] = cls
+    return cls
+
+
+def compact_rows(name, columns, tuples):
+    """Μετατρέπει τις γραμμές ενός tuple cursor σε εγγραφές της κλάσης του statement."""
+    cls = record_class(name, columns)
+    return [cls(values) for values in tuples]
@@ -48,9 +48,16 @@ class ScreenLogin(ttk.Frame):
         username = raw_username.lower()
         password = self.pass_entry.get().strip()
 
-        with self.controller.busy_cursor():
-            success, msg, role = AuthManager.login(username, password)
+        self.controller.run_async(
+            AuthManager.login,
+            username,
+            password,
+            key="login",
+            on_success=lambda result: self._on_login(username, *result),
+        )
 
+    def _on_login(self, username, success, msg, role):
+        """Ολοκληρώνει τη σύνδεση στο main thread όταν επιστρέψει ο έλεγχος στοιχείων."""
         if success:
             self.user_entry.delete(0, "end")
             self.pass_entry.delete(0, "end")
@@ -167,9 +174,10 @@ class ScreenRegister(ttk.Frame):
                 "address": self.address_entry.get().strip(),
             }
 
+        # Εγγραφή = εγγραφή στη βάση: μένει σύγχρονη (busy_cursor) ώστε ένα δεύτερο κλικ να μην ακυρώνει
+        # το αποτέλεσμα της πρώτης κλήσης ενώ εκείνη έχει ήδη κάνει commit.
         with self.controller.busy_cursor():
             success, msg = AuthManager.register(username, password, role, fullname, phone, pharmacy_details)
-
         if success:
             messagebox.showinfo("Επιτυχία", msg)
             self.reset_form()
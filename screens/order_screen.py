@@ -1,8 +1,8 @@
 import tkinter as tk
-from difflib import SequenceMatcher
 from tkinter import messagebox, ttk
 
 from screens.utils import HoverTooltip, apply_treeview_striping, enable_vertical_scroll
+from search import ProductSearchIndex
 
 
 class ProductOrderScreen(ttk.Frame):
@@ -16,7 +16,7 @@ class ProductOrderScreen(ttk.Frame):
         self.total_cost = 0.0
         self.discount_percent = 0.0
         self.products = []
-        self._search_index = []
+        self._search_index = None
         self._cart_index = {}
         self._last_query = None
         self.suggestion_popup = None
@@ -171,27 +171,66 @@ class ProductOrderScreen(ttk.Frame):
     def update_discount(self):
         provider = self.config.get("discount_provider")
         if callable(provider):
-            try:
-                value = float(provider())
-            except (TypeError, ValueError):
-                value = 0.0
-            self.discount_percent = max(0.0, value)
-            if self.discount_label:
-                self.discount_label.config(text=f"Έκπτωση συμβολαίου: {self.discount_percent:.0f}%")
+            self.controller.run_async(provider, key=("discount", id(self)), on_success=self._apply_discount)
         else:
-            self.discount_percent = 0.0
+            self._apply_discount(0.0)
+
+    def _apply_discount(self, value):
+        """Εφαρμόζει την έκπτωση που επέστρεψε ο discount_provider και ξαναϋπολογίζει τα σύνολα."""
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = 0.0
+        self.discount_percent = max(0.0, value)
+        if self.discount_label:
+            self.discount_label.config(text=f"Έκπτωση συμβολαίου: {self.discount_percent:.0f}%")
         self.recalculate()
 
     def reload_products(self, initial=False):
-        """Φορτώνει ξανά τα προϊόντα και ανανεώνει τα αποτελέσματα αναζήτησης."""
+        """Φορτώνει ξανά τα προϊόντα στο παρασκήνιο και ανανεώνει τα αποτελέσματα αναζήτησης."""
         fetcher = self.config["fetch_products"]
-        self.products = fetcher() if callable(fetcher) else []
-        self._build_search_index()
+        if not callable(fetcher):
+            self._on_products_loaded([], initial)
+            return
+        self.controller.run_async(
+            fetcher,
+            key=("products", id(self)),
+            on_success=lambda products: self._on_products_loaded(products, initial),
+        )
+
+    def _on_products_loaded(self, products, initial):
+        # Η cache καταλόγου επιστρέφει το ίδιο αντικείμενο όσο δεν άλλαξαν τα προϊόντα και νέα λίστα με τα
+        # ίδια ονόματα όταν άλλαξε μόνο το απόθεμα, οπότε το ευρετήριο ξαναχτίζεται μόνο όταν χρειάζεται.
+        if products is not self.products or self._search_index is None:
+            self.products = products
+            index = self._search_index.for_products(products) if self._search_index is not None else None
+            if index is None:
+                self._build_search_index(initial)
+                return
+            self._search_index = index
         self.perform_search(initial=initial)
 
-    def _build_search_index(self):
-        """Δημιουργεί δομή για γρήγορο fuzzy search με βάση το όνομα."""
-        self._search_index = [(product["onoma"].lower(), product) for product in self.products]
+    def _build_search_index(self, initial=False):
+        """Δημιουργεί στο παρασκήνιο το trigram ευρετήριο (όνομα, εταιρεία, κατηγορία) για γρήγορο fuzzy search.
+
+        Σε μεγάλο κατάλογο το χτίσιμο κρατά δευτερόλεπτα, οπότε δεν γίνεται στο thread του Tk· μέχρι να
+        ολοκληρωθεί η αναζήτηση χρησιμοποιεί το προηγούμενο ευρετήριο.
+        """
+        products = self.products
+        self.controller.run_async(
+            ProductSearchIndex,
+            products,
+            fuzzy_threshold=self.FUZZY_THRESHOLD,
+            key=("search-index", id(self)),
+            on_success=lambda index: self._on_search_index_built(index, products, initial),
+        )
+
+    def _on_search_index_built(self, index, products, initial):
+        if products is not self.products:
+            # Στο μεταξύ φορτώθηκε νεότερος κατάλογος, του οποίου το ευρετήριο χτίζεται ήδη.
+            return
+        self._search_index = index
+        self.perform_search(initial=initial)
 
     # --- Search & suggestion logic (same as previous implementation) ---
     def on_search_change(self, *_):
@@ -204,16 +243,7 @@ class ProductOrderScreen(ttk.Frame):
 
     def update_suggestions(self, query):
         """Ενεργοποιεί λογική fuzzy αναζήτησης και εμφανίζει την popover λίστα."""
-        normalized = query.lower()
-        matches = []
-        if normalized:
-            for name_lower, product in self._search_index:
-                name = product["onoma"]
-                if normalized in name_lower or SequenceMatcher(None, normalized, name_lower).ratio() >= self.FUZZY_THRESHOLD:
-                    matches.append(name)
-                if len(matches) >= 5:
-                    break
-        matches = matches[:5]
+        matches = self._search_index.suggest(query, limit=5) if self._search_index is not None else []
         if not matches:
             self.hide_suggestions()
             return
@@ -347,7 +377,7 @@ class ProductOrderScreen(ttk.Frame):
         """Αναζητά προϊόντα με βάση το query και δημιουργεί κάρτες προβολής."""
         if not initial:
             self.hide_suggestions(force=True)
-        query = self.search_var.get().strip().lower()
+        query = self.search_var.get().strip()
         for widget in self.grid_frame.winfo_children():
             widget.destroy()
         self.empty_message = None
@@ -356,22 +386,13 @@ class ProductOrderScreen(ttk.Frame):
             self._show_empty_message(self.config["empty_message"])
             return
 
-        candidates = []
-        for name_lower, product in self._search_index:
-            if query in name_lower:
-                candidates.append((1.0, product))
-            else:
-                ratio = SequenceMatcher(None, query, name_lower).ratio()
-                if ratio >= self.FUZZY_THRESHOLD:
-                    candidates.append((ratio, product))
-
+        candidates = self._search_index.search(query) if self._search_index is not None else []
         if not candidates:
             self._show_empty_message("Δεν βρέθηκαν αποτελέσματα για την αναζήτησή σας.")
             return
 
-        candidates.sort(key=lambda item: item[0], reverse=True)
         row, col = 0, 0
-        for _, item in candidates:
+        for item in candidates:
             self.create_card(item, row, col)
             col += 1
             if col >= 3:
@@ -5,13 +5,11 @@ from models import (
     CONTRACT_DURATION_CHOICES,
     CONTRACT_DURATION_LOOKUP,
     DISCOUNT_BY_MONTHS,
-    InventoryRepository,
     PharmacyRepository,
-    calculate_delivery_days,
     format_delivery_remaining,
 )
 from screens.order_screen import ProductOrderScreen
-from screens.utils import apply_treeview_striping, center_card, enable_vertical_scroll
+from screens.utils import LazyOrderTree, apply_treeview_striping, center_card, enable_vertical_scroll
 
 
 class ScreenOne(ttk.Frame):
@@ -82,11 +80,23 @@ class ScreenOne(ttk.Frame):
         """Ενημερώνει την ένδειξη χρήστη και ελέγχει αν υπάρχει ενεργό συμβόλαιο."""
         username = self.controller.current_user or ""
         self.user_label.configure(text=f"👤 {username}")
-        contract = PharmacyRepository.fetch_contract(username)
+        self.has_active_contract = None
+        self.controller.run_async(
+            PharmacyRepository.fetch_contract,
+            username,
+            key="menu-contract",
+            on_success=self._on_contract_loaded,
+        )
+
+    def _on_contract_loaded(self, contract):
         self.has_active_contract = bool(contract and contract.get("is_active"))
 
     def _require_contract(self):
         """Ελέγχει αν υπάρχει ενεργό συμβόλαιο και προτρέπει τον χρήστη να υπογράψει αν όχι."""
+        if self.has_active_contract is None:
+            # Ο έλεγχος στο παρασκήνιο δεν έχει ολοκληρωθεί ακόμη· τον κάνουμε εδώ.
+            with self.controller.busy_cursor():
+                self._on_contract_loaded(PharmacyRepository.fetch_contract(self.controller.current_user))
         if self.has_active_contract:
             return True
         answer = messagebox.askyesno(
@@ -128,8 +138,8 @@ class ScreenTwo(ProductOrderScreen):
         super().__init__(parent, controller, config)
 
     def _format_status(self, item):
-        """Δίνει οπτική ένδειξη διαθεσιμότητας για κάθε προϊόν στην λίστα."""
-        stock_qty = int(item.get("stock_qty", 0))
+        """Δίνει οπτική ένδειξη διαθεσιμότητας για κάθε προϊόν στην λίστα (απόθεμα που δεν έχει δεσμευτεί)."""
+        stock_qty = int(item.get("available_qty", item.get("stock_qty", 0)))
         in_stock = stock_qty > 0
         status_text = "Διαθέσιμο" if in_stock else "Εκτός αποθέματος"
         status_color = "#059669" if in_stock else "#dc2626"
@@ -143,19 +153,17 @@ class ScreenTwo(ProductOrderScreen):
         }
 
     def _complete_order(self, order_items, total_cost):
-        """Μεταφέρει το καλάθι στην υπηρεσία δημιουργίας παραγγελίας και εμφανίζει ETA."""
+        """Μεταφέρει το καλάθι στην υπηρεσία δημιουργίας παραγγελίας και εμφανίζει ETA.
+
+        Το ETA υπολογίζεται από το create_order με βάση όσα τεμάχια δεσμεύτηκαν για την παραγγελία.
+        """
         success, msg = PharmacyRepository.create_order(
             self.controller.current_user,
             order_items,
             total_cost,
         )
         if success:
-            product_ids = [product_id for product_id, _, _ in order_items]
-            available_map = InventoryRepository.fetch_available_counts(product_ids)
-            eta_days = calculate_delivery_days(order_items, available_map)
-            day_label = "ημέρα" if eta_days == 1 else "ημέρες"
-            full_msg = f"{msg}\nΕκτιμώμενη παράδοση σε {eta_days} {day_label}."
-            return True, full_msg, "info"
+            return True, msg, "info"
         return False, msg, "error"
 
 class ScreenHistory(ttk.Frame):
@@ -214,61 +222,66 @@ class ScreenHistory(ttk.Frame):
         self.tree.tag_configure("parent", font=("Segoe UI", 10, "bold"))
         self.tree.tag_configure("child", font=("Segoe UI", 10))
         self.tree.pack(fill="both", expand=True)
+        # Οι παραγγελίες φορτώνονται ανά σελίδα με το scroll και τα προϊόντα τους όταν ανοίξουν.
+        self.loader = LazyOrderTree(
+            self.tree,
+            controller,
+            key="history",
+            fetch_page=self._fetch_page,
+            parent_values=self._order_values,
+            fetch_children=lambda order: PharmacyRepository.fetch_order_items(order["order_id"]),
+            child_values=self._item_values,
+        )
 
     def _go_back(self, controller):
         """Επιστρέφει στο κεντρικό μενού φαρμακείου με busy cursor για ομαλή μετάβαση."""
         controller.show_frame_busy(ScreenOne)
 
     def refresh(self):
-        """Φορτώνει το ιστορικό για το συνδεδεμένο φαρμακείο και ενημερώνει το TreeView."""
-        self.tree.delete(*self.tree.get_children())
-        user = self.controller.current_user
+        """Ξαναφορτώνει από την αρχή (σελίδα-σελίδα) το ιστορικό του συνδεδεμένου φαρμακείου."""
+        self.loader.reset()
+
+    def _fetch_page(self, cursor):
+        """Τρέχει στο παρασκήνιο: μία σελίδα ιστορικού για τον χρήστη και το φίλτρο κατάστασης."""
         selected_status = self.status_filter.get() if hasattr(self, "status_filter") else "Όλες"
-        with self.controller.busy_cursor():
-            orders = PharmacyRepository.fetch_history(user, selected_status)
-        for order in orders:
-            date_display = order["executed_at"].strftime("%d/%m/%Y %H:%M") if order["executed_at"] else "-"
-            # Η παράδοση μπορεί να είναι ακριβής ημερομηνία αποστολής ή εκτίμηση.
-            if order["katastasi"] == "Ακυρώθηκε":
-                delivery_display = "-"
-            elif order.get("shipment_at"):
-                delivery_display = order["shipment_at"].strftime("%d/%m/%Y %H:%M")
-            elif order["executed_at"]:
-                delivery_display = format_delivery_remaining(order["executed_at"], order["items"])
-            else:
-                delivery_display = "-"
-            parent_id = self.tree.insert(
-                "",
-                "end",
-                values=(
-                    f"#{order['order_id']}",
-                    date_display,
-                    "-",
-                    "-",
-                    f"{order['arxiko_kostos']:.2f} €",
-                    order["katastasi"],
-                    delivery_display,
-                ),
-                tags=("parent",),
-                open=False,
-            )
-            for product in order["items"]:
-                row_total = float(product["temaxia_zitisis"]) * float(product["arx_kostos_temaxiou"])
-                self.tree.insert(
-                    parent_id,
-                    "end",
-                    values=(
-                        f"  ↳ {product['onoma']}",
-                        "",
-                        product["temaxia_zitisis"],
-                        product.get("shipped_qty", 0),
-                        f"{row_total:.2f} €",
-                        "",
-                        "",
-                    ),
-                    tags=("child",),
-                )
-        apply_treeview_striping(self.tree)
+        return PharmacyRepository.fetch_history(self.controller.current_user, selected_status, cursor=cursor)
+
+    @staticmethod
+    def _order_values(order):
+        """Τιμές της γονικής γραμμής μιας παραγγελίας."""
+        date_display = order["executed_at"].strftime("%d/%m/%Y %H:%M") if order["executed_at"] else "-"
+        # Η παράδοση μπορεί να είναι ακριβής ημερομηνία αποστολής ή εκτίμηση.
+        if order["katastasi"] == "Ακυρώθηκε":
+            delivery_display = "-"
+        elif order.get("shipment_at"):
+            delivery_display = order["shipment_at"].strftime("%d/%m/%Y %H:%M")
+        elif order["executed_at"]:
+            delivery_display = format_delivery_remaining(order["executed_at"], order["items"] or [])
+        else:
+            delivery_display = "-"
+        return (
+            f"#{order['order_id']}",
+            date_display,
+            "-",
+            "-",
+            f"{order['arxiko_kostos']:.2f} €",
+            order["katastasi"],
+            delivery_display,
+        )
+
+    @staticmethod
+    def _item_values(product):
+        """Τιμές της γραμμής ενός προϊόντος κάτω από την παραγγελία."""
+        row_total = float(product["temaxia_zitisis"]) * float(product["arx_kostos_temaxiou"])
+        return (
+            f"  ↳ {product['onoma']}",
+            "",
+            product["temaxia_zitisis"],
+            product.get("shipped_qty", 0),
+            f"{row_total:.2f} €",
+            "",
+            "",
+        )
 
 
 class ScreenContract(ttk.Frame):
@@ -419,9 +432,16 @@ class ScreenContract(ttk.Frame):
     def refresh(self):
         """Καλείται σε κάθε προβολή της οθόνης για να φέρει συμβόλαια και να ενημερώσει την κατάσταση."""
         username = self.controller.current_user
-        with self.controller.busy_cursor():
-            self.contracts = PharmacyRepository.fetch_contracts(username)
-            self.current_contract = PharmacyRepository.select_current_contract(self.contracts)
+        self.controller.run_async(
+            PharmacyRepository.fetch_contracts,
+            username,
+            key="contracts",
+            on_success=self._on_contracts_loaded,
+        )
+
+    def _on_contracts_loaded(self, contracts):
+        self.contracts = contracts
+        self.current_contract = PharmacyRepository.select_current_contract(self.contracts)
         self._render_state()
         self._render_history()
 
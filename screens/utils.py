@@ -1,5 +1,5 @@
 import tkinter as tk
-from tkinter import ttk
+from tkinter import messagebox, ttk
 
 
 def center_card(parent, width_ratio=0.5, height_ratio=0.7, padding=30):
@@ -60,6 +60,152 @@ def apply_treeview_striping(tree, even="#ffffff", odd="#f9fafb"):
         _apply(top_id)
 
 
+def stripe_rows(tree, item_ids, start=0, even="#ffffff", odd="#f9fafb"):
+    """Χρωματίζει εναλλάξ μόνο τις δοσμένες γραμμές, ξεκινώντας από τη θέση `start` (για σταδιακή φόρτωση)."""
+    tree.tag_configure("row_even", background=even)
+    tree.tag_configure("row_odd", background=odd)
+    for index, item_id in enumerate(item_ids, start=start):
+        row_tag = "row_even" if index % 2 == 0 else "row_odd"
+        tags = [tag for tag in (tree.item(item_id, "tags") or ()) if tag not in ("row_even", "row_odd")]
+        tags.append(row_tag)
+        tree.item(item_id, tags=tuple(tags))
+
+
+class LazyOrderTree:
+    """Σελιδοποιημένη φόρτωση γονικών γραμμών σε Treeview με "τεμπέλικη" φόρτωση παιδιών.
+
+    - fetch_page(cursor) -> (rows, next_cursor): τρέχει στο παρασκήνιο, καλείται ξανά όταν το scroll
+      φτάσει κοντά στο τέλος και υπάρχει επόμενη σελίδα.
+    - parent_values(row) -> values της γονικής γραμμής.
+    - fetch_children(row) -> λίστα παιδιών: τρέχει στο παρασκήνιο όταν ανοίξει η γραμμή (<<TreeviewOpen>>),
+      εκτός αν η row έχει ήδη λίστα στο κλειδί `children_key`.
+    - child_values(child) -> values της γραμμής παιδιού.
+    """
+
+    PLACEHOLDER_TAG = "placeholder"
+    LOAD_MORE_THRESHOLD = 0.9
+
+    def __init__(self, tree, controller, key, fetch_page, parent_values, fetch_children, child_values,
+                 children_key="items", on_children_loaded=None, scrollbar=None):
+        self.tree = tree
+        self.controller = controller
+        self.key = key
+        self.fetch_page = fetch_page
+        self.parent_values = parent_values
+        self.fetch_children = fetch_children
+        self.child_values = child_values
+        self.children_key = children_key
+        self.on_children_loaded = on_children_loaded
+        self.scrollbar = scrollbar
+        self.rows = {}
+        self._next_cursor = None
+        self._loading = False
+        self._generation = 0
+
+        tree.configure(yscrollcommand=self._on_scroll)
+        tree.bind("<<TreeviewOpen>>", self._on_open, add="+")
+
+    def reset(self):
+        """Καθαρίζει το δέντρο και φορτώνει την πρώτη σελίδα."""
+        self._generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.rows = {}
+        self._next_cursor = None
+        self._load_page(None)
+
+    def row_for(self, item_id):
+        """Τα δεδομένα της γονικής γραμμής (ή None για γραμμή παιδιού/placeholder)."""
+        return self.rows.get(item_id)
+
+    def load_children(self, item_id, callback=None):
+        """Εξασφαλίζει ότι τα παιδιά της γραμμής έχουν φορτωθεί και καλεί callback(children)."""
+        row = self.rows.get(item_id)
+        if row is None:
+            return
+        children = row.get(self.children_key)
+        if children is not None:
+            self._insert_children(item_id, children)
+            if callback:
+                callback(children)
+            return
+        generation = self._generation
+
+        def _loaded(children):
+            if generation != self._generation or not self.tree.exists(item_id):
+                return
+            row[self.children_key] = children
+            self._insert_children(item_id, children)
+            if callback:
+                callback(children)
+
+        self.controller.run_async(self.fetch_children, row, key=(self.key, "children", item_id), on_success=_loaded)
+
+    def _load_page(self, cursor):
+        self._loading = True
+        generation = self._generation
+
+        def _loaded(result):
+            if generation != self._generation:
+                return
+            rows, next_cursor = result
+            self._append_rows(rows)
+            self._next_cursor = next_cursor
+            self._loading = False
+
+        def _failed(exc):
+            self._loading = False
+            messagebox.showerror("Σφάλμα", f"Η φόρτωση απέτυχε: {exc}")
+
+        self.controller.run_async(
+            self.fetch_page,
+            cursor,
+            key=(self.key, "page"),
+            on_success=_loaded,
+            on_error=_failed,
+        )
+
+    def _append_rows(self, rows):
+        start = len(self.tree.get_children(""))
+        new_ids = []
+        for row in rows:
+            item_id = self.tree.insert("", "end", values=self.parent_values(row), tags=("parent",), open=False)
+            self.rows[item_id] = row
+            # Κενό παιδί ώστε η γραμμή να μπορεί να ανοίξει πριν φορτωθούν τα πραγματικά παιδιά.
+            self.tree.insert(item_id, "end", values=("  …",), tags=("child", self.PLACEHOLDER_TAG))
+            new_ids.append(item_id)
+        stripe_rows(self.tree, new_ids, start=start)
+
+    def _insert_children(self, item_id, children):
+        existing = self.tree.get_children(item_id)
+        placeholders = [c for c in existing if self.PLACEHOLDER_TAG in self.tree.item(c, "tags")]
+        if not placeholders and existing:
+            return
+        self.tree.delete(*placeholders)
+        child_ids = [
+            self.tree.insert(item_id, "end", values=self.child_values(child), tags=("child",))
+            for child in children
+        ]
+        stripe_rows(self.tree, child_ids, start=self.tree.index(item_id) + 1)
+        if self.on_children_loaded:
+            self.on_children_loaded(item_id, children)
+
+    def _on_open(self, _event=None):
+        item_id = self.tree.focus()
+        if item_id in self.rows:
+            self.load_children(item_id)
+
+    def _on_scroll(self, first, last):
+        """yscrollcommand του δέντρου: ενημερώνει το scrollbar και φέρνει την επόμενη σελίδα κοντά στο τέλος."""
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if (
+            not self._loading
+            and self._next_cursor is not None
+            and float(last) >= self.LOAD_MORE_THRESHOLD
+        ):
+            self._load_page(self._next_cursor)
+
+
 class HoverTooltip:
     """Απλό tooltip που εμφανίζεται όταν περνά ο δείκτης πάνω από widget."""
 
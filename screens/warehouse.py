@@ -2,8 +2,9 @@ import tkinter as tk
 from tkinter import messagebox, ttk
 
 from models import WarehouseRepository
+from picking import WAVE_POLICY_CONTRACT, WAVE_POLICY_OLDEST
 from screens.order_screen import ProductOrderScreen
-from screens.utils import apply_treeview_striping, center_card, enable_vertical_scroll
+from screens.utils import LazyOrderTree, center_card, enable_vertical_scroll
 
 
 class ScreenWarehouseMenu(ttk.Frame):
@@ -70,6 +71,10 @@ class ScreenWarehouseMenu(ttk.Frame):
 class ScreenWarehouseOrders(ttk.Frame):
     """Διαχείριση παραγγελιών φαρμακείων από την πλευρά της αποθήκης."""
     STATUS_OPTIONS = ["Όλες", "Εκκρεμεί", "Σε επεξεργασία", "Απεστάλη", "Ακυρώθηκε"]
+    WAVE_POLICY_OPTIONS = {
+        "Παλαιότερη πρώτα": WAVE_POLICY_OLDEST,
+        "Βαθμίδα συμβολαίου": WAVE_POLICY_CONTRACT,
+    }
     def __init__(self, parent, controller):
         super().__init__(parent, style="Card.TFrame")
         self.controller = controller
@@ -129,6 +134,19 @@ class ScreenWarehouseOrders(ttk.Frame):
         filter_combo.pack(side="left", padx=(10, 0))
         filter_combo.bind("<<ComboboxSelected>>", lambda *_: self.refresh())
 
+        # Η προτεραιότητα χρησιμοποιείται όταν αποστέλλονται πολλές επιλεγμένες παραγγελίες μαζί.
+        ttk.Label(filter_frame, text="Προτεραιότητα αποστολής", style="Label.TLabel").pack(side="left", padx=(30, 0))
+        policy_labels = list(self.WAVE_POLICY_OPTIONS)
+        self.wave_policy = tk.StringVar(value=policy_labels[0])
+        ttk.Combobox(
+            filter_frame,
+            values=policy_labels,
+            state="readonly",
+            width=22,
+            textvariable=self.wave_policy,
+            style="Modern.TCombobox",
+        ).pack(side="left", padx=(10, 0))
+
         tree_frame = ttk.Frame(self, style="Card.TFrame")
         tree_frame.pack(fill="both", expand=True, padx=40, pady=(0, 40))
 
@@ -142,7 +160,7 @@ class ScreenWarehouseOrders(ttk.Frame):
             "col_total",
             "col_status",
         )
-        self.tree = ttk.Treeview(tree_frame, columns=columns, show="headings", selectmode="browse")
+        self.tree = ttk.Treeview(tree_frame, columns=columns, show="headings", selectmode="extended")
 
         self.tree.heading("col_main", text="ID Παραγγελίας / Φάρμακο")
         self.tree.heading("col_pharm", text="Φαρμακείο")
@@ -163,7 +181,6 @@ class ScreenWarehouseOrders(ttk.Frame):
         self.tree.column("col_status", width=160, anchor="center", stretch=False)
 
         sb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=sb.set)
         self.tree.pack(side="left", fill="both", expand=True)
         sb.pack(side="right", fill="y")
         enable_vertical_scroll(self.tree)
@@ -173,6 +190,18 @@ class ScreenWarehouseOrders(ttk.Frame):
         self.tree.bind("<<TreeviewSelect>>", self.on_order_select)
         self.selected_order_id = None
         self.order_items = {}
+        # Οι παραγγελίες φορτώνονται ανά σελίδα με το scroll και τα προϊόντα τους όταν ανοίξουν/επιλεγούν.
+        self.loader = LazyOrderTree(
+            self.tree,
+            controller,
+            key="warehouse-orders",
+            fetch_page=self._fetch_page,
+            parent_values=self._order_values,
+            fetch_children=lambda order: WarehouseRepository.fetch_order_items(order["order_id"]),
+            child_values=self._item_values,
+            on_children_loaded=self._on_items_loaded,
+            scrollbar=sb,
+        )
 
     def _normalize_order_id(self, raw_value):
         """Μετατρέπει display string (#123) σε ακέραιο ID παραγγελίας."""
@@ -188,54 +217,52 @@ class ScreenWarehouseOrders(ttk.Frame):
             return None
 
     def refresh(self):
-        """Ανανεώνει τη λίστα παραγγελιών και κρατά mapping προϊόντων ανά ID."""
-        self.tree.delete(*self.tree.get_children())
+        """Ξαναφορτώνει από την αρχή (σελίδα-σελίδα) τις παραγγελίες για το επιλεγμένο φίλτρο."""
         self.order_items = {}
         self.selected_order_id = None
         self.auto_order_btn.pack_forget()
+        self.loader.reset()
 
+    def _fetch_page(self, cursor):
+        """Τρέχει στο παρασκήνιο: μία σελίδα παραγγελιών για το φίλτρο κατάστασης."""
         selected_status = self.status_filter.get() if hasattr(self, "status_filter") else "Όλες"
-        with self.controller.busy_cursor():
-            orders = WarehouseRepository.fetch_pharmacy_orders(selected_status)
-        for order in orders:
-            display_status = order["katastasi"]
-            date_display = order["executed_at"].strftime("%d/%m/%Y %H:%M") if order["executed_at"] else "-"
-            parent_id = self.tree.insert(
-                "",
-                "end",
-                values=(
-                    f"#{order['order_id']}",
-                    order["pharmacy"],
-                    date_display,
-                    "-",
-                    "-",
-                    "-",
-                    f"{order['arxiko_kostos']:.2f} €",
-                    display_status,
-                ),
-                tags=("parent",),
-                open=False,
-            )
-            self.order_items[order["order_id"]] = order["items"]
-
-            for item in order["items"]:
-                row_total = float(item["temaxia_zitisis"]) * float(item["arx_kostos_temaxiou"])
-                self.tree.insert(
-                    parent_id,
-                    "end",
-                    values=(
-                        f"  ↳ {item['onoma']}",
-                        "",
-                        "",
-                        item["temaxia_zitisis"],
-                        item.get("available", 0),
-                        item.get("shipped_qty", 0),
-                        f"{row_total:.2f} €",
-                        "",
-                    ),
-                    tags=("child",),
-                )
-        apply_treeview_striping(self.tree)
+        return WarehouseRepository.fetch_pharmacy_orders(selected_status, cursor=cursor)
+
+    @staticmethod
+    def _order_values(order):
+        """Τιμές της γονικής γραμμής μιας παραγγελίας."""
+        date_display = order["executed_at"].strftime("%d/%m/%Y %H:%M") if order["executed_at"] else "-"
+        return (
+            f"#{order['order_id']}",
+            order["pharmacy"],
+            date_display,
+            "-",
+            "-",
+            "-",
+            f"{order['arxiko_kostos']:.2f} €",
+            order["katastasi"],
+        )
+
+    @staticmethod
+    def _item_values(item):
+        """Τιμές της γραμμής ενός προϊόντος κάτω από την παραγγελία."""
+        row_total = float(item["temaxia_zitisis"]) * float(item["arx_kostos_temaxiou"])
+        return (
+            f"  ↳ {item['onoma']}",
+            "",
+            "",
+            item["temaxia_zitisis"],
+            item.get("available", 0),
+            item.get("shipped_qty", 0),
+            f"{row_total:.2f} €",
+            "",
+        )
+
+    def _on_items_loaded(self, item_id, items):
+        """Κρατά mapping προϊόντων ανά ID παραγγελίας για τον έλεγχο ελλείψεων."""
+        order = self.loader.row_for(item_id)
+        if order is not None:
+            self.order_items[order["order_id"]] = items
 
     def auto_order_missing(self):
         """Δημιουργεί αυτόματα παραγγελία προς προμηθευτές για τα ελλείποντα προϊόντα."""
@@ -293,6 +320,13 @@ class ScreenWarehouseOrders(ttk.Frame):
             messagebox.showwarning("Προσοχή", "Μη έγκυρο ID παραγγελίας.")
             return
         self.selected_order_id = order_id
+        # Τα προϊόντα φέρνονται μόνο για την επιλεγμένη παραγγελία (αν δεν έχουν ήδη φορτωθεί).
+        self.loader.load_children(item_id, callback=lambda _items: self._update_auto_order_button(order_id))
+
+    def _update_auto_order_button(self, order_id):
+        """Εμφανίζει το κουμπί αυτόματης προμήθειας αν η επιλεγμένη παραγγελία έχει ελλείψεις."""
+        if order_id != self.selected_order_id:
+            return
         if self._order_has_shortage(order_id):
             if not self.auto_order_btn.winfo_ismapped():
                 self.auto_order_btn.pack(side="left")
@@ -316,18 +350,45 @@ class ScreenWarehouseOrders(ttk.Frame):
         self._set_status("Σε επεξεργασία")
 
     def send_selected_order(self):
-        """Καλεί την επιχειρησιακή λογική αποστολής μειώνοντας απόθεμα."""
-        selection = self._get_selected_order()
-        if not selection:
+        """Καλεί την επιχειρησιακή λογική αποστολής μειώνοντας απόθεμα (μία ή πολλές παραγγελίες)."""
+        order_ids = self._get_selected_order_ids()
+        if not order_ids:
             return
-        _, order_id = selection
+        if len(order_ids) == 1:
+            with self.controller.busy_cursor():
+                success, msg = WarehouseRepository.send_order(order_ids[0])
+            if success:
+                messagebox.showinfo("Επιτυχία", msg)
+                self.refresh()
+            else:
+                messagebox.showwarning("Προσοχή", msg)
+            return
+
+        policy = self.WAVE_POLICY_OPTIONS.get(self.wave_policy.get(), WAVE_POLICY_OLDEST)
         with self.controller.busy_cursor():
-            success, msg = WarehouseRepository.send_order(order_id)
-        if success:
-            messagebox.showinfo("Επιτυχία", msg)
-            self.refresh()
+            results = WarehouseRepository.send_orders(order_ids, policy=policy)
+        sent = [order_id for order_id, (success, _) in results.items() if success]
+        failed = [f"#{order_id}: {msg}" for order_id, (success, msg) in sorted(results.items()) if not success]
+        summary = f"Αποστάλθηκαν {len(sent)} από {len(order_ids)} παραγγελίες."
+        if failed:
+            messagebox.showwarning("Αποστολή", summary + "\n\n" + "\n".join(failed))
         else:
-            messagebox.showwarning("Προσοχή", msg)
+            messagebox.showinfo("Επιτυχία", summary)
+        if sent:
+            self.refresh()
+
+    def _get_selected_order_ids(self):
+        """Επιστρέφει τα IDs όλων των επιλεγμένων γονικών γραμμών (οι γραμμές προϊόντων αγνοούνται)."""
+        order_ids = []
+        for item_id in self.tree.selection():
+            if "parent" not in self.tree.item(item_id, "tags"):
+                continue
+            order_id = self._normalize_order_id(self.tree.item(item_id, "values")[0])
+            if order_id is not None and order_id not in order_ids:
+                order_ids.append(order_id)
+        if not order_ids:
+            messagebox.showwarning("Προσοχή", "Επιλέξτε μία ή περισσότερες παραγγελίες (γονικές γραμμές).")
+        return order_ids
 
     def _get_selected_order(self):
         """Επιστρέφει το tuple (item_id, order_id) όταν έχει επιλεγεί γονική εγγραφή."""
@@ -478,46 +539,50 @@ class ScreenSupplierOrders(ttk.Frame):
         self.tree.column("col_status", width=170, anchor="center", stretch=False)
 
         sb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=sb.set)
         self.tree.pack(side="left", fill="both", expand=True)
         sb.pack(side="right", fill="y")
         enable_vertical_scroll(self.tree)
 
         self.tree.tag_configure("parent", font=("Segoe UI", 10, "bold"))
         self.tree.tag_configure("child", font=("Segoe UI", 10))
+        # Οι παραγγελίες έρχονται ανά σελίδα με το scroll και τα προϊόντα τους μόνο όταν ανοίξουν.
+        self.loader = LazyOrderTree(
+            self.tree,
+            controller,
+            key="supplier-orders",
+            fetch_page=self._fetch_page,
+            parent_values=self._order_values,
+            fetch_children=lambda order: WarehouseRepository.fetch_supplier_order_items(order["supplier_order_id"]),
+            child_values=self._item_values,
+            scrollbar=sb,
+        )
 
     def refresh(self):
-        """Ανανεώνει τα δεδομένα JSON και εμπλουτίζει με ονόματα προϊόντων."""
-        self.tree.delete(*self.tree.get_children())
+        """Ξαναφορτώνει από την αρχή (σελίδα-σελίδα) τις παραγγελίες προμηθευτών για το επιλεγμένο φίλτρο."""
+        self.loader.reset()
 
+    def _fetch_page(self, cursor):
+        """Τρέχει στο παρασκήνιο: μία σελίδα παραγγελιών προμηθευτών για το φίλτρο κατάστασης."""
         selected_status = self.status_filter.get() if hasattr(self, "status_filter") else "Όλες"
-        with self.controller.busy_cursor():
-            orders = WarehouseRepository.fetch_supplier_orders(selected_status)
-        for order in orders:
-            display_id = f"#SUP-{order['supplier_order_id']}"
-            created_at = order["created_at"].strftime("%d/%m/%Y %H:%M") if order["created_at"] else "-"
-            parent_id = self.tree.insert(
-                "",
-                "end",
-                values=(
-                    display_id,
-                    created_at,
-                    "-",
-                    f"{order['total_cost']:.2f} €",
-                    order["status"],
-                ),
-                tags=("parent",),
-                open=False,
-            )
-            for item in order["items"]:
-                row_total = float(item["quantity"]) * float(item["unit_price"])
-                self.tree.insert(
-                    parent_id,
-                    "end",
-                    values=(f"  ↳ {item['onoma']}", "", item["quantity"], f"{row_total:.2f} €", ""),
-                    tags=("child",),
-                )
-        apply_treeview_striping(self.tree)
+        return WarehouseRepository.fetch_supplier_orders(selected_status, cursor=cursor)
+
+    @staticmethod
+    def _order_values(order):
+        """Τιμές της γονικής γραμμής μιας παραγγελίας προμηθευτή."""
+        created_at = order["created_at"].strftime("%d/%m/%Y %H:%M") if order["created_at"] else "-"
+        return (
+            f"#SUP-{order['supplier_order_id']}",
+            created_at,
+            "-",
+            f"{order['total_cost']:.2f} €",
+            order["status"],
+        )
+
+    @staticmethod
+    def _item_values(item):
+        """Τιμές της γραμμής ενός προϊόντος κάτω από την παραγγελία προμηθευτή."""
+        row_total = float(item["quantity"]) * float(item["unit_price"])
+        return (f"  ↳ {item['onoma']}", "", item["quantity"], f"{row_total:.2f} €", "")
 
     def mark_complete(self):
         """Σημειώνει την επιλεγμένη προμήθεια ως ολοκληρωμένη και ενημερώνει το UI."""
@@ -0,0 +1,252 @@
+"""Ευρετήριο αναζήτησης προϊόντων με trigrams (ελληνικά/λατινικά χωρίς τόνους).
+
+Η κατάταξη ακολουθεί τη συμπεριφορά της οθόνης παραγγελίας:
+1. προϊόντα που περιέχουν το query στο όνομα (με τη σειρά του καταλόγου),
+2. προϊόντα που το περιέχουν στην εταιρεία ή στην κατηγορία,
+3. fuzzy ταιριάσματα ονόματος με SequenceMatcher ratio >= fuzzy_threshold, φθίνουσα κατά ratio.
+Το inverted index απαντά τα ταιριάσματα υποσυμβολοσειράς χωρίς σάρωση. Για το fuzzy οι υποψήφιοι
+περιορίζονται μόνο με ασφαλή άνω φράγματα του ratio (quick_ratio, LCS), ώστε να μη χάνεται κανένα ratio >= όριο·
+το quick_ratio υπολογίζεται για όλα τα προϊόντα μαζί με bitsets (ένα bit ανά προϊόν) και οι υποψήφιοι
+εξετάζονται από το μεγαλύτερο φράγμα προς το μικρότερο, ώστε το top-k να σταματά νωρίς.
+"""
+
+import copy
+import heapq
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+_COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+_NONZERO_BYTES = bytes([0] + [1] * 255)
+# Οι θέσεις των άσσων κάθε τιμής byte, για γρήγορη απαρίθμηση των bits ενός bitset.
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def fold(text):
+    """Πεζά χωρίς τόνους/διαλυτικά, με το τελικό ς ως σ, ώστε 'Ασπιρίνη' == 'ασπιρινη'."""
+    stripped = _COMBINING_MARKS.sub("", unicodedata.normalize("NFD", text or ""))
+    return stripped.lower().replace("ς", "σ")
+
+
+def trigrams(text):
+    """Τα διακριτά τριγράμματα ενός (ήδη folded) κειμένου."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _bit_positions(mask):
+    """Οι θέσεις των bits του mask σε αύξουσα σειρά (τα μη μηδενικά bytes βρίσκονται με find σε C)."""
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    nonzero = data.translate(_NONZERO_BYTES)
+    offset = nonzero.find(1)
+    while offset >= 0:
+        for bit in _BYTE_BITS[data[offset]]:
+            yield offset * 8 + bit
+        offset = nonzero.find(1, offset + 1)
+
+
+def _bitsets(positions_by_key, size):
+    """Μετατρέπει {κλειδί: [θέσεις]} σε {κλειδί: int} με ένα bit ανά θέση."""
+    bitsets = {}
+    for key, positions in positions_by_key.items():
+        data = bytearray((size + 7) // 8)
+        for position in positions:
+            data[position >> 3] |= 1 << (position & 7)
+        bitsets[key] = int.from_bytes(data, "little")
+    return bitsets
+
+
+def _bitsliced_equal(counts, value, all_bits):
+    """Bitset των προϊόντων όπου ο bit-sliced μετρητής `counts` ισούται με `value`."""
+    mask = all_bits
+    for bit, current in enumerate(counts):
+        mask &= current if value >> bit & 1 else current ^ all_bits
+    return mask
+
+
+class ProductSearchIndex:
+    """Προϋπολογισμένο inverted index πάνω σε όνομα, εταιρεία και κατηγορία προϊόντων."""
+
+    def __init__(self, products, fuzzy_threshold=0.7):
+        self.products = products
+        self.fuzzy_threshold = fuzzy_threshold
+        self._names = []
+        self._extras = []
+        self._name_postings = defaultdict(list)
+        self._extra_postings = defaultdict(list)
+        for position, product in enumerate(products):
+            name = fold(product["onoma"])
+            extra = fold(f"{product.get('etairia') or ''} {product.get('katigoria') or ''}")
+            self._names.append(name)
+            self._extras.append(extra)
+            for gram in trigrams(name):
+                self._name_postings[gram].append(position)
+            for gram in trigrams(extra):
+                self._extra_postings[gram].append(position)
+        # Bitsets για το fuzzy, με τα ονόματα ταξινομημένα κατά μήκος: κάθε μήκος είναι ένα συνεχές διάστημα
+        # bits (_length_ranges) και κάθε (χαρακτήρας c, n) ένα bitset "έχει τουλάχιστον n φορές τον c".
+        self._fuzzy_order = sorted(range(len(products)), key=lambda position: len(self._names[position]))
+        self._length_ranges = {}
+        by_char_count = defaultdict(list)
+        for bit, position in enumerate(self._fuzzy_order):
+            name = self._names[position]
+            start, _ = self._length_ranges.get(len(name), (bit, bit))
+            self._length_ranges[len(name)] = (start, bit + 1)
+            for char, count in Counter(name).items():
+                for nth in range(1, count + 1):
+                    by_char_count[char, nth].append(bit)
+        self._char_bits = _bitsets(by_char_count, len(products))
+        self._all_bits = (1 << len(products)) - 1
+
+    def __len__(self):
+        return len(self.products)
+
+    def for_products(self, products):
+        """Το ίδιο ευρετήριο πάνω σε νέα λίστα με τα ίδια κείμενα στις ίδιες θέσεις, αλλιώς None.
+
+        Η cache καταλόγου δίνει νέα λίστα και όταν αλλάζει μόνο το απόθεμα· τότε δεν χρειάζεται νέο χτίσιμο.
+        """
+        if len(products) != len(self.products):
+            return None
+        for old, new in zip(self.products, products):
+            if old is not new and any(old.get(field) != new.get(field) for field in ("onoma", "etairia", "katigoria")):
+                return None
+        index = copy.copy(self)
+        index.products = products
+        return index
+
+    def search(self, query, limit=None):
+        """Επιστρέφει τα προϊόντα που ταιριάζουν, ταξινομημένα όπως περιγράφει το module docstring."""
+        query = fold((query or "").strip())
+        if not query:
+            return []
+        grams = trigrams(query)
+
+        ranked = self._substring_hits(query, grams, self._names, self._name_postings, limit=limit)
+        if limit is not None and len(ranked) >= limit:
+            return [self.products[position] for position in ranked]
+
+        seen = set(ranked)
+        remaining = None if limit is None else limit - len(ranked)
+        extra_hits = self._substring_hits(query, grams, self._extras, self._extra_postings, seen, remaining)
+        ranked.extend(extra_hits)
+        if limit is not None and len(ranked) >= limit:
+            return [self.products[position] for position in ranked]
+
+        seen.update(extra_hits)
+        fuzzy = self._fuzzy_hits(query, seen, None if limit is None else limit - len(ranked))
+        ranked.extend(position for _, position in fuzzy)
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self.products[position] for position in ranked]
+
+    def suggest(self, query, limit=5):
+        """Ονόματα για τη λίστα προτάσεων κάτω από το πεδίο αναζήτησης."""
+        return [product["onoma"] for product in self.search(query, limit=limit)]
+
+    def _substring_hits(self, query, grams, texts, postings, exclude=(), limit=None):
+        """Θέσεις (αύξουσες, έως `limit`) όπου το query εμφανίζεται αυτούσιο, εκτός όσων είναι στο `exclude`.
+
+        Κάθε τέτοιο κείμενο περιέχει όλα τα trigrams του query, οπότε αρκεί να σαρωθεί η μικρότερη posting
+        list (ταξινομημένη, αφού χτίζεται με τη σειρά του καταλόγου) με επιβεβαίωση `in`.
+        """
+        if grams:
+            candidates = min((postings.get(gram, ()) for gram in grams), key=len)
+        else:
+            # Πολύ σύντομο query (1-2 χαρακτήρες): απλό scan, το `in` σε str είναι φθηνό.
+            candidates = range(len(texts))
+        hits = []
+        for position in candidates:
+            if position in exclude or query not in texts[position]:
+                continue
+            hits.append(position)
+            if limit is not None and len(hits) >= limit:
+                break
+        return hits
+
+    def _fuzzy_hits(self, query, exclude, limit=None):
+        """Fuzzy ταιριάσματα ονόματος [(ratio, position)] με ratio >= fuzzy_threshold, φθίνουσα σειρά.
+
+        Ελέγχονται όλα τα ονόματα που περνούν το quick_ratio (όχι μόνο όσα μοιράζονται trigram με το query:
+        ένα λάθος γράμμα στη μέση μιας σύντομης λέξης, π.χ. "xamax", δεν αφήνει κανένα κοινό). Τα blocks του
+        SequenceMatcher είναι κοινή υπακολουθία, οπότε και το 2 * LCS / (|query| + |όνομα|) είναι άνω φράγμα
+        του ratio· υπολογίζεται φθηνά (bit-parallel) και το ratio τρέχει κατά φθίνον φράγμα. Με `limit`
+        επιστρέφονται τα `limit` καλύτερα και η εξέταση σταματά όταν κανένα φράγμα δεν φτάνει το χειρότερο τους.
+        """
+        threshold = self.fuzzy_threshold
+        cells = self._fuzzy_cells(query)
+        counts = self._common_char_counts(query)
+        equal = {}
+        query_bits = {}
+        for offset, char in enumerate(query):
+            query_bits[char] = query_bits.get(char, 0) | 1 << offset
+        query_mask = (1 << len(query)) - 1
+        query_bit = query_bits.get
+        hits = []
+        best = []
+        pending = []
+        matcher = SequenceMatcher(None, query, "")
+        next_cell = 0
+        while True:
+            cell_bound = cells[next_cell][0] if next_cell < len(cells) else -1.0
+            if pending and -pending[0][0] >= cell_bound:
+                bound, position = heapq.heappop(pending)
+                if limit is not None and len(best) >= limit and -bound < best[0]:
+                    break
+                matcher.set_seq2(self._names[position])
+                ratio = matcher.ratio()
+                if ratio >= threshold:
+                    hits.append((ratio, position))
+                    if limit is not None:
+                        (heapq.heappush if len(best) < limit else heapq.heappushpop)(best, ratio)
+                continue
+            if next_cell >= len(cells) or (limit is not None and len(best) >= limit and cell_bound < best[0]):
+                break
+            _, length, common = cells[next_cell]
+            next_cell += 1
+            if common not in equal:
+                equal[common] = _bitsliced_equal(counts, common, self._all_bits)
+            start, stop = self._length_ranges[length]
+            for bit in _bit_positions((equal[common] >> start) & ((1 << (stop - start)) - 1)):
+                position = self._fuzzy_order[start + bit]
+                if position in exclude:
+                    continue
+                name = self._names[position]
+                # LCS με bit-parallel αλγόριθμο (Allison-Dix): τα μηδενικά bits του row είναι το μήκος του.
+                row = query_mask
+                for char in name:
+                    matched = row & query_bit(char, 0)
+                    row = (row + matched) | (row - matched)
+                bound = 2.0 * (len(query) - (row & query_mask).bit_count()) / (len(query) + length)
+                if bound >= threshold:
+                    heapq.heappush(pending, (-bound, position))
+        hits.sort(key=lambda hit: (-hit[0], hit[1]))
+        return hits if limit is None else hits[:limit]
+
+    def _fuzzy_cells(self, query):
+        """Ομάδες [(φράγμα, μήκος ονόματος, κοινοί χαρακτήρες)] με quick_ratio >= fuzzy_threshold, φθίνουσες."""
+        cells = []
+        for length in self._length_ranges:
+            for common in range(min(len(query), length) + 1):
+                # Ίδιος τύπος με το difflib ώστε η σύγκριση με το όριο να είναι ακριβώς η ίδια.
+                bound = 2.0 * common / (len(query) + length)
+                if bound >= self.fuzzy_threshold:
+                    cells.append((bound, length, common))
+        cells.sort(key=lambda cell: -cell[0])
+        return cells
+
+    def _common_char_counts(self, query):
+        """Οι κοινοί χαρακτήρες (min των πληθών ανά χαρακτήρα) query/ονόματος, για όλα τα προϊόντα μαζί.
+
+        Bit-sliced μετρητής: το στοιχείο i έχει το bit i του πλήθους κάθε προϊόντος. Κάθε χαρακτήρας του
+        query προσθέτει το bitset "έχει τουλάχιστον n φορές αυτόν τον χαρακτήρα".
+        """
+        counts = [0] * len(query).bit_length()
+        for char, count in Counter(query).items():
+            for nth in range(1, count + 1):
+                carry = self._char_bits.get((char, nth), 0)
+                for bit, current in enumerate(counts):
+                    if not carry:
+                        break
+                    counts[bit], carry = current ^ carry, current & carry
+        return counts
@@ -0,0 +1,86 @@
+-- ==========================================================
+-- Αναβαθμίσεις για βάσεις που δημιουργήθηκαν με παλαιότερο schema.sql.
+-- Το schema.sql ξαναφτιάχνει τη βάση από το μηδέν· εδώ υπάρχουν μόνο οι
+-- αλλαγές, με τη σειρά που προστέθηκαν. Τρέξε όσες λείπουν από τη βάση σου.
+-- ==========================================================
+
+USE farmakeio_db;
+
+-- 1) Συνολικό απόθεμα ανά προϊόν (μετά: python3 maintenance.py stock-totals --repair)
+CREATE TABLE IF NOT EXISTS PROION_SYNOLIKO_APOTHEMA (
+  product_id    INT PRIMARY KEY,
+  qty_in_stock  INT NOT NULL DEFAULT 0,
+  CONSTRAINT fk_psa_proion
+    FOREIGN KEY (product_id) REFERENCES PROION(product_id)
+    ON DELETE RESTRICT ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+-- 2) Χρονοσφραγίδες αλλαγής για το token έκδοσης της cache καταλόγου
+ALTER TABLE PROION
+  ADD COLUMN enimerothike TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+  ADD KEY idx_proion_enimerothike (enimerothike);
+ALTER TABLE PROION_SYNOLIKO_APOTHEMA
+  ADD COLUMN enimerothike TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+  ADD KEY idx_psa_enimerothike (enimerothike);
+
+-- 3) Σύνθετα indexes για keyset σελιδοποίηση των λιστών παραγγελιών
+ALTER TABLE PARAGGELIA
+  ADD KEY idx_paraggelia_afm_date (afm_farmakeiou, hm_ora_ektelesis, order_id),
+  ADD KEY idx_paraggelia_afm_status_date (afm_farmakeiou, katastasi, hm_ora_ektelesis, order_id),
+  ADD KEY idx_paraggelia_date_id (hm_ora_ektelesis, order_id),
+  DROP INDEX idx_paraggelia_status_date,
+  ADD KEY idx_paraggelia_status_date (katastasi, hm_ora_ektelesis, order_id);
+
+-- 4) Τελευταία αποστολή ανά παραγγελία (μετά: python3 maintenance.py latest-shipments)
+ALTER TABLE PARAGGELIA
+  ADD COLUMN teleftaia_apostoli_id          INT NULL,
+  ADD COLUMN hm_ora_teleftaias_apostolis    DATETIME NULL,
+  ADD COLUMN katastasi_teleftaias_apostolis ENUM('ΟΛΟΚΛΗΡΩΜΕΝΗ','ΜΕΡΙΚΗ') NULL;
+
+-- 5) Δεσμεύσεις αποθέματος και available-to-promise (μετά: python3 maintenance.py reservations --rebuild)
+ALTER TABLE PROION_SYNOLIKO_APOTHEMA
+  ADD COLUMN qty_desmeumeno INT NOT NULL DEFAULT 0 AFTER qty_in_stock,
+  ADD COLUMN qty_diathesimo INT AS (qty_in_stock - qty_desmeumeno) STORED AFTER qty_desmeumeno,
+  ADD KEY idx_psa_diathesimo (qty_diathesimo);
+CREATE TABLE IF NOT EXISTS PARAGGELIA_DESMEUSI (
+  order_id    INT,
+  product_id  INT,
+  temaxia     INT NOT NULL,
+  PRIMARY KEY (order_id, product_id),
+  KEY idx_desmeusi_product (product_id),
+  CONSTRAINT fk_desmeusi_order
+    FOREIGN KEY (order_id) REFERENCES PARAGGELIA(order_id)
+    ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT fk_desmeusi_product
+    FOREIGN KEY (product_id) REFERENCES PROION(product_id)
+    ON DELETE RESTRICT ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+-- 6) Free-list κενών θέσεων αποθήκης (έλεγχος: python3 maintenance.py free-positions)
+CREATE TABLE IF NOT EXISTS THESI_ELEFTHERI (
+  storage_id    INT,
+  ar_diadromou  INT,
+  ar_rafiou     INT,
+  PRIMARY KEY (storage_id, ar_diadromou, ar_rafiou),
+  CONSTRAINT fk_eleftheri_thesi
+    FOREIGN KEY (storage_id, ar_diadromou, ar_rafiou)
+    REFERENCES THESI_BRISKETAI_APOTHIKI(storage_id, ar_diadromou, ar_rafiou)
+    ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB;
+INSERT IGNORE INTO THESI_ELEFTHERI (storage_id, ar_diadromou, ar_rafiou)
+SELECT t.storage_id, t.ar_diadromou, t.ar_rafiou
+FROM THESI_BRISKETAI_APOTHIKI t
+LEFT JOIN PROION_YPARXEI_APOTHIKI_THESI p
+  ON p.storage_id = t.storage_id
+ AND p.ar_diadromou = t.ar_diadromou
+ AND p.ar_rafiou = t.ar_rafiou
+WHERE p.product_id IS NULL;
+
+-- 7) Ένας κοινός placeholder προμηθευτής αντί για μία γραμμή PROMITHEYTIS ανά γραμμή παραγγελίας
+--    (μετά, μία φορά: python3 maintenance.py compact-suppliers)
+ALTER TABLE PROMITHEYTIS
+  ADD KEY idx_promitheytis_onoma (onoma, tilefono);
+
+-- 8) Index για τη σελιδοποιημένη λίστα παραγγελιών προμηθευτών με φίλτρο κατάστασης
+ALTER TABLE BACKORDER
+  ADD KEY idx_backorder_storage_status (storage_id, oloklirothike, backorder_id);
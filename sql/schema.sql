@@ -54,7 +54,10 @@ CREATE TABLE PROION (
   etairia              VARCHAR(120),
   periektikotita       FLOAT,
   onoma                VARCHAR(180),
-  arx_kostos_temaxiou  DECIMAL(10,2)
+  arx_kostos_temaxiou  DECIMAL(10,2),
+  -- Χρονοσφραγίδα αλλαγής: το MAX της είναι το φθηνό token έκδοσης καταλόγου (catalog.py).
+  enimerothike         TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+  KEY idx_proion_enimerothike (enimerothike)
 ) ENGINE=InnoDB;
 
 CREATE TABLE PARAFARMAKO (
@@ -105,6 +108,20 @@ CREATE TABLE THESI_BRISKETAI_APOTHIKI (
     ON DELETE RESTRICT ON UPDATE CASCADE
 ) ENGINE=InnoDB;
 
+-- Free-list θέσεων: μία γραμμή για κάθε θέση χωρίς προϊόν. Η εφαρμογή την ενημερώνει στην ίδια
+-- συναλλαγή με κάθε αλλαγή της PROION_YPARXEI_APOTHIKI_THESI (παίρνει θέση στην τοποθέτηση νέας SKU,
+-- την επιστρέφει όταν αδειάσει). Έλεγχος/ανακατασκευή: python3 maintenance.py free-positions [--repair]
+CREATE TABLE THESI_ELEFTHERI (
+  storage_id    INT,
+  ar_diadromou  INT,
+  ar_rafiou     INT,
+  PRIMARY KEY (storage_id, ar_diadromou, ar_rafiou),
+  CONSTRAINT fk_eleftheri_thesi
+    FOREIGN KEY (storage_id, ar_diadromou, ar_rafiou)
+    REFERENCES THESI_BRISKETAI_APOTHIKI(storage_id, ar_diadromou, ar_rafiou)
+    ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
 CREATE TABLE PROION_YPARXEI_APOTHIKI_THESI (
   product_id    INT,
   storage_id    INT,
@@ -121,6 +138,24 @@ CREATE TABLE PROION_YPARXEI_APOTHIKI_THESI (
     ON DELETE RESTRICT ON UPDATE CASCADE
 ) ENGINE=InnoDB;
 
+-- Συνολικό απόθεμα ανά προϊόν. Ενημερώνεται από την εφαρμογή στην ίδια συναλλαγή με κάθε
+-- αλλαγή της PROION_YPARXEI_APOTHIKI_THESI ώστε οι κατάλογοι να μη κάνουν SUM σε όλες τις θέσεις.
+-- Έλεγχος/ανακατασκευή: python3 maintenance.py stock-totals [--repair]
+CREATE TABLE PROION_SYNOLIKO_APOTHEMA (
+  product_id    INT PRIMARY KEY,
+  qty_in_stock  INT NOT NULL DEFAULT 0,
+  -- Τεμάχια δεσμευμένα από εκκρεμείς παραγγελίες (SUM της PARAGGELIA_DESMEUSI ανά προϊόν).
+  qty_desmeumeno INT NOT NULL DEFAULT 0,
+  -- Available-to-promise: ό,τι δεν έχει δεσμευτεί, με index για ελλείψεις/ETA χωρίς σάρωση παραγγελιών.
+  qty_diathesimo INT AS (qty_in_stock - qty_desmeumeno) STORED,
+  enimerothike  TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+  KEY idx_psa_enimerothike (enimerothike),
+  KEY idx_psa_diathesimo (qty_diathesimo),
+  CONSTRAINT fk_psa_proion
+    FOREIGN KEY (product_id) REFERENCES PROION(product_id)
+    ON DELETE RESTRICT ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
 -- ======================
 -- BACKORDER
 -- ======================
@@ -146,7 +181,14 @@ CREATE TABLE PARAGGELIA (
   ekptosi            DECIMAL(10,2),
   afm_farmakeiou     VARCHAR(15),
   hm_ora_ektelesis   DATETIME,
+  -- Τελευταία αποστολή (προϋπολογισμένη από κάθε νέα αποστολή) για το ιστορικό.
+  teleftaia_apostoli_id          INT NULL,
+  hm_ora_teleftaias_apostolis    DATETIME NULL,
+  katastasi_teleftaias_apostolis ENUM('ΟΛΟΚΛΗΡΩΜΕΝΗ','ΜΕΡΙΚΗ') NULL,
   KEY idx_paraggelia_afm (afm_farmakeiou),
+  -- Keyset σελιδοποίηση ιστορικού ανά φαρμακείο (ORDER_HISTORY / ORDER_HISTORY_BY_STATUS).
+  KEY idx_paraggelia_afm_date (afm_farmakeiou, hm_ora_ektelesis, order_id),
+  KEY idx_paraggelia_afm_status_date (afm_farmakeiou, katastasi, hm_ora_ektelesis, order_id),
   CONSTRAINT fk_paraggelia_farmakeio
     FOREIGN KEY (afm_farmakeiou) REFERENCES FARMAKEIO(afm)
     ON DELETE RESTRICT ON UPDATE CASCADE
@@ -210,6 +252,23 @@ CREATE TABLE PARAGGELEIA_PERIEXEI_PROION (
     ON DELETE RESTRICT ON UPDATE CASCADE
 ) ENGINE=InnoDB;
 
+-- Δεσμεύσεις αποθέματος ανά παραγγελία/προϊόν: γράφονται στο create_order (έως το διαθέσιμο),
+-- καταναλώνονται στην αποστολή και απελευθερώνονται στην ακύρωση.
+-- Έλεγχος/ανακατασκευή: python3 maintenance.py reservations [--repair | --rebuild]
+CREATE TABLE PARAGGELIA_DESMEUSI (
+  order_id    INT,
+  product_id  INT,
+  temaxia     INT NOT NULL,
+  PRIMARY KEY (order_id, product_id),
+  KEY idx_desmeusi_product (product_id),
+  CONSTRAINT fk_desmeusi_order
+    FOREIGN KEY (order_id) REFERENCES PARAGGELIA(order_id)
+    ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT fk_desmeusi_product
+    FOREIGN KEY (product_id) REFERENCES PROION(product_id)
+    ON DELETE RESTRICT ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
 CREATE TABLE APOSTOLI_PERIEXEI_PROION (
   shipment_id        INT,
   product_id         INT,
@@ -258,7 +317,8 @@ CREATE INDEX idx_pyat_product ON PROION_YPARXEI_APOTHIKI_THESI (product_id);
 CREATE INDEX idx_pyat_product_qty ON PROION_YPARXEI_APOTHIKI_THESI (product_id, qty_in_stock);
 
 CREATE INDEX idx_paraggelia_items_product ON PARAGGELEIA_PERIEXEI_PROION (product_id);
-CREATE INDEX idx_paraggelia_status_date ON PARAGGELIA (katastasi, hm_ora_ektelesis);
+CREATE INDEX idx_paraggelia_status_date ON PARAGGELIA (katastasi, hm_ora_ektelesis, order_id);
+CREATE INDEX idx_paraggelia_date_id ON PARAGGELIA (hm_ora_ektelesis, order_id);
 
 CREATE INDEX idx_apostoli_items_product ON APOSTOLI_PERIEXEI_PROION (product_id);
 CREATE INDEX idx_apostoli_order_date ON APOSTOLI (order_id, hm_ora_apostolis);
@@ -266,5 +326,7 @@ CREATE INDEX idx_apostoli_order_date ON APOSTOLI (order_id, hm_ora_apostolis);
 CREATE INDEX idx_symbolaio_liksis ON SYMBOLAIO (hm_liksis);
 
 CREATE INDEX idx_promitheytis_products_product ON PROMITHEYTIS_PROMITHEYEI_PROION (product_id);
+CREATE INDEX idx_promitheytis_onoma ON PROMITHEYTIS (onoma, tilefono);
 
 CREATE INDEX idx_backorder_storage ON BACKORDER (storage_id);
+CREATE INDEX idx_backorder_storage_status ON BACKORDER (storage_id, oloklirothike, backorder_id);
@@ -0,0 +1,106 @@
+"""Εκτέλεση κλήσεων βάσης σε νήματα παρασκηνίου ώστε να μην παγώνει το παράθυρο Tk.
+
+Οι οθόνες υποβάλλουν μια συνάρτηση (συνήθως μέθοδο repository) και ένα callback. Η συνάρτηση τρέχει
+σε thread pool και το αποτέλεσμα παραδίδεται πίσω στο main thread μέσω `after()`, αφού το Tk δεν
+επιτρέπει πρόσβαση σε widgets από άλλα νήματα. Υποβολή με ίδιο `key` ακυρώνει την προηγούμενη
+(π.χ. διαδοχικά refresh της ίδιας οθόνης): αν δεν έχει ξεκινήσει δεν εκτελείται καθόλου, αλλιώς το
+αποτέλεσμά της απλώς αγνοείται.
+"""
+
+import queue
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+class TaskRunner:
+    """Thread pool με futures και παράδοση αποτελεσμάτων στο main loop του Tk."""
+
+    POLL_MS = 20
+
+    def __init__(self, root, max_workers=4):
+        self.root = root
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-task")
+        self._results = queue.Queue()
+        self._current = {}
+        self._pending = 0
+        self._polling = False
+        self._closed = False
+
+    @property
+    def pending(self):
+        """Πλήθος εργασιών που δεν έχουν παραδοθεί ακόμη στο UI."""
+        return self._pending
+
+    def submit(self, fn, *args, key=None, on_success=None, on_error=None, on_done=None, **kwargs):
+        """Υποβάλλει `fn(*args, **kwargs)` στο pool.
+
+        on_success(result) / on_error(exc) καλούνται στο main thread. on_done() καλείται πάντα μετά,
+        ακόμη και όταν η εργασία ακυρώθηκε ή αντικαταστάθηκε, ώστε να καθαρίζει π.χ. τον busy cursor.
+        """
+        if self._closed:
+            raise RuntimeError("Ο TaskRunner έχει τερματιστεί.")
+        if key is not None:
+            self.cancel(key)
+        future = self._executor.submit(fn, *args, **kwargs)
+        if key is not None:
+            self._current[key] = future
+        self._pending += 1
+        future.add_done_callback(
+            lambda done: self._results.put((key, done, on_success, on_error, on_done))
+        )
+        self._schedule_poll()
+        return future
+
+    def cancel(self, key):
+        """Ακυρώνει την τρέχουσα εργασία με αυτό το key (το αποτέλεσμά της δεν θα παραδοθεί)."""
+        future = self._current.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def shutdown(self):
+        """Σταματά την αποδοχή εργασιών και ακυρώνει όσες περιμένουν στην ουρά."""
+        self._closed = True
+        self._current.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule_poll(self):
+        if not self._polling and not self._closed:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        """Παραδίδει στο main thread όσα αποτελέσματα έχουν ολοκληρωθεί."""
+        self._polling = False
+        if self._closed:
+            return
+        while True:
+            try:
+                key, future, on_success, on_error, on_done = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            superseded = key is not None and self._current.get(key) is not future
+            if not superseded and key is not None:
+                del self._current[key]
+            try:
+                if not superseded and not future.cancelled():
+                    self._deliver(future, on_success, on_error)
+            except Exception as exc:  # noqa: BLE001 - ένα χαλασμένο callback δεν σταματά τα υπόλοιπα
+                self.root.report_callback_exception(type(exc), exc, exc.__traceback__)
+            finally:
+                if on_done:
+                    on_done()
+        if self._pending > 0:
+            self._schedule_poll()
+
+    def _deliver(self, future, on_success, on_error):
+        try:
+            result = future.result()
+        except CancelledError:
+            return
+        except Exception as exc:  # noqa: BLE001 - το σφάλμα περνά στον handler της οθόνης
+            if on_error is None:
+                raise
+            on_error(exc)
+            return
+        if on_success:
+            on_success(result)
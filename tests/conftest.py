@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Τα modules του project βρίσκονται στο root (χωρίς package), όπως τα εκτελεί το main.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
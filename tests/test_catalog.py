@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+
+import catalog
+from catalog import ProductCatalog
+from rows import compact_rows
+from search import ProductSearchIndex
+
+COLUMNS = ("product_id", "onoma", "katigoria", "arx_kostos_temaxiou", "etairia", "stock_qty", "available_qty")
+
+
+class _FakeDatabase:
+    """Απαντά στα CATALOG_VERSION / PHARMACY_PRODUCTS / STOCK_TOTALS_CHANGED_SINCE από λίστα στη μνήμη."""
+
+    def __init__(self):
+        self.products = {
+            1: ["Depon", "Αναλγητικά", 2.5, "Bristol", 10, 10],
+            2: ["Xanax", "Αγχολυτικά", 4.0, "Pfizer", 5, 5],
+            3: ["Ασπιρίνη", "Αναλγητικά", 3.0, "Bayer", 7, 7],
+        }
+        self.catalog_key = datetime(2026, 1, 1)
+        self.stock_key = datetime(2026, 1, 1)
+        self.changed = {}
+
+    def fetch_one(self, query, params=None, **_kwargs):
+        assert query.name == "CATALOG_VERSION"
+        return {
+            "max_product_id": max(self.products),
+            "product_count": len(self.products),
+            "catalog_key": self.catalog_key,
+            "stock_key": self.stock_key,
+        }
+
+    def fetch_all(self, query, params=None, **_kwargs):
+        if query.name == "PHARMACY_PRODUCTS":
+            rows = [(product_id, *values) for product_id, values in sorted(self.products.items())]
+            return compact_rows(query.name, COLUMNS, rows)
+        assert query.name == "STOCK_TOTALS_CHANGED_SINCE"
+        return [
+            {"product_id": product_id, "qty_in_stock": qty, "available": qty}
+            for product_id, qty in self.changed.items()
+        ]
+
+
+@pytest.fixture
+def database(monkeypatch):
+    fake = _FakeDatabase()
+    monkeypatch.setattr(catalog, "Database", fake)
+    ProductCatalog.invalidate()
+    yield fake
+    ProductCatalog.invalidate()
+
+
+def test_stock_change_swaps_in_new_rows(database):
+    before = ProductCatalog.products()
+    depon = before[0]
+    database.products[1][4] = 3
+    database.changed = {1: 3}
+    database.stock_key = datetime(2026, 1, 2)
+
+    after = ProductCatalog.products()
+    assert after is not before
+    assert depon["stock_qty"] == 10
+    assert after[0]["stock_qty"] == 3 and after[0]["available_qty"] == 3
+    assert after[1] is before[1]
+    assert ProductCatalog._by_id[1] is after[0]
+
+
+def test_deleted_product_triggers_reload(database):
+    assert len(ProductCatalog.products()) == 3
+    # Ούτε το MAX(product_id) ούτε το MAX(enimerothike) αλλάζουν όταν σβηστεί προϊόν από τη μέση.
+    del database.products[2]
+    assert [product["product_id"] for product in ProductCatalog.products()] == [1, 3]
+
+
+def test_search_index_survives_stock_only_refresh(database):
+    index = ProductSearchIndex(ProductCatalog.products())
+    database.changed = {2: 0}
+    database.stock_key = datetime(2026, 1, 2)
+    refreshed = ProductCatalog.products()
+    rebound = index.for_products(refreshed)
+    assert rebound is not None and rebound.products is refreshed
+    assert rebound.search("xanax")[0]["stock_qty"] == 0
+    renamed = [product.copy() for product in refreshed]
+    renamed[0]["onoma"] = "Depon Extra"
+    assert index.for_products(renamed) is None
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from domain import calculate_delivery_days, format_delivery_remaining
+from rows import compact_rows
+
+ORDER_ITEM_COLUMNS = (
+    "order_id",
+    "product_id",
+    "onoma",
+    "temaxia_zitisis",
+    "arx_kostos_temaxiou",
+    "available",
+    "shipped_qty",
+)
+
+
+def _compact_items(*tuples):
+    return compact_rows("ORDER_ITEMS_WITH_STOCK", ORDER_ITEM_COLUMNS, tuples)
+
+
+def test_delivery_days_same_for_compact_rows_and_dicts():
+    items = _compact_items((1, 5, "Depon", 3, 2.5, 10, 0), (1, 6, "Xanax", 4, 7.0, 1, 0))
+    as_dicts = [item.to_dict() for item in items]
+    assert calculate_delivery_days(items) == calculate_delivery_days(as_dicts)
+
+
+def test_history_eta_on_compact_rows():
+    now = datetime(2026, 1, 10, 12, 0)
+    items = _compact_items((1, 5, "Depon", 3, 2.5, 10, 0))
+    assert format_delivery_remaining(now, items, now=now) == "Σε 1 ημέρα"
+    assert format_delivery_remaining(now - timedelta(days=30), items, now=now) == "Παραδόθηκε"
+
+
+def test_tuple_items_still_supported():
+    assert calculate_delivery_days([(5, 3)], {5: 3}) == calculate_delivery_days([{"product_id": 5, "quantity": 3}], {5: 3})
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import models
+
+ORDERS = [
+    {"order_id": 1, "executed_at": datetime(2026, 1, 1)},
+    {"order_id": 2, "executed_at": None},
+    {"order_id": 3, "executed_at": datetime(2026, 1, 3)},
+    {"order_id": 4, "executed_at": datetime(2026, 1, 3)},
+    {"order_id": 5, "executed_at": None},
+    {"order_id": 6, "executed_at": datetime(2026, 1, 2)},
+    {"order_id": 7, "executed_at": None},
+]
+
+
+def _fake_fetch_all(query, params=None, **_kwargs):
+    """Εκτελεί στη μνήμη το keyset των WAREHOUSE_ORDERS(_UNDATED) πάνω στο ORDERS."""
+    if query.name == "WAREHOUSE_ORDERS":
+        after_at, _, after_id, limit = params
+        rows = [
+            row for row in ORDERS
+            if row["executed_at"] is not None
+            and (row["executed_at"], row["order_id"]) < (after_at, after_id)
+        ]
+        rows.sort(key=lambda row: (row["executed_at"], row["order_id"]), reverse=True)
+    else:
+        assert query.name == "WAREHOUSE_ORDERS_UNDATED"
+        after_id, limit = params
+        rows = [row for row in ORDERS if row["executed_at"] is None and row["order_id"] < after_id]
+        rows.sort(key=lambda row: row["order_id"], reverse=True)
+    return [dict(row, pharmacy="x", katastasi="PENDING", arxiko_kostos=0) for row in rows[:limit]]
+
+
+def _all_pages(page_size):
+    pages = models.WarehouseRepository.iter_pharmacy_orders(page_size=page_size)
+    return [row["order_id"] for page in pages for row in page]
+
+
+def test_undated_orders_are_paged_after_dated(monkeypatch):
+    monkeypatch.setattr(models.Database, "fetch_all", _fake_fetch_all)
+    for page_size in (1, 2, 3, 4, 10):
+        assert _all_pages(page_size) == [4, 3, 6, 1, 7, 5, 2]
+
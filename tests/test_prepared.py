@@ -0,0 +1,63 @@
+from db import SQL, bucketed_in_clause, with_in_clause, with_row_in_clause
+from prepared import StatementCache
+
+
+class _RecordingConnection:
+    def __init__(self):
+        self.commands = []
+
+    def cmd_stmt_execute(self, statement_id, data=(), parameters=(), **_kwargs):
+        self.commands.append(("execute", statement_id, data))
+        return {"statement_id": statement_id}
+
+
+class _PreparedCursor:
+    """Τα εσωτερικά του MySQLCursorPrepared που αγγίζει το StatementCache.execute."""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._prepared = None
+        self._executed = None
+        self.results = []
+
+    def execute(self, operation, params=()):
+        if operation is not self._executed:
+            self._connection.commands.append(("prepare", operation))
+            self._executed = operation
+            self._prepared = {"statement_id": 7, "parameters": [None] * len(params)}
+        self._connection.commands.append(("reset", 7))
+        self._handle_result(self._connection.cmd_stmt_execute(7, data=tuple(params)))
+
+    def _handle_result(self, result):
+        self.results.append(result)
+
+
+def test_in_clause_returns_same_object_per_bucket(monkeypatch):
+    monkeypatch.setattr(StatementCache, "enabled", True)
+    first, _ = bucketed_in_clause(SQL.INVENTORY_AVAILABLE_BY_IDS, [1, 2, 3])
+    second, _ = bucketed_in_clause(SQL.INVENTORY_AVAILABLE_BY_IDS, [4, 5, 6, 7])
+    assert with_in_clause(SQL.INVENTORY_AVAILABLE_BY_IDS, [1]) is with_in_clause(SQL.INVENTORY_AVAILABLE_BY_IDS, [9])
+    assert first is second
+    assert first.name == "INVENTORY_AVAILABLE_BY_IDS"
+    rows = with_row_in_clause(SQL.INVENTORY_AVAILABLE_BY_IDS, [(1, 2), (3, 4)])
+    assert rows is with_row_in_clause(SQL.INVENTORY_AVAILABLE_BY_IDS, [(5, 6), (7, 8)])
+    assert "(%s,%s),(%s,%s)" in rows
+
+
+def test_reexecution_skips_prepare_and_reset():
+    conn = _RecordingConnection()
+    cur = _PreparedCursor(conn)
+    query = with_in_clause(SQL.INVENTORY_AVAILABLE_BY_IDS, [1, 2])
+    for params in ([1, 2], [3, 4], [5, 6]):
+        StatementCache.execute(cur, query, params)
+    assert [command[0] for command in conn.commands] == ["prepare", "reset", "execute", "execute", "execute"]
+    assert conn.commands[-1] == ("execute", 7, (5, 6))
+    assert len(cur.results) == 3
+
+
+def test_other_text_is_prepared_again():
+    conn = _RecordingConnection()
+    cur = _PreparedCursor(conn)
+    StatementCache.execute(cur, SQL.INVENTORY_AVAILABLE_BY_IDS, [1])
+    StatementCache.execute(cur, str(SQL.INVENTORY_AVAILABLE_BY_IDS), [1])
+    assert [command[0] for command in conn.commands].count("prepare") == 2
@@ -0,0 +1,53 @@
+import pytest
+
+from replicas import Replica, ReplicaSet
+
+
+class _Cursor:
+    def __init__(self, row):
+        self._row = row
+
+    def execute(self, query):
+        pass
+
+    def fetchone(self):
+        return self._row
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class _Pool:
+    """Pool μιας σύνδεσης που απαντά στο lag query με τη γραμμή `row`."""
+
+    def __init__(self, row):
+        self.row = row
+
+    def acquire(self):
+        return self
+
+    def release(self, conn, discard=False):
+        pass
+
+    def cursor(self, dictionary=False):
+        return _Cursor(self.row)
+
+
+@pytest.mark.parametrize(
+    "row, healthy",
+    [
+        ({"Seconds_Behind_Source": 1}, True),
+        ({"Seconds_Behind_Master": 0}, True),
+        ({"Seconds_Behind_Source": 30}, False),
+        # Σταματημένη αναπαραγωγή ή server που δεν είναι replica: άγνωστη (άπειρη) καθυστέρηση.
+        ({"Seconds_Behind_Source": None}, False),
+        (None, False),
+    ],
+)
+def test_replica_health_from_lag(row, healthy):
+    replica = Replica("replica-1", _Pool(row))
+    replicas = ReplicaSet([replica], "SHOW REPLICA STATUS", max_lag=5.0)
+    assert (replicas.choose() is replica) is healthy
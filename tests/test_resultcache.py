@@ -0,0 +1,61 @@
+import os
+import re
+
+import pytest
+
+from db import SQL
+from resultcache import ResultCache, sql_tables
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql", "schema.sql")
+# Προσωρινός πίνακας ανά σύνδεση (Database.fetch_in), δεν υπάρχει στο schema.sql.
+TEMPORARY_TABLES = {"TMP_IN_IDS"}
+WRITE_PREFIX = re.compile(r"^\s*(INSERT|REPLACE|UPDATE|DELETE)\b")
+
+
+def _schema_tables():
+    with open(SCHEMA, encoding="utf-8") as handle:
+        return set(re.findall(r"CREATE TABLE (?:IF NOT EXISTS )?([A-Z_][A-Z0-9_]*)", handle.read()))
+
+
+SQL_CONSTANTS = sorted(name for name in vars(SQL) if name.isupper() and isinstance(getattr(SQL, name), str))
+
+
+@pytest.mark.parametrize("name", SQL_CONSTANTS)
+def test_every_constant_has_known_tables(name):
+    text = getattr(SQL, name)
+    reads, writes = sql_tables(text)
+    assert (reads | writes) <= _schema_tables() | TEMPORARY_TABLES
+    if WRITE_PREFIX.match(text):
+        assert writes, f"{name}: εντολή εγγραφής χωρίς πίνακες εγγραφής"
+    if "FROM" in text or "JOIN" in text:
+        assert reads or writes, f"{name}: δεν βρέθηκαν πίνακες"
+    assert (text.reads, text.writes) == (reads, writes)
+
+
+def test_multi_table_delete_resolves_aliases():
+    reads, writes = sql_tables(SQL.DELETE_MERGED_SUPPLIER_ITEMS)
+    assert writes == {"PROMITHEYTIS_APOSTELEI_PROION_BACKORDER"}
+    assert reads == {"PROMITHEYTIS"}
+
+
+def test_multi_table_delete_with_several_targets():
+    text = "DELETE a, b FROM PARAGGELIA a JOIN PARAGGELIA_DESMEUSI b ON b.order_id = a.order_id WHERE a.order_id = %s"
+    assert sql_tables(text) == (frozenset(), frozenset({"PARAGGELIA", "PARAGGELIA_DESMEUSI"}))
+
+
+def test_plain_statements():
+    assert sql_tables("DELETE FROM THESI_ELEFTHERI WHERE storage_id = %s") == (frozenset(), frozenset({"THESI_ELEFTHERI"}))
+    assert sql_tables("SELECT a FROM PROION p JOIN PROION_SYNOLIKO_APOTHEMA t ON t.product_id = p.product_id") == (
+        frozenset({"PROION", "PROION_SYNOLIKO_APOTHEMA"}),
+        frozenset(),
+    )
+
+
+def test_cache_is_opt_in_and_limited_to_listed_statements(monkeypatch):
+    assert set(ResultCache.STATEMENTS) <= set(SQL_CONSTANTS)
+    monkeypatch.setattr(ResultCache, "enabled", False)
+    assert not ResultCache.applies("PHARMACY_AFM")
+    monkeypatch.setattr(ResultCache, "enabled", True)
+    assert ResultCache.applies("PHARMACY_AFM")
+    assert not ResultCache.applies("CURRENT_PRODUCT_SUPPLIERS")
+    assert not ResultCache.applies(None)
@@ -0,0 +1,103 @@
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+import search
+from search import ProductSearchIndex, fold
+
+PRODUCTS = [
+    {"onoma": "Depon", "etairia": "Bristol", "katigoria": "Αναλγητικά"},
+    {"onoma": "Deron", "etairia": "Demo", "katigoria": "Αναλγητικά"},
+    {"onoma": "Xanax", "etairia": "Pfizer", "katigoria": "Αγχολυτικά"},
+    {"onoma": "Ασπιρίνη", "etairia": "Bayer", "katigoria": "Αναλγητικά"},
+    {"onoma": "Panadol Extra", "etairia": "GSK", "katigoria": "Αναλγητικά"},
+]
+
+
+def _names(results):
+    return [product["onoma"] for product in results]
+
+
+def _brute_force_fuzzy(query, threshold=0.7):
+    """Όλα τα ονόματα με ratio >= όριο, όπως η αρχική (χωρίς index) υλοποίηση."""
+    query = fold(query)
+    return {
+        product["onoma"]
+        for product in PRODUCTS
+        if SequenceMatcher(None, query, fold(product["onoma"])).ratio() >= threshold
+    }
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("dexon", {"Depon", "Deron"}),
+        ("xamax", {"Xanax"}),
+        ("ασπιρινα", {"Ασπιρίνη"}),
+    ],
+)
+def test_single_substitution_typos(query, expected):
+    index = ProductSearchIndex(PRODUCTS)
+    assert set(_names(index.search(query))) == expected
+
+
+@pytest.mark.parametrize("query", ["dexon", "xamax", "depn", "panadl extra", "ζζζ"])
+def test_fuzzy_matches_brute_force(query):
+    index = ProductSearchIndex(PRODUCTS)
+    assert set(_names(index.search(query))) == _brute_force_fuzzy(query)
+
+
+def test_substring_hits_rank_before_fuzzy():
+    index = ProductSearchIndex(PRODUCTS)
+    assert _names(index.search("depo")) == ["Depon"]
+    assert _names(index.search("αναλγ", limit=2)) == ["Depon", "Deron"]
+
+
+def _catalog(size, seed=7):
+    """Συνθετικός κατάλογος με ονόματα τύπου "<μάρκα> <μορφή> <περιεκτικότητα>", όπως ο πραγματικός."""
+    rng = random.Random(seed)
+    syllables = ["pa", "na", "dol", "de", "pon", "xa", "nax", "zo", "vi", "rax", "lo", "ox", "ce", "tri", "mo"]
+    greek = ["πα", "να", "ντολ", "ασ", "πι", "ρί", "νη", "λο", "κο", "ζα", "μο", "ξι", "ρα", "τι"]
+    forms = ["tabs", "caps", "syrup", "extra", "forte", "plus", "gel", "drops", "σιρόπι", "δισκία", "αλοιφή"]
+    strengths = ["", "100mg", "250mg", "500mg", "1g", "10ml"]
+    products = []
+    for number in range(size):
+        parts = rng.choice([greek, syllables, syllables])
+        brand = "".join(rng.choice(parts) for _ in range(rng.randint(2, 4))).capitalize()
+        name = " ".join(part for part in (brand, rng.choice(forms), rng.choice(strengths)) if part)
+        products.append({"onoma": name, "etairia": f"Company {number % 300}", "katigoria": "Αναλγητικά"})
+    products.append({"onoma": "Panadol Extra", "etairia": "GSK", "katigoria": "Αναλγητικά"})
+    return products
+
+
+@pytest.fixture(scope="module")
+def large_index():
+    return ProductSearchIndex(_catalog(100_000))
+
+
+def test_fuzzy_top_k_at_catalog_scale(large_index, monkeypatch):
+    compared = []
+
+    class CountingMatcher(SequenceMatcher):
+        def ratio(self):
+            compared.append(self.b)
+            return super().ratio()
+
+    monkeypatch.setattr(search, "SequenceMatcher", CountingMatcher)
+    query = fold("panadl extr")
+    top = large_index._fuzzy_hits(query, set(), limit=5)
+    # Μόνο λίγα από τα 100k ονόματα φτάνουν ως το ratio()· τα υπόλοιπα κόβονται από τα φράγματα.
+    assert len(compared) < 50
+
+    monkeypatch.setattr(search, "SequenceMatcher", SequenceMatcher)
+    brute = []
+    matcher = SequenceMatcher(None, query, "")
+    for position, name in enumerate(large_index._names):
+        matcher.set_seq2(name)
+        # quick_ratio() είναι άνω φράγμα του ratio() (τεκμηριωμένο στο difflib).
+        if matcher.quick_ratio() >= large_index.fuzzy_threshold and matcher.ratio() >= large_index.fuzzy_threshold:
+            brute.append((matcher.ratio(), position))
+    brute.sort(key=lambda hit: (-hit[0], hit[1]))
+    assert top == brute[:5]
+    assert large_index.suggest("panadl extr")[0] == "Panadol Extra"